@@ -68,6 +68,19 @@ REDIS_TTL_SECONDS = int(os.getenv("REDIS_TTL_SECONDS", "86400"))  # Default TTL
 REDIS_MAX_MEMORY = os.getenv("REDIS_MAX_MEMORY", "256mb") # Max memory for Redis
 REDIS_MAX_MEMORY_POLICY = os.getenv("REDIS_MAX_MEMORY_POLICY", "allkeys-lru") # Eviction policy
 
+# Message storage: "compact" keeps one msgpack record per message in a single list per
+# conversation (old "msg:"/"msgs:" data is migrated on first access); "hash" keeps one hash per message
+MESSAGE_STORAGE_FORMAT = os.getenv("MESSAGE_STORAGE_FORMAT", "compact").lower()
+
+# Conversation history windows: only the tail of a conversation is read for each prompt
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "40")) # Most recent messages loaded into the prompt
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", str(N_CTX // 2))) # Approximate token budget for loaded history
+# In-process write-through cache of conversation tails (kept coherent across workers via Redis pub/sub)
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "512")) # Conversations cached per worker
+CONVERSATION_CACHE_TAIL = max(HISTORY_MAX_MESSAGES, int(os.getenv("CONVERSATION_CACHE_TAIL", "64"))) # Messages cached per conversation
+# Semantic context retrieval returns this many messages before and after each matching message
+CONTEXT_WINDOW_MESSAGES = int(os.getenv("CONTEXT_WINDOW_MESSAGES", "2"))
+
 # ============================================================================ #
 #              VECTOR SEARCH & EMBEDDING MODEL SETTINGS                      #
 # ============================================================================ #
@@ -79,6 +92,25 @@ EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "BAAI/bge-base-en-v1.5"
 VECTOR_SIMILARITY_THRESHOLD = float(os.getenv("VECTOR_SIMILARITY_THRESHOLD", "0.75")) # For retrieving similar messages
 BGE_QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages:" # Instruction for BGE query embeddings
 VECTOR_INDEX_NAME = "chatbot_message_vectors" # Name for the Redis Search index
+# Vector storage: "hash" stores binary vector blobs in hashes that reference the message instead of
+# copying it; "json" keeps RedisJSON documents with float lists and the message content.
+# Vectors already stored as JSON documents are copied into the hash layout once at startup.
+VECTOR_STORAGE_FORMAT = os.getenv("VECTOR_STORAGE_FORMAT", "hash").lower()
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "FLOAT16").upper() # FLOAT32 or FLOAT16 blobs (hash format only)
+# Optional dimension reduction (hash format only): "none", "truncate" (Matryoshka-style prefix) or "pca"
+VECTOR_REDUCTION = os.getenv("VECTOR_REDUCTION", "none").lower()
+VECTOR_REDUCED_DIM = int(os.getenv("VECTOR_REDUCED_DIM", "256")) # Stored dimension when a reduction is enabled
+VECTOR_PCA_SAMPLES = int(os.getenv("VECTOR_PCA_SAMPLES", "2000")) # Cached embeddings used to fit the PCA projection
+# Without RediSearch, vectors are kept in Redis hashes and searched by an in-process NumPy index
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "true").lower() in ("true", "1", "yes") # Enable the fallback index
+LOCAL_VECTOR_INDEX_PATH = os.getenv("LOCAL_VECTOR_INDEX_PATH", "") # Snapshot path prefix for fast restarts (empty: rebuild from Redis)
+# Embedding requests from concurrent conversations are collected briefly and encoded as one batch
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")) # How long the first request waits for others to join its batch
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32")) # Texts encoded in one forward pass
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "1")) # Batches encoded concurrently
+# Embeddings are cached by a hash of (model, instruction prefix, text): in-process LRU, then Redis
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")) # Embeddings kept in each worker's LRU (0 disables the cache)
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 86400))) # Seconds a cached embedding is kept in Redis
 
 # ============================================================================ #
 #            ROUTE CLASSIFIER & QUERY OPTIMIZER SETTINGS                     #
@@ -108,6 +140,11 @@ Return ONLY the optimized search query. /no_think
 CLASSIFIER_MAX_TOKENS = int(os.getenv("CLASSIFIER_MAX_TOKENS", "30")) # Max tokens for classification response
 OPTIMIZER_MAX_TOKENS = int(os.getenv("OPTIMIZER_MAX_TOKENS", "50")) # Max tokens for optimized query
 
+# Speculative web search: start the web pipeline while the classifier is still running
+# for queries that a cheap keyword heuristic already scores as likely WEB.
+SPECULATIVE_WEB_SEARCH = os.getenv("SPECULATIVE_WEB_SEARCH", "False").lower() == "true"
+SPECULATIVE_WEB_THRESHOLD = float(os.getenv("SPECULATIVE_WEB_THRESHOLD", "0.6")) # Heuristic score (0-1) needed to speculate
+
 # ============================================================================ #
 #                 FRONTEND SETTINGS (Informational)                          #
 # ============================================================================ #
@@ -134,15 +171,34 @@ def print_config():
     print(f"  N_CTX: {N_CTX}")
     print(f"  N_GPU_LAYERS: {N_GPU_LAYERS}")
     print("-" * 50)
+    print("Routing Settings:")
+    print(f"  SPECULATIVE_WEB_SEARCH: {SPECULATIVE_WEB_SEARCH}")
+    print(f"  SPECULATIVE_WEB_THRESHOLD: {SPECULATIVE_WEB_THRESHOLD}")
+    print("-" * 50)
     print("Redis Settings:")
     print(f"  REDIS_HOST: {REDIS_HOST}")
     print(f"  REDIS_PORT: {REDIS_PORT}")
     print(f"  REDIS_PASSWORD: {'********' if REDIS_PASSWORD else 'Not Set'}")
     print(f"  REDIS_TTL_SECONDS: {REDIS_TTL_SECONDS}")
+    print(f"  MESSAGE_STORAGE_FORMAT: {MESSAGE_STORAGE_FORMAT}")
+    print(f"  HISTORY_MAX_MESSAGES: {HISTORY_MAX_MESSAGES}")
+    print(f"  HISTORY_MAX_TOKENS: {HISTORY_MAX_TOKENS}")
+    print(f"  CONVERSATION_CACHE_SIZE: {CONVERSATION_CACHE_SIZE}")
+    print(f"  CONTEXT_WINDOW_MESSAGES: {CONTEXT_WINDOW_MESSAGES}")
     print("-" * 50)
     print("Embedding Model Settings:")
     print(f"  EMBEDDING_MODEL_NAME: {EMBEDDING_MODEL_NAME}")
     print(f"  VECTOR_SIMILARITY_THRESHOLD: {VECTOR_SIMILARITY_THRESHOLD}")
+    print(f"  VECTOR_STORAGE_FORMAT: {VECTOR_STORAGE_FORMAT}")
+    print(f"  VECTOR_DTYPE: {VECTOR_DTYPE}")
+    print(f"  VECTOR_REDUCTION: {VECTOR_REDUCTION} ({VECTOR_REDUCED_DIM} dims)")
+    print(f"  LOCAL_VECTOR_INDEX: {LOCAL_VECTOR_INDEX}")
+    print(f"  LOCAL_VECTOR_INDEX_PATH: {LOCAL_VECTOR_INDEX_PATH or 'Not Set'}")
+    print(f"  EMBEDDING_BATCH_WINDOW_MS: {EMBEDDING_BATCH_WINDOW_MS}")
+    print(f"  EMBEDDING_MAX_BATCH_SIZE: {EMBEDDING_MAX_BATCH_SIZE}")
+    print(f"  EMBEDDING_THREADS: {EMBEDDING_THREADS}")
+    print(f"  EMBEDDING_CACHE_SIZE: {EMBEDDING_CACHE_SIZE}")
+    print(f"  EMBEDDING_CACHE_TTL: {EMBEDDING_CACHE_TTL}")
     print("=" * 50)
 
 if __name__ == "__main__":
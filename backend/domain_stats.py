@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import memory
+
+logger = logging.getLogger("domain_stats")
+
+# Constants
+DOMAIN_STATS_TTL = int(os.getenv("DOMAIN_STATS_TTL", str(7 * 86400)))  # Seconds a domain's record survives without fetches
+DOMAIN_STATS_REFRESH_SECONDS = 30  # How long a worker reuses its in-process copy of a domain record
+DOMAIN_STATS_MEMORY_SIZE = int(os.getenv("DOMAIN_STATS_MEMORY_SIZE", "4096"))  # Domain records kept in the in-process copy
+DOMAIN_EWMA_ALPHA = float(os.getenv("DOMAIN_EWMA_ALPHA", "0.3"))  # Weight of the newest sample in latency/error averages
+DOMAIN_FAILURE_THRESHOLD = int(os.getenv("DOMAIN_FAILURE_THRESHOLD", "3"))  # Consecutive failures that open the circuit
+DOMAIN_OPEN_SECONDS = int(os.getenv("DOMAIN_OPEN_SECONDS", "900"))  # How long an open circuit skips the domain
+DOMAIN_SLOW_MS = float(os.getenv("DOMAIN_SLOW_MS", "3000"))  # EWMA latency above which a domain is tried last
+DOMAIN_MAX_ERROR_RATE = 0.5  # EWMA error rate above which a domain is tried last
+DOMAIN_MAX_UNUSABLE_RATE = 0.8  # Share of robots-denied/non-HTML responses above which a domain is tried last
+DOMAIN_MIN_SAMPLES = 3  # Requests needed before rates are trusted
+DOMAIN_KEY_PREFIX = "domainstats:"
+
+# Fetch outcomes recorded per attempt
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_NON_HTML = "non_html"
+OUTCOME_ROBOTS_DENIED = "robots_denied"
+OUTCOME_CANCELLED = "cancelled"  # Stopped by the fetch engine; only the elapsed time is recorded
+
+# Update one domain record atomically so all workers share a consistent scoreboard.
+# KEYS: domain hash
+# ARGV: outcome, latency ms (negative if unknown), alpha, now, failure threshold, open seconds, ttl
+_RECORD_OUTCOME_LUA = """
+local outcome = ARGV[1]
+local latency = tonumber(ARGV[2])
+local alpha = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local opened = 0
+
+if latency >= 0 then
+    local previous = tonumber(redis.call('HGET', KEYS[1], 'latency_ewma_ms'))
+    local ewma = latency
+    if previous then ewma = alpha * latency + (1 - alpha) * previous end
+    redis.call('HSET', KEYS[1], 'latency_ewma_ms', tostring(ewma))
+end
+
+if outcome ~= 'cancelled' then
+    redis.call('HINCRBY', KEYS[1], 'requests', 1)
+    local failed = 0
+    if outcome == 'error' or outcome == 'timeout' then failed = 1 end
+    local previous_rate = tonumber(redis.call('HGET', KEYS[1], 'error_rate') or '0')
+    redis.call('HSET', KEYS[1], 'error_rate', tostring(alpha * failed + (1 - alpha) * previous_rate))
+
+    if failed == 1 then
+        redis.call('HINCRBY', KEYS[1], 'errors', 1)
+        local consecutive = redis.call('HINCRBY', KEYS[1], 'consecutive_failures', 1)
+        if consecutive >= tonumber(ARGV[5]) then
+            redis.call('HSET', KEYS[1], 'open_until', tostring(now + tonumber(ARGV[6])))
+            opened = 1
+        end
+    elseif outcome == 'ok' then
+        redis.call('HSET', KEYS[1], 'consecutive_failures', 0, 'open_until', 0)
+    else
+        -- Robots denials and non-HTML responses say nothing about the domain's health
+        redis.call('HINCRBY', KEYS[1], outcome, 1)
+    end
+end
+
+redis.call('HSET', KEYS[1], 'last_seen', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return opened
+"""
+
+_record_script = memory.redis_client.register_script(_RECORD_OUTCOME_LUA)
+
+# In-process copies of domain records: domain -> (record, loaded_at), kept in LRU order
+_snapshots: "OrderedDict[str, Tuple[Dict[str, float], float]]" = OrderedDict()
+# Pending fire-and-forget updates, kept referenced until they finish
+_pending_updates: Set[asyncio.Task] = set()
+
+DOMAIN_STATS = {
+    "recorded": 0,
+    "skipped": 0,          # Candidate URLs dropped because their domain's circuit is open
+    "demoted": 0,          # Candidate URLs moved behind healthy domains
+    "circuits_opened": 0,
+}
+
+def _parse_record(raw: Dict[str, str]) -> Dict[str, float]:
+    record = {}
+    for field, value in raw.items():
+        try:
+            record[field] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return record
+
+async def get_many(domains: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Return the stats records for several domains, from the in-process copy when recent
+    and otherwise in one Redis pipeline. Unknown domains map to an empty record.
+    """
+    now = time.time()
+    records: Dict[str, Dict[str, float]] = {}
+    missing = []
+    for domain in dict.fromkeys(domains):
+        snapshot = _snapshots.get(domain)
+        if snapshot is not None and now - snapshot[1] < DOMAIN_STATS_REFRESH_SECONDS:
+            records[domain] = snapshot[0]
+            _snapshots.move_to_end(domain)
+        else:
+            missing.append(domain)
+
+    if missing:
+        try:
+            async with memory.redis_client.pipeline(transaction=False) as pipeline:
+                for domain in missing:
+                    pipeline.hgetall(f"{DOMAIN_KEY_PREFIX}{domain}")
+                raw_records = await pipeline.execute()
+        except Exception as e:
+            logger.debug(f"Domain stats lookup failed: {e}")
+            raw_records = [{} for _ in missing]
+        for domain, raw in zip(missing, raw_records):
+            records[domain] = _parse_record(raw or {})
+            _snapshots[domain] = (records[domain], now)
+            _snapshots.move_to_end(domain)
+        while len(_snapshots) > DOMAIN_STATS_MEMORY_SIZE:
+            _snapshots.popitem(last=False)
+    return records
+
+def is_circuit_open(record: Dict[str, float], now: Optional[float] = None) -> bool:
+    """True while the domain is inside its open-circuit window."""
+    return record.get("open_until", 0) > (now or time.time())
+
+def is_degraded(record: Dict[str, float]) -> bool:
+    """True for domains that are usually slow, failing, non-HTML or robots-denied."""
+    if record.get("latency_ewma_ms", 0) > DOMAIN_SLOW_MS:
+        return True
+    requests = record.get("requests", 0)
+    if requests < DOMAIN_MIN_SAMPLES:
+        return False
+    if record.get("error_rate", 0) > DOMAIN_MAX_ERROR_RATE:
+        return True
+    unusable = record.get(OUTCOME_NON_HTML, 0) + record.get(OUTCOME_ROBOTS_DENIED, 0)
+    return unusable / requests > DOMAIN_MAX_UNUSABLE_RATE
+
+async def order_candidates(candidates: List[Tuple[int, Dict[str, Any], str]]) -> List[Tuple[int, Dict[str, Any], str]]:
+    """
+    Order fetch candidates using the domain scoreboard.
+
+    Candidates are (rank, search result, domain) tuples in search engine order.
+    Domains with an open circuit are skipped, degraded domains are moved behind
+    healthy ones, and the search ranking is kept within each group. If every
+    candidate would be skipped the original list is returned unchanged.
+    """
+    records = await get_many([domain for _, _, domain in candidates])
+    now = time.time()
+    healthy, degraded = [], []
+    for candidate in candidates:
+        record = records.get(candidate[2], {})
+        if is_circuit_open(record, now):
+            DOMAIN_STATS["skipped"] += 1
+            logger.info(f"Skipping {candidate[2]}: circuit open for {int(record['open_until'] - now)}s")
+            continue
+        if is_degraded(record):
+            DOMAIN_STATS["demoted"] += 1
+            degraded.append(candidate)
+        else:
+            healthy.append(candidate)
+    return (healthy + degraded) or candidates
+
+async def _record(domain: str, outcome: str, latency_ms: float) -> None:
+    try:
+        opened = await _record_script(
+            keys=[f"{DOMAIN_KEY_PREFIX}{domain}"],
+            args=[outcome, latency_ms, DOMAIN_EWMA_ALPHA, time.time(),
+                  DOMAIN_FAILURE_THRESHOLD, DOMAIN_OPEN_SECONDS, DOMAIN_STATS_TTL]
+        )
+        if opened:
+            DOMAIN_STATS["circuits_opened"] += 1
+            logger.warning(f"Circuit opened for {domain} after {DOMAIN_FAILURE_THRESHOLD} consecutive failures")
+        _snapshots.pop(domain, None)
+    except Exception as e:
+        logger.debug(f"Domain stats update failed for {domain}: {e}")
+
+def record_outcome(domain: str, outcome: str, latency_seconds: Optional[float] = None) -> None:
+    """
+    Record one fetch attempt for a domain without blocking the caller.
+
+    Args:
+        domain: Host the request went to
+        outcome: One of the OUTCOME_* constants
+        latency_seconds: Time until the response (or the failure), if measured
+    """
+    if not domain:
+        return
+    DOMAIN_STATS["recorded"] += 1
+    latency_ms = latency_seconds * 1000 if latency_seconds is not None else -1
+    task = asyncio.ensure_future(_record(domain, outcome, latency_ms))
+    _pending_updates.add(task)
+    task.add_done_callback(_pending_updates.discard)
+
+async def get_domain_record(domain: str) -> Dict[str, float]:
+    """Return the current stats record for one domain, read from Redis."""
+    _snapshots.pop(domain, None)
+    return (await get_many([domain]))[domain]
+
+def get_domain_stats() -> Dict[str, int]:
+    """Return scoreboard counters for this worker."""
+    return {**DOMAIN_STATS, "cached_domains": len(_snapshots)}
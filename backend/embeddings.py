@@ -0,0 +1,336 @@
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger("embeddings")
+
+# Constants
+EMBEDDING_BATCH_WINDOW_MS = config.EMBEDDING_BATCH_WINDOW_MS
+EMBEDDING_MAX_BATCH_SIZE = max(1, config.EMBEDDING_MAX_BATCH_SIZE)
+EMBEDDING_THREADS = max(1, config.EMBEDDING_THREADS)
+EMBEDDING_CACHE_SIZE = config.EMBEDDING_CACHE_SIZE
+EMBEDDING_CACHE_TTL = config.EMBEDDING_CACHE_TTL
+EMBEDDING_CACHE_PREFIX = "embcache:"  # Redis keys holding float32 embedding blobs
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from concurrent callers and encodes them together.
+
+    The first queued text opens a batch that stays open for the batch window or
+    until it is full; the whole batch is then encoded in one padded forward pass
+    on a worker thread and every caller's future is resolved with its own row.
+    Up to `threads` batches are encoded at the same time.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Any],
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        threads: int = EMBEDDING_THREADS
+    ):
+        """
+        Args:
+            encode: Blocking function mapping a list of texts to a (len(texts), dimension) array
+            max_batch_size: Most texts encoded in one call
+            window_ms: How long a batch waits for more requests after its first one
+            threads: Batches encoded concurrently
+        """
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embedding")
+        self._slots = asyncio.Semaphore(threads)
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self.stats = {
+            "requests": 0,          # embed() calls
+            "texts": 0,             # Texts encoded
+            "batches": 0,           # Forward passes
+            "failed_batches": 0,
+            "encode_seconds": 0.0,  # Time spent inside encode()
+            "queue_wait_seconds": 0.0,
+            "max_batch_seen": 0,
+        }
+
+    def _ensure_collector(self) -> None:
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts through the shared batches.
+
+        Args:
+            texts: Texts to embed, already prefixed if they are queries
+
+        Returns:
+            A float32 array of shape (len(texts), dimension)
+        """
+        self._ensure_collector()
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        futures = []
+        now = time.perf_counter()
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future, now))
+            futures.append(future)
+        rows = await asyncio.gather(*futures)
+        return np.asarray(rows, dtype=np.float32)
+
+    async def _collect(self) -> None:
+        """Form batches from the queue and hand them to the encoding threads."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued before waiting on the window
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Callers that gave up (cancelled requests) do not need encoding
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        try:
+            started = time.perf_counter()
+            self.stats["queue_wait_seconds"] += sum(started - queued for _, _, queued in batch)
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = await asyncio.get_running_loop().run_in_executor(self._executor, self.encode, texts)
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.stats["encode_seconds"] += time.perf_counter() - started
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            for (_, future, _), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        finally:
+            self._slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batching and throughput metrics."""
+        stats = dict(self.stats)
+        batches = stats["batches"]
+        stats["avg_batch_size"] = round(stats["texts"] / batches, 2) if batches else 0.0
+        stats["texts_per_second"] = round(stats["texts"] / stats["encode_seconds"], 1) if stats["encode_seconds"] else 0.0
+        stats["avg_queue_wait_ms"] = round(stats["queue_wait_seconds"] * 1000 / stats["texts"], 2) if stats["texts"] else 0.0
+        stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+        stats["batches_in_flight"] = len(self._inflight)
+        stats.update(max_batch_size=self.max_batch_size, window_ms=self.window * 1000, threads=self.threads)
+        return stats
+
+    async def close(self) -> None:
+        """Stop collecting, fail anything still queued and release the threads."""
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Embedding service closed"))
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embeddings keyed by a hash of (model, instruction prefix, text).
+
+    Lookups check the in-process LRU first, then Redis, where embeddings are stored as
+    raw float32 blobs shared by all workers. Redis errors only turn lookups into misses.
+    """
+
+    def __init__(self, redis_client, model_name: str, dimension: int,
+                 size: int = EMBEDDING_CACHE_SIZE, ttl: int = EMBEDDING_CACHE_TTL):
+        """
+        Args:
+            redis_client: Redis client returning bytes (decode_responses=False)
+            model_name: Embedding model; part of every key so a model change never reuses vectors
+            dimension: Embedding dimension; blobs of another size are ignored
+            size: Entries kept in the in-process LRU
+            ttl: Seconds an embedding is kept in Redis
+        """
+        self.redis = redis_client
+        self.model_name = model_name
+        self.dimension = dimension
+        self.size = size
+        self.ttl = ttl
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {
+            "lru_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "redis_errors": 0,
+        }
+
+    def key(self, prefix: str, text: str) -> str:
+        """Cache key for a text embedded with the given instruction prefix."""
+        digest = hashlib.blake2b(f"{self.model_name}\0{prefix}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+        return f"{EMBEDDING_CACHE_PREFIX}{digest}"
+
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up several embeddings; missing entries are None.
+        Redis hits are copied into the LRU.
+        """
+        found: List[Optional[np.ndarray]] = []
+        redis_keys = []
+        for key in keys:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+                self.stats["lru_hits"] += 1
+            else:
+                redis_keys.append(key)
+            found.append(embedding)
+
+        if redis_keys:
+            try:
+                blobs = dict(zip(redis_keys, await self.redis.mget(redis_keys)))
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.debug(f"Embedding cache lookup failed: {e}")
+                blobs = {}
+            for index, key in enumerate(keys):
+                if found[index] is not None:
+                    continue
+                blob = blobs.get(key)
+                if blob is not None and len(blob) == self.dimension * 4:
+                    found[index] = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, found[index])
+                    self.stats["redis_hits"] += 1
+                else:
+                    self.stats["misses"] += 1
+        return found
+
+    async def put_many(self, items: List[Tuple[str, np.ndarray]]) -> None:
+        """Store newly computed embeddings in both tiers."""
+        for key, embedding in items:
+            self._remember(key, embedding)
+        if not items:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipeline:
+                for key, embedding in items:
+                    pipeline.set(key, np.asarray(embedding, dtype=np.float32).tobytes(), ex=self.ttl)
+                await pipeline.execute()
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.debug(f"Embedding cache store failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit counts and rates."""
+        stats = dict(self.stats)
+        hits = stats["lru_hits"] + stats["redis_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["lru_hit_rate"] = round(stats["lru_hits"] / lookups, 3) if lookups else 0.0
+        stats.update(lru_entries=len(self._lru), lru_size=self.size, ttl=self.ttl)
+        return stats
+
+# numpy types for the vector blob types RediSearch supports
+VECTOR_NUMPY_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16}
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def fit_pca(samples: np.ndarray, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit a PCA projection on sample embeddings.
+
+    Args:
+        samples: (n, full dimension) embeddings, n >= dim
+        dim: Number of components to keep
+
+    Returns:
+        (mean, components) with components of shape (dim, full dimension)
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    mean = samples.mean(axis=0)
+    _, _, components = np.linalg.svd(samples - mean, full_matrices=False)
+    return mean, components[:dim].astype(np.float32)
+
+class DimensionReducer:
+    """
+    Maps full model embeddings to the stored dimension.
+
+    "truncate" keeps the leading components (meant for Matryoshka-trained models),
+    "pca" projects onto fitted principal components, and "none" passes vectors
+    through. Reduced vectors are re-normalized so cosine distances stay comparable.
+    """
+
+    def __init__(self, mode: str, dim: int, mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        self.mode = mode
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+
+    @property
+    def suffix(self) -> str:
+        """Short tag identifying the reduction, used in index and key names."""
+        return "" if self.mode == "none" else f"_{self.mode}"
+
+    def apply(self, matrix: np.ndarray) -> np.ndarray:
+        """Reduce a (n, full dimension) matrix to (n, dim) float32."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.mode == "truncate":
+            return normalize_rows(matrix[:, :self.dim])
+        if self.mode == "pca":
+            return normalize_rows((matrix - self.mean) @ self.components.T)
+        return matrix
+
+    def to_bytes(self) -> bytes:
+        """Serialize a fitted PCA projection (mean row followed by the components)."""
+        return np.vstack([self.mean[None, :], self.components]).astype(np.float32).tobytes()
+
+    @classmethod
+    def pca_from_bytes(cls, blob: bytes, dim: int, full_dim: int) -> Optional["DimensionReducer"]:
+        """Load a projection saved by to_bytes; None if it does not match the dimensions."""
+        if len(blob) != (dim + 1) * full_dim * 4:
+            return None
+        rows = np.frombuffer(blob, dtype=np.float32).reshape(dim + 1, full_dim)
+        return cls("pca", dim, rows[0], rows[1:])
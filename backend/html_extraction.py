@@ -0,0 +1,291 @@
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger("html_extraction")
+
+# Optional C-backed parsers, fastest first. BeautifulSoup's html.parser is always available.
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+BACKEND_SELECTOLAX = "selectolax"
+BACKEND_LXML = "lxml"
+BACKEND_BS4 = "bs4"
+
+# "auto" picks the fastest installed backend; a named backend is used if installed
+EXTRACTION_BACKEND = os.getenv("EXTRACTION_BACKEND", "auto").lower()
+
+MIN_TEXT_LENGTH = 25  # Minimum characters for a text block to be considered
+CONTENT_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'blockquote', 'td', 'th')
+NOISE_TAGS = ('script', 'style', 'iframe', 'noscript', 'svg', 'header', 'nav', 'footer')
+NOISE_ROLES = ('navigation', 'banner', 'contentinfo', 'search', 'complementary')
+
+# Try to find main content containers, in priority order
+MAIN_CONTENT_SELECTORS = [
+    'main',
+    'article',
+    'div[role="main"]',
+    'div#main',
+    'div.main',
+    'div#content',
+    'div.content',
+    'div#main-content',
+    'div.main-content',
+    'div.entry-content'
+]
+# XPath equivalents of MAIN_CONTENT_SELECTORS for lxml (avoids the cssselect dependency)
+MAIN_CONTENT_XPATHS = [
+    '//main',
+    '//article',
+    '//div[@role="main"]',
+    '//div[@id="main"]',
+    '//div[contains(concat(" ", normalize-space(@class), " "), " main ")]',
+    '//div[@id="content"]',
+    '//div[contains(concat(" ", normalize-space(@class), " "), " content ")]',
+    '//div[@id="main-content"]',
+    '//div[contains(concat(" ", normalize-space(@class), " "), " main-content ")]',
+    '//div[contains(concat(" ", normalize-space(@class), " "), " entry-content ")]'
+]
+
+def available_backends() -> List[str]:
+    """Installed extraction backends, fastest first."""
+    backends = []
+    if SelectolaxParser is not None:
+        backends.append(BACKEND_SELECTOLAX)
+    if lxml is not None:
+        backends.append(BACKEND_LXML)
+    backends.append(BACKEND_BS4)
+    return backends
+
+def select_backend() -> str:
+    """Resolve EXTRACTION_BACKEND against the installed parsers."""
+    backends = available_backends()
+    if EXTRACTION_BACKEND in backends:
+        return EXTRACTION_BACKEND
+    if EXTRACTION_BACKEND != "auto":
+        logger.warning(f"Extraction backend '{EXTRACTION_BACKEND}' not available, using '{backends[0]}'")
+    return backends[0]
+
+ACTIVE_BACKEND = select_backend()
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text content."""
+    # Replace multiple whitespace chars with a single space
+    text = re.sub(r'\s+', ' ', text)
+    # Remove leading/trailing whitespace
+    return text.strip()
+
+class _ContentCollector:
+    """
+    Accumulates content elements up to max_chars and signals when extraction can stop.
+    Keeps the original truncation rule: the element that crosses the limit is added in
+    truncated form only if there is still a reasonable amount of room left.
+    """
+
+    def __init__(self, max_chars: int, title: str, description: str):
+        self.max_chars = max_chars
+        self.title = title
+        self.description = description
+        self.elements: List[Dict[str, str]] = []
+        self.total = 0
+
+    def add(self, elem_type: str, raw_text: str) -> bool:
+        """Add an element; returns False once no more content is wanted."""
+        text = clean_text(raw_text)
+        if not text or len(text) <= MIN_TEXT_LENGTH:
+            return True
+        # Avoid adding text that is identical to the title or meta description if it's just a short P tag
+        if elem_type == 'p' and (text == self.title or text == self.description) and len(text) < 150:
+            return True
+
+        if self.total + len(text) > self.max_chars:
+            # Add a truncated version if we're close to the limit
+            if self.total < self.max_chars - 100:
+                available_space = self.max_chars - self.total
+                self.elements.append({'type': elem_type, 'text': text[:available_space - 3] + "..."})
+            return False
+
+        self.elements.append({'type': elem_type, 'text': text})
+        self.total += len(text)
+        return True
+
+def _result(url: str, title: str, description: str, elements: List[Dict[str, str]]) -> Dict[str, Any]:
+    return {
+        'url': url,
+        'domain': urlparse(url).netloc,  # Parse domain for citation
+        'title': title,
+        'description': description,
+        'content': elements
+    }
+
+def _decode(html: Union[str, bytes], encoding: Optional[str]) -> str:
+    if isinstance(html, str):
+        return html
+    return html.decode(encoding or 'utf-8', errors='replace')
+
+def _extract_selectolax(html: Union[str, bytes], url: str, max_chars: int, encoding: Optional[str]) -> Dict[str, Any]:
+    tree = SelectolaxParser(_decode(html, encoding))
+
+    title_node = tree.css_first('title')
+    title = clean_text(title_node.text()) if title_node else ""
+    meta_node = tree.css_first('meta[name="description"]') or tree.css_first('meta[property="og:description"]')
+    description = clean_text(meta_node.attributes.get('content') or "") if meta_node else ""
+
+    # Remove non-content elements
+    tree.strip_tags(list(NOISE_TAGS))
+    for role in NOISE_ROLES:
+        for node in tree.css(f'[role="{role}"]'):
+            node.decompose()
+
+    scope = None
+    for selector in MAIN_CONTENT_SELECTORS:
+        scope = tree.css_first(selector)
+        if scope is not None:
+            break
+    scope = scope or tree.body
+
+    collector = _ContentCollector(max_chars, title, description)
+    if scope is not None:
+        for node in scope.css(', '.join(CONTENT_TAGS)):
+            if not collector.add(node.tag, node.text(separator=' ', strip=True)):
+                break
+    return _result(url, title, description, collector.elements)
+
+def _extract_lxml(html: Union[str, bytes], url: str, max_chars: int, encoding: Optional[str]) -> Dict[str, Any]:
+    if isinstance(html, bytes) and encoding:
+        html = html.decode(encoding, errors='replace')
+    if isinstance(html, str):
+        # lxml refuses str input that carries an XML encoding declaration
+        html = html.encode('utf-8')
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+    else:
+        parser = None  # Let lxml sniff the charset from the bytes
+    root = lxml.html.fromstring(html, parser=parser)
+
+    title = clean_text(root.findtext('.//title') or "")
+    meta = root.xpath('//meta[@name="description"]/@content') or root.xpath('//meta[@property="og:description"]/@content')
+    description = clean_text(meta[0]) if meta else ""
+
+    # Remove non-content elements
+    etree.strip_elements(root, *NOISE_TAGS, with_tail=False)
+    role_filter = ' or '.join(f'@role="{role}"' for role in NOISE_ROLES)
+    for node in root.xpath(f'//*[{role_filter}]'):
+        node.drop_tree()
+
+    scope = None
+    for xpath in MAIN_CONTENT_XPATHS:
+        matches = root.xpath(xpath)
+        if matches:
+            scope = matches[0]
+            break
+    if scope is None:
+        bodies = root.xpath('//body')
+        scope = bodies[0] if bodies else root
+
+    collector = _ContentCollector(max_chars, title, description)
+    # iter() is lazy, so parsing work stops as soon as enough text has been collected
+    for node in scope.iter(*CONTENT_TAGS):
+        if not collector.add(node.tag, ' '.join(node.itertext())):
+            break
+    return _result(url, title, description, collector.elements)
+
+def _extract_bs4(html: Union[str, bytes], url: str, max_chars: int, encoding: Optional[str]) -> Dict[str, Any]:
+    # Specify parser for consistency
+    soup = BeautifulSoup(_decode(html, encoding), 'html.parser')
+
+    # Remove script, style, iframe, noscript, svg, header, nav, footer elements and comments
+    # Also remove elements with common non-content roles
+    for element in soup([
+        *NOISE_TAGS,
+        lambda tag: tag.has_attr('role') and tag['role'] in NOISE_ROLES
+    ]):
+        element.decompose()
+
+    # Extract title
+    title = clean_text(soup.title.string or "") if soup.title else ""
+
+    # Extract meta description
+    description = ""
+    meta_tag = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
+    if meta_tag and meta_tag.get('content'):
+        description = clean_text(meta_tag.get('content'))
+
+    target_container = None
+    for selector in MAIN_CONTENT_SELECTORS:
+        target_container = soup.select_one(selector)
+        if target_container:
+            break # Found a primary container
+
+    # If no specific main content area found, fallback to soup.body, but this is less ideal
+    target_scope = target_container if target_container else soup.body
+
+    collector = _ContentCollector(max_chars, title, description)
+    if target_scope:
+        for elem in target_scope.find_all(list(CONTENT_TAGS)):
+            if not collector.add(elem.name, elem.get_text(separator=' ', strip=True)):
+                break
+    return _result(url, title, description, collector.elements)
+
+_EXTRACTORS = {
+    BACKEND_SELECTOLAX: _extract_selectolax,
+    BACKEND_LXML: _extract_lxml,
+    BACKEND_BS4: _extract_bs4,
+}
+
+def extract_content(html: Union[str, bytes], url: str, max_chars: int, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract title, description and the main text blocks from an HTML page.
+
+    Uses the active C-backed parser when available and stops collecting once
+    max_chars of text have been gathered. Falls back to BeautifulSoup if the fast
+    path fails on a malformed document.
+
+    Args:
+        html: Page body as text, or raw bytes (decoded with encoding, or sniffed by lxml)
+        url: Page URL, used for the citation domain
+        max_chars: Maximum number of characters of content to keep
+        encoding: Charset from the response headers, if known
+    """
+    if ACTIVE_BACKEND != BACKEND_BS4:
+        try:
+            return _EXTRACTORS[ACTIVE_BACKEND](html, url, max_chars, encoding)
+        except Exception as e:
+            logger.warning(f"{ACTIVE_BACKEND} extraction failed for {url}, falling back to BeautifulSoup: {e}")
+    return _extract_bs4(html, url, max_chars, encoding)
+
+# Compact form used across process boundaries: (title, description, ((type, text), ...))
+CompactExtraction = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+def extract_compact(html: Union[str, bytes], url: str, max_chars: int, encoding: Optional[str] = None) -> CompactExtraction:
+    """
+    Process-pool entry point: extract_content returning plain tuples, which pickle
+    smaller and faster than the list-of-dicts shape. Rebuild with expand_compact.
+    """
+    result = extract_content(html, url, max_chars, encoding)
+    return (
+        result['title'],
+        result['description'],
+        tuple((elem['type'], elem['text']) for elem in result['content'])
+    )
+
+def expand_compact(url: str, compact: CompactExtraction) -> Dict[str, Any]:
+    """Rebuild the extract_content result shape from extract_compact output."""
+    title, description, elements = compact
+    return _result(url, title, description, [{'type': elem_type, 'text': text} for elem_type, text in elements])
+
+def warm_up() -> int:
+    """Run once per pool worker so parser imports and backend selection happen before real work."""
+    extract_content(b"<html><body><p>warm up extraction worker process</p></body></html>", "http://localhost/", 100)
+    return os.getpid()
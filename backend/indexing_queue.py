@@ -0,0 +1,205 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+
+import redis.asyncio as redis
+
+from . import memory
+
+logger = logging.getLogger("indexing_queue")
+
+# Constants
+INDEX_STREAM = "index_jobs"                # Pending vector indexing jobs
+INDEX_DEAD_LETTER_STREAM = "index_jobs:dead"  # Jobs that failed INDEX_MAX_ATTEMPTS times
+INDEX_GROUP = "indexers"
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "2"))  # Worker tasks per process draining the stream
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "16"))  # Jobs read per worker per round; embedded together
+INDEX_MAX_ATTEMPTS = int(os.getenv("INDEX_MAX_ATTEMPTS", "5"))  # Attempts before a job goes to the dead-letter stream
+INDEX_CLAIM_IDLE_MS = int(os.getenv("INDEX_CLAIM_IDLE_MS", "60000"))  # Jobs left unacknowledged this long (crashed worker) are reclaimed
+INDEX_STREAM_MAXLEN = int(os.getenv("INDEX_STREAM_MAXLEN", "100000"))  # Approximate cap on queued jobs
+INDEX_BLOCK_MS = 2000  # XREADGROUP wait; must stay below the Redis client's socket timeout
+INDEX_RETRY_DELAY_SECONDS = 1.0  # Base pause after a failed round, doubled per consecutive failure
+
+_workers: List[asyncio.Task] = []
+
+INDEXING_STATS = {
+    "enqueued": 0,
+    "indexed": 0,
+    "failed_attempts": 0,
+    "retried": 0,
+    "dead_lettered": 0,
+    "claimed": 0,       # Jobs taken over from consumers that stopped without acknowledging them
+    "enqueue_errors": 0,
+}
+
+async def _ensure_group() -> None:
+    """Create the stream and consumer group; an existing group keeps its pending jobs."""
+    try:
+        await memory.redis_client.xgroup_create(INDEX_STREAM, INDEX_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+async def enqueue(msg_id: str, role: str, content: str, conv_id: str, pos: int = -1) -> bool:
+    """
+    Queue a message for vector indexing without waiting for its embedding.
+
+    Args:
+        msg_id: Message identifier
+        role: Message role ("user" or "assistant")
+        content: Message content
+        conv_id: Conversation identifier
+        pos: Position of the message in the conversation list (-1 if unknown)
+
+    Returns:
+        True if the job was queued, False if vector search is disabled or Redis failed
+    """
+    if not memory.is_vector_search_enabled():
+        return False
+    try:
+        await memory.redis_client.xadd(
+            INDEX_STREAM,
+            {"msg_id": msg_id, "role": role, "content": content, "conv_id": conv_id, "pos": pos, "attempts": 0},
+            maxlen=INDEX_STREAM_MAXLEN,
+            approximate=True
+        )
+        INDEXING_STATS["enqueued"] += 1
+        return True
+    except Exception as e:
+        INDEXING_STATS["enqueue_errors"] += 1
+        logger.error(f"Failed to queue indexing job for {msg_id}: {e}")
+        return False
+
+async def _finish(entry_id: str) -> None:
+    # Acknowledged jobs are removed so the stream length is the backlog
+    async with memory.redis_client.pipeline(transaction=True) as pipeline:
+        pipeline.xack(INDEX_STREAM, INDEX_GROUP, entry_id)
+        pipeline.xdel(INDEX_STREAM, entry_id)
+        await pipeline.execute()
+
+async def _fail(entry_id: str, job: Dict[str, str]) -> None:
+    """Requeue a failed job with its attempt count raised, or dead-letter it."""
+    INDEXING_STATS["failed_attempts"] += 1
+    attempts = int(job.get("attempts", 0)) + 1
+    retry = attempts < INDEX_MAX_ATTEMPTS
+    async with memory.redis_client.pipeline(transaction=True) as pipeline:
+        pipeline.xadd(INDEX_STREAM if retry else INDEX_DEAD_LETTER_STREAM, {**job, "attempts": attempts},
+                      maxlen=INDEX_STREAM_MAXLEN, approximate=True)
+        pipeline.xack(INDEX_STREAM, INDEX_GROUP, entry_id)
+        pipeline.xdel(INDEX_STREAM, entry_id)
+        await pipeline.execute()
+    if retry:
+        INDEXING_STATS["retried"] += 1
+    else:
+        INDEXING_STATS["dead_lettered"] += 1
+        logger.error(f"Indexing job for {job.get('msg_id')} failed {attempts} times, moved to {INDEX_DEAD_LETTER_STREAM}")
+
+async def _process(entries: List[Tuple[str, Dict[str, str]]]) -> bool:
+    """
+    Index a batch of jobs concurrently so their embeddings share forward passes.
+
+    Returns:
+        True if every job in the batch succeeded
+    """
+    # Entries deleted while pending come back without fields; acknowledge and drop their IDs
+    for entry_id, job in entries:
+        if not job:
+            await _finish(entry_id)
+    entries = [(entry_id, job) for entry_id, job in entries if job]
+    results = await asyncio.gather(
+        *(memory.index_message(job["msg_id"], job["role"], job["content"], job["conv_id"], int(job.get("pos", -1)))
+          for _, job in entries),
+        return_exceptions=True
+    )
+    all_ok = True
+    for (entry_id, job), result in zip(entries, results):
+        if result is True:
+            INDEXING_STATS["indexed"] += 1
+            await _finish(entry_id)
+        else:
+            all_ok = False
+            await _fail(entry_id, job)
+    return all_ok
+
+async def _worker(consumer: str) -> None:
+    """Drain the stream as one consumer of the group until cancelled."""
+    failures = 0
+    claim_cursor = "0-0"
+    loop = asyncio.get_running_loop()
+    next_claim = loop.time()
+    while True:
+        try:
+            # Take over jobs a stopped or crashed consumer left unacknowledged. Jobs only become
+            # claimable after INDEX_CLAIM_IDLE_MS, so the scan runs on that period and keeps
+            # going while it still finds jobs; otherwise a poll is a single XREADGROUP.
+            claimed = []
+            if loop.time() >= next_claim:
+                claim_cursor, claimed, *_ = await memory.redis_client.xautoclaim(
+                    INDEX_STREAM, INDEX_GROUP, consumer, INDEX_CLAIM_IDLE_MS, start_id=claim_cursor, count=INDEX_BATCH_SIZE
+                )
+                if not claimed and claim_cursor in ("0-0", b"0-0"):
+                    next_claim = loop.time() + INDEX_CLAIM_IDLE_MS / 1000
+            if claimed:
+                INDEXING_STATS["claimed"] += len(claimed)
+                entries = claimed
+            else:
+                response = await memory.redis_client.xreadgroup(
+                    INDEX_GROUP, consumer, {INDEX_STREAM: ">"}, count=INDEX_BATCH_SIZE, block=INDEX_BLOCK_MS
+                )
+                entries = response[0][1] if response else []
+            if not entries:
+                continue
+            if await _process(entries):
+                failures = 0
+            else:
+                # Back off so a failing embedding model or index does not spin through retries
+                failures += 1
+                await asyncio.sleep(min(INDEX_RETRY_DELAY_SECONDS * 2 ** (failures - 1), 30))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            logger.error(f"Indexing worker {consumer} error: {e}")
+            await asyncio.sleep(min(INDEX_RETRY_DELAY_SECONDS * 2 ** (failures - 1), 30))
+
+async def start() -> None:
+    """Start the indexing workers; does nothing when vector search is disabled."""
+    if _workers or not memory.is_vector_search_enabled() or INDEX_WORKERS <= 0:
+        return
+    try:
+        await _ensure_group()
+    except Exception as e:
+        logger.error(f"Could not create indexing consumer group: {e}")
+        return
+    for number in range(INDEX_WORKERS):
+        _workers.append(asyncio.create_task(_worker(f"{memory.WORKER_ID}-{number}")))
+    logger.info(f"Started {INDEX_WORKERS} indexing workers")
+
+async def stop() -> None:
+    """Stop the workers. Unfinished jobs stay pending and are reclaimed after a restart."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def get_indexing_stats() -> Dict[str, Any]:
+    """
+    Get queue counters and the current backlog.
+
+    Returns:
+        Counters for this worker plus stream-wide backlog, pending and dead-letter counts
+    """
+    stats: Dict[str, Any] = {**INDEXING_STATS, "workers": len(_workers)}
+    try:
+        async with memory.redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.xlen(INDEX_STREAM)
+            pipeline.xpending(INDEX_STREAM, INDEX_GROUP)
+            pipeline.xlen(INDEX_DEAD_LETTER_STREAM)
+            backlog, pending, dead = await pipeline.execute(raise_on_error=False)
+        stats["backlog"] = backlog if isinstance(backlog, int) else 0
+        stats["in_progress"] = pending.get("pending", 0) if isinstance(pending, dict) else 0
+        stats["dead_letter"] = dead if isinstance(dead, int) else 0
+    except Exception as e:
+        logger.debug(f"Indexing backlog lookup failed: {e}")
+    return stats
@@ -9,7 +9,7 @@ from uuid import uuid4
 import os
 import asyncio
 import logging # Import logging
-from typing import Optional, AsyncGenerator
+from typing import Optional, AsyncGenerator, Set
 from contextlib import asynccontextmanager
 from datetime import datetime
 
@@ -19,6 +19,7 @@ from . import config
 import model
 import memory
 import utils
+import indexing_queue
 
 # Import web search and route classification
 import web_access
@@ -35,6 +36,15 @@ logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(l
 # )
 # CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+def _background_task_done(task: asyncio.Task) -> None:
+    """Drop the reference to a finished background task and log its failure, if any."""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events"""
@@ -42,8 +52,17 @@ async def lifespan(app: FastAPI):
     config.print_config()
     # Initialize Redis and vector search on startup
     await memory.initialize()
+    # Shared pooled HTTP client for all outbound web requests
+    await web_access.init_http_client()
+    # Warm HTML parser processes
+    await web_access.init_extraction_pool()
+    # Background workers that embed and index saved messages
+    await indexing_queue.start()
     yield
     # Cleanup on shutdown
+    await indexing_queue.stop()
+    await web_access.close_extraction_pool()
+    await web_access.close_http_client()
     await memory.close()
 
 # Initialize FastAPI app with lifespan
@@ -62,6 +81,7 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     conv_id: Optional[str] = None
     message: str
+    web_mode: Optional[str] = None  # auto / snippets / full (see web_access.WEB_MODES)
 
 class SearchRequest(BaseModel):
     query: str
@@ -85,14 +105,15 @@ async def chat_stream_post(request: ChatRequest) -> StreamingResponse:
     thinking_mode = None  # Default to None for POST requests
     
     # Process request and return streaming response
-    return await process_chat_request(conv_id, user_message, thinking_mode)
+    return await process_chat_request(conv_id, user_message, thinking_mode, request.web_mode)
 
 # GET version of chat stream endpoint (for EventSource)
 @app.get("/chat_stream")
 async def chat_stream_get(
     conv_id: Optional[str] = None,
     message: str = Query(..., description="User message"),
-    thinking_mode: Optional[str] = Query(None, description="Control thinking mode (enabled/disabled)")
+    thinking_mode: Optional[str] = Query(None, description="Control thinking mode (enabled/disabled)"),
+    web_mode: Optional[str] = Query(None, description="Web answer tier (auto/snippets/full)")
 ) -> StreamingResponse:
     """
     Stream back the assistant's response to a user message.
@@ -104,29 +125,75 @@ async def chat_stream_get(
     logger.info(f"Received chat request with thinking_mode: {thinking_mode}")
     
     # Process request and return streaming response
-    return await process_chat_request(conv_id, message, thinking_mode)
+    return await process_chat_request(conv_id, message, thinking_mode, web_mode)
 
-async def process_chat_request(conv_id: str, user_message: str, thinking_mode: Optional[str] = None) -> StreamingResponse:
+async def process_chat_request(conv_id: str, user_message: str, thinking_mode: Optional[str] = None, web_mode: Optional[str] = None) -> StreamingResponse:
     """Process a chat request and return a streaming response"""
     # Get current datetime for injection
     current_time = datetime.now()
     current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S.%f")
 
-    # Save user message to Redis
-    msg_id = await memory.save_message(conv_id, "user", user_message)
+    # Pre-generation pipeline as a dependency graph. Only the route decision gates the
+    # web search, so persistence, queueing for indexing and history loading overlap with routing:
+    #   save -> index, save -> history, route (independent)
+    async def save_stage():
+        return await memory.save_message_with_position(conv_id, "user", user_message)
+
+    async def index_stage(save):
+        # Queue the message for vector indexing; the embedding is computed by the indexing workers
+        msg_id, pos = save
+        await indexing_queue.enqueue(msg_id, "user", user_message, conv_id, pos)
+
+    async def route_stage():
+        # Determine if web search is needed
+        return await route_classifier.determine_route(user_message)
+
+    async def history_stage(save):
+        # History must be read after the user message is persisted; only the prompt window is loaded
+        return await memory.get_conversation(
+            conv_id, last_n=config.HISTORY_MAX_MESSAGES, max_tokens=config.HISTORY_MAX_TOKENS
+        )
 
-    # Index the message for vector search if available
-    if memory.is_vector_search_enabled():
-        try:
-            await memory.index_message(msg_id, "user", user_message, conv_id)
-        except Exception as e:
-            print(f"Warning: Failed to index message: {str(e)}")
+    stages = {
+        "save": (save_stage, ()),
+        "index": (index_stage, ("save",)),
+        "route": (route_stage, ()),
+        "history": (history_stage, ("save",)),
+    }
 
-    # Determine if web search is needed
-    route_info = await route_classifier.determine_route(user_message)
+    # Optionally start the web pipeline alongside the classifier for likely-WEB queries
+    speculative_search_task = None
+    if config.SPECULATIVE_WEB_SEARCH:
+        speculative_query = route_classifier._clean_query_for_llm(user_message)
+        web_score = route_classifier.speculative_web_score(speculative_query) if speculative_query else 0.0
+        if web_score >= config.SPECULATIVE_WEB_THRESHOLD:
+            logger.info(f"Speculative WEB score {web_score:.2f} >= {config.SPECULATIVE_WEB_THRESHOLD}, searching early")
+            speculative_search_task = web_access.start_speculative_search(speculative_query, mode=web_mode)
 
-    # Get conversation history
-    conversation = await memory.get_conversation(conv_id)
+    stage_tasks = utils.start_stage_graph(stages)
+
+    # Queueing for indexing is not needed for generation; keep a reference so it can finish in the background
+    _background_tasks.add(stage_tasks["index"])
+    stage_tasks["index"].add_done_callback(_background_task_done)
+
+    try:
+        route_info, conversation = await asyncio.gather(stage_tasks["route"], stage_tasks["history"])
+    except BaseException:
+        # Cancel and wait for every started task, so none is left running or with an unretrieved exception
+        started = list(stage_tasks.values())
+        if speculative_search_task:
+            started.append(speculative_search_task)
+        for task in started:
+            task.cancel()
+        await asyncio.gather(*started, return_exceptions=True)
+        raise
+
+    # Keep the speculative result only if the classifier confirmed WEB
+    speculative_result = None
+    if speculative_search_task:
+        speculative_result = await web_access.resolve_speculative_search(
+            speculative_search_task, confirmed=route_info["route"] == "WEB"
+        )
 
     # Create time-aware system prompt with thinking mode control
     thinking_mode_directive = ""
@@ -144,15 +211,20 @@ async def process_chat_request(conv_id: str, user_message: str, thinking_mode: O
             prompt = utils.format_chat_prompt(time_aware_system_prompt, conversation)
             citations = ""
         else:
-            # Optimize the cleaned query for the search engine
-            engine_optimized_query = await route_classifier.optimize_query_for_search(cleaned_user_query_for_web_search)
-            logger.info(f"[main.py] Original cleaned query: '{cleaned_user_query_for_web_search}', Engine-optimized query: '{engine_optimized_query}'")
-
-            # Pass both the engine-optimized query (for searching) and the original cleaned query (for context)
-            search_result = await web_access.web_search(
-                query_for_search_engine=engine_optimized_query, 
-                original_cleaned_user_query=cleaned_user_query_for_web_search
-            )
+            if speculative_result is not None:
+                logger.info("[main.py] Using speculative web search result")
+                search_result = speculative_result
+            else:
+                # Optimize the cleaned query for the search engine
+                engine_optimized_query = await route_classifier.optimize_query_for_search(cleaned_user_query_for_web_search)
+                logger.info(f"[main.py] Original cleaned query: '{cleaned_user_query_for_web_search}', Engine-optimized query: '{engine_optimized_query}'")
+
+                # Pass both the engine-optimized query (for searching) and the original cleaned query (for context)
+                search_result = await web_access.web_search(
+                    query_for_search_engine=engine_optimized_query, 
+                    original_cleaned_user_query=cleaned_user_query_for_web_search,
+                    mode=web_mode
+                )
 
             if search_result["success"] and search_result.get("model_prompt"):
                 print(f"Web search successful. Using model_prompt from web_access.")
@@ -297,15 +369,11 @@ async def process_chat_request(conv_id: str, user_message: str, thinking_mode: O
             # Save the complete assistant response to Redis
             try:
                 print(f"[SSE_DEBUG] Saving full_response to Redis (length: {len(full_response)} chars).")
-                msg_id = await memory.save_message(conv_id, "assistant", full_response)
-
-                # Index the assistant's response for vector search if available
-                if memory.is_vector_search_enabled():
-                    try:
-                        print(f"[SSE_DEBUG] Indexing assistant response.")
-                        await memory.index_message(msg_id, "assistant", full_response, conv_id)
-                    except Exception as e:
-                        print(f"Warning: Failed to index assistant response: {str(e)}")
+                msg_id, pos = await memory.save_message_with_position(conv_id, "assistant", full_response)
+
+                # Queue the assistant's response for vector indexing; [END] does not wait for the embedding
+                if await indexing_queue.enqueue(msg_id, "assistant", full_response, conv_id, pos):
+                    print(f"[SSE_DEBUG] Queued assistant response for indexing.")
             except Exception as e:
                 print(f"[SSE_ERROR] Failed to save response to Redis: {str(e)}")
 
@@ -340,21 +408,34 @@ async def get_memory_stats():
     """Get Redis memory usage statistics"""
     try:
         stats = await memory.get_redis_memory_stats()
+        stats["conversation_cache"] = memory.get_conversation_cache_stats()
+        stats["embeddings"] = memory.get_embedding_stats()
+        stats["indexing"] = await indexing_queue.get_indexing_stats()
+        stats["vector_index"] = memory.get_vector_index_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving memory stats: {str(e)}")
 
+# Vector storage memory comparison
+@app.get("/vector_memory_report")
+async def get_vector_memory_report(samples: int = Query(50, ge=1, le=1000)):
+    """Compare per-message memory of the JSON and binary hash vector layouts"""
+    try:
+        return await memory.vector_memory_report(samples=samples)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building vector memory report: {str(e)}")
+
 # Semantic search endpoint
 @app.post("/search")
 async def semantic_search(request: SearchRequest):
     """
     Search for messages semantically similar to the query.
-    Uses vector similarity search if Redis Stack is available.
+    Uses RediSearch when Redis Stack is available, otherwise the in-process vector index.
     """
     if not memory.is_vector_search_enabled():
         raise HTTPException(
             status_code=501,
-            detail="Vector search is not available. Please install Redis Stack."
+            detail="Vector search is not available. Install Redis Stack or enable LOCAL_VECTOR_INDEX."
         )
 
     try:
@@ -386,7 +467,7 @@ async def get_context(request: SearchRequest):
     if not memory.is_vector_search_enabled():
         raise HTTPException(
             status_code=501,
-            detail="Vector search is not available. Please install Redis Stack."
+            detail="Vector search is not available. Install Redis Stack or enable LOCAL_VECTOR_INDEX."
         )
 
     try:
@@ -401,11 +482,11 @@ async def get_context(request: SearchRequest):
 
 # List user conversations
 @app.get("/conversations")
-async def list_conversations(user_id: str = "anonymous", limit: int = 10):
-    """List all conversations for a user"""
+async def list_conversations(user_id: str = "anonymous", limit: int = Query(10, ge=1, le=100), cursor: Optional[str] = None):
+    """List a user's conversations, newest first; pass next_cursor back to get the next page"""
     try:
-        conversations = await memory.get_user_conversations(user_id, limit)
-        return {"conversations": conversations}
+        conversations, next_cursor = await memory.list_user_conversations(user_id, limit, cursor)
+        return {"conversations": conversations, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing conversations: {str(e)}")
 
@@ -419,6 +500,12 @@ async def classify_route(request: ChatRequest):
     route_info = await route_classifier.determine_route(request.message)
     return route_info
 
+# Web pipeline stats endpoint
+@app.get("/web_stats")
+async def get_web_stats():
+    """Get runtime counters for the web search pipeline (e.g. speculative search outcomes)"""
+    return web_access.get_web_stats()
+
 # Web search test endpoint
 @app.post("/test_web_search")
 async def test_web_search(request: SearchRequest):
@@ -4,6 +4,8 @@ import os
 import time
 import numpy as np
 import asyncio
+import uuid
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple, Any, Union
 from sentence_transformers import SentenceTransformer
@@ -13,6 +15,9 @@ from redis.commands.search.query import Query
 
 # Import configuration settings
 from . import config
+from . import message_codec
+from . import embeddings
+from . import vector_index
 
 # Redis configuration from environment variables or defaults
 REDIS_HOST = config.REDIS_HOST
@@ -35,28 +40,95 @@ redis_client = redis.Redis(
     retry_on_timeout=True
 )
 
+# Second client on the same server for binary values (compressed blobs, packed vectors)
+redis_binary_client = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    password=REDIS_PASSWORD,
+    db=REDIS_DB,
+    decode_responses=False,
+    socket_timeout=5,
+    socket_connect_timeout=5,
+    retry_on_timeout=True
+)
+
 # Constants for storage schema
 CONV_HASH_PREFIX = "conv:"        # Stores conversation metadata
 MSG_HASH_PREFIX = "msg:"          # Stores individual messages
 MSG_LIST_PREFIX = "msgs:"         # Stores message IDs for a conversation
-USER_CONVS_PREFIX = "user_convs:" # Stores conversation IDs for a user
+COMPACT_MSG_LIST_PREFIX = "cmsgs:" # Stores packed message records for a conversation (compact format)
+USER_CONVS_PREFIX = "user_convs:" # Stores conversation IDs for a user (old unordered set, backfilled on first listing)
+USER_CONVS_ZSET_PREFIX = "user_convs_z:" # Conversation IDs for a user, scored by last update (microseconds)
 VECTOR_KEY_PREFIX = "vector:"     # Stores vector embeddings
+CONV_UPDATES_CHANNEL = "conv_updates"  # Pub/sub channel announcing conversation writes to other workers
+
+# Message storage format
+MESSAGE_STORAGE_FORMAT = config.MESSAGE_STORAGE_FORMAT
+COMPACT_STORAGE = MESSAGE_STORAGE_FORMAT == "compact" and message_codec.is_available()
+if MESSAGE_STORAGE_FORMAT == "compact" and not COMPACT_STORAGE:
+    print("Warning: msgpack not available, storing messages as hashes. Install with: pip install msgpack")
+MIGRATION_CHECK_CACHE_SIZE = 10000  # Conversations remembered as already migrated per worker
+CONVERSATION_PAGE_MAX = 100  # Largest page of conversations returned by one listing
+
+# Conversation history windows and the per-worker tail cache
+HISTORY_MAX_MESSAGES = config.HISTORY_MAX_MESSAGES
+HISTORY_MAX_TOKENS = config.HISTORY_MAX_TOKENS
+CONVERSATION_CACHE_SIZE = config.CONVERSATION_CACHE_SIZE
+CONVERSATION_CACHE_TAIL = config.CONVERSATION_CACHE_TAIL
+CHARS_PER_TOKEN = 4  # Rough token estimate for history budgeting
+MESSAGE_TOKEN_OVERHEAD = 4  # Chat template tokens around each message
 
 # Vector search configuration
 VECTOR_INDEX_NAME = config.VECTOR_INDEX_NAME
 EMBEDDING_MODEL = config.EMBEDDING_MODEL_NAME
 VECTOR_SIMILARITY_THRESHOLD = config.VECTOR_SIMILARITY_THRESHOLD
 BGE_QUERY_INSTRUCTION = config.BGE_QUERY_INSTRUCTION
+VECTOR_STORAGE_FORMAT = config.VECTOR_STORAGE_FORMAT
+VECTOR_DTYPE = config.VECTOR_DTYPE if config.VECTOR_DTYPE in embeddings.VECTOR_NUMPY_DTYPES else "FLOAT32"
+HASH_VECTOR_KEY_PREFIX = "vec:"  # Binary vector hashes; the full prefix adds type, dimension and reduction
+PCA_PROJECTION_PREFIX = "vector_pca:"  # Stored PCA projections, per model and dimension
+JSON_VECTOR_MIGRATION_PREFIX = "vector_migration:"  # Marks JSON vectors as copied into a hash layout (suffix: its key prefix)
+JSON_VECTOR_MIGRATION_BATCH = 200  # JSON vector documents converted per pipeline
+
+# Identifies this worker in conversation update messages, so it can skip its own writes
+WORKER_ID = uuid.uuid4().hex
+
+# Write-through cache of recent conversation tails:
+# conv_id -> {"messages": [{"role", "content"}], "start": list position of messages[0], "total": list length}
+_conversation_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# The cache is only used while this worker is subscribed to CONV_UPDATES_CHANNEL
+_cache_coherent = False
+_invalidation_task: Optional[asyncio.Task] = None
+# Write generations per conversation, bumped by write-through and invalidation; a tail read
+# that overlapped a bump is not cached. Values come from one counter, and conversations
+# evicted from this bounded map report the highest evicted value instead.
+_conversation_generations: "OrderedDict[str, int]" = OrderedDict()
+_generation_counter = 0
+_generation_floor = 0
+
+CONVERSATION_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "write_through": 0,
+    "invalidations": 0,
+    "stale_reads": 0,  # Tails read while the conversation changed, returned but not cached
+}
 
 # Initialize vector search capabilities
 embedding_model = None
+embedding_service: Optional[embeddings.EmbeddingBatcher] = None  # Batches encode calls from concurrent requests
+embedding_cache: Optional[embeddings.EmbeddingCache] = None  # Reuses embeddings of texts seen before
 vector_search_enabled = False
 vector_dimension = 1024  # Default for BAAI/bge-large-en-v1.5
+vector_reducer: Optional[embeddings.DimensionReducer] = None  # Hash format: maps model embeddings to the stored dimension
+vector_index_name = VECTOR_INDEX_NAME
+vector_key_prefix = VECTOR_KEY_PREFIX
+vector_backend: Optional[str] = None  # "redisearch", or "local" for the in-process index without Redis Stack
 
 # Initialize settings on startup
 async def initialize():
     """Initialize Redis settings and vector search capabilities"""
-    global embedding_model, vector_search_enabled, vector_dimension
+    global embedding_model, embedding_service, embedding_cache, vector_backend, vector_search_enabled, vector_dimension, _invalidation_task
     
     # Set server-side memory optimization configurations
     try:
@@ -82,7 +154,7 @@ async def initialize():
         modules = await redis_client.module_list()
         has_search = any(mod.get('name') == 'search' for mod in modules)
 
-        if has_search:
+        if has_search or config.LOCAL_VECTOR_INDEX:
             # Initialize embedding model
             try:
                 print(f"Initializing embedding model: {EMBEDDING_MODEL}")
@@ -90,43 +162,38 @@ async def initialize():
                 actual_dimension = embedding_model.get_sentence_embedding_dimension()
                 vector_dimension = actual_dimension
                 vector_search_enabled = True
+                # Generate embeddings with normalization (recommended for BGE), one padded batch per call
+                embedding_service = embeddings.EmbeddingBatcher(
+                    lambda texts: embedding_model.encode(texts, normalize_embeddings=True, batch_size=len(texts))
+                )
+                if config.EMBEDDING_CACHE_SIZE > 0:
+                    embedding_cache = embeddings.EmbeddingCache(redis_binary_client, EMBEDDING_MODEL, vector_dimension)
                 print(f"Embedding model loaded successfully (dimension: {vector_dimension})")
 
                 # Create vector index if it doesn't exist
-                try:
-                    await redis_client.ft(VECTOR_INDEX_NAME).info()
-                    print(f"Vector index '{VECTOR_INDEX_NAME}' already exists.")
-                except redis.ResponseError:
-                    # Create the index with correct VectorField initialization
-                    print(f"Creating vector index '{VECTOR_INDEX_NAME}'...")
-                    schema = [
-                        TextField("$.content", as_name="content"),
-                        TextField("$.role", as_name="role"),
-                        TagField("$.conv_id", as_name="conv_id"),
-                        NumericField("$.timestamp", as_name="timestamp"),
-                        VectorField("$.embedding",
-                            "HNSW", {
-                                "TYPE": "FLOAT32",
-                                "DIM": vector_dimension,
-                                "DISTANCE_METRIC": "COSINE"
-                            },
-                            as_name="embedding"
-                        )
-                    ]
-
-                    definition = IndexDefinition(
-                        prefix=[VECTOR_KEY_PREFIX],
-                        index_type=IndexType.JSON
-                    )
-
-                    await redis_client.ft(VECTOR_INDEX_NAME).create_index(
-                        fields=schema,
-                        definition=definition
+                if not has_search:
+                    # Vectors stay in plain Redis hashes and are searched by an in-process index
+                    print("RediSearch module not detected. Using the in-process vector index.")
+                    vector_backend = "local"
+                    await _configure_hash_vectors()
+                    await _migrate_json_vectors()
+                    await vector_index.start(
+                        redis_binary_client, vector_key_prefix, vector_reducer.dim,
+                        embeddings.VECTOR_NUMPY_DTYPES[VECTOR_DTYPE], REDIS_TTL_SECONDS, WORKER_ID
                     )
-                    print(f"Created vector index '{VECTOR_INDEX_NAME}'")
+                elif VECTOR_STORAGE_FORMAT == "json":
+                    vector_backend = "redisearch"
+                    await _create_json_vector_index()
+                else:
+                    vector_backend = "redisearch"
+                    await _create_hash_vector_index()
+                    await _migrate_json_vectors()
             except Exception as e:
                 print(f"Warning: Could not initialize embedding model - {str(e)}")
                 embedding_model = None
+                embedding_service = None
+                embedding_cache = None
+                vector_backend = None
                 vector_search_enabled = False
         else:
             print("Warning: RediSearch module not detected. Vector search will be disabled.")
@@ -134,10 +201,444 @@ async def initialize():
         print(f"Warning: Vector search initialization error - {str(e)}")
         vector_search_enabled = False
 
+    # Keep the conversation tail cache coherent with writes from other workers
+    if _invalidation_task is None:
+        _invalidation_task = asyncio.create_task(_listen_for_conversation_updates())
+
+async def _create_json_vector_index() -> None:
+    """Create the RedisJSON vector index (float lists with a copy of the content) if needed."""
+    try:
+        await redis_client.ft(VECTOR_INDEX_NAME).info()
+        print(f"Vector index '{VECTOR_INDEX_NAME}' already exists.")
+    except redis.ResponseError:
+        # Create the index with correct VectorField initialization
+        print(f"Creating vector index '{VECTOR_INDEX_NAME}'...")
+        schema = [
+            TextField("$.content", as_name="content"),
+            TextField("$.role", as_name="role"),
+            TagField("$.conv_id", as_name="conv_id"),
+            NumericField("$.timestamp", as_name="timestamp"),
+            VectorField("$.embedding",
+                "HNSW", {
+                    "TYPE": "FLOAT32",
+                    "DIM": vector_dimension,
+                    "DISTANCE_METRIC": "COSINE"
+                },
+                as_name="embedding"
+            )
+        ]
+
+        definition = IndexDefinition(
+            prefix=[VECTOR_KEY_PREFIX],
+            index_type=IndexType.JSON
+        )
+
+        await redis_client.ft(VECTOR_INDEX_NAME).create_index(
+            fields=schema,
+            definition=definition
+        )
+        print(f"Created vector index '{VECTOR_INDEX_NAME}'")
+
+async def _sample_cached_embeddings(limit: int) -> np.ndarray:
+    """Collect up to limit full-dimension embeddings from the embedding cache."""
+    samples = []
+    batch = []
+    async for key in redis_binary_client.scan_iter(match=f"{embeddings.EMBEDDING_CACHE_PREFIX}*", count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            samples.extend(await redis_binary_client.mget(batch))
+            batch = []
+            if len(samples) >= limit:
+                break
+    if batch:
+        samples.extend(await redis_binary_client.mget(batch))
+    rows = [np.frombuffer(blob, dtype=np.float32) for blob in samples if blob and len(blob) == vector_dimension * 4]
+    return np.asarray(rows[:limit], dtype=np.float32).reshape(-1, vector_dimension)
+
+async def _load_reducer() -> embeddings.DimensionReducer:
+    """
+    Build the configured dimension reduction.
+
+    A PCA projection is fitted once on cached embeddings and stored in Redis so every
+    worker projects identically. Until enough embeddings are cached to fit it, the
+    leading dimensions are kept instead.
+    """
+    mode, dim = config.VECTOR_REDUCTION, config.VECTOR_REDUCED_DIM
+    if mode not in ("truncate", "pca") or not 0 < dim < vector_dimension:
+        return embeddings.DimensionReducer("none", vector_dimension)
+    if mode == "truncate":
+        return embeddings.DimensionReducer("truncate", dim)
+
+    projection_key = f"{PCA_PROJECTION_PREFIX}{EMBEDDING_MODEL}:{dim}"
+    blob = await redis_binary_client.get(projection_key)
+    if blob is None:
+        samples = await _sample_cached_embeddings(config.VECTOR_PCA_SAMPLES)
+        if len(samples) < dim:
+            print(f"Warning: only {len(samples)} cached embeddings available to fit a {dim}-dim PCA; "
+                  f"truncating vectors until enough are cached")
+            return embeddings.DimensionReducer("truncate", dim)
+        mean, components = embeddings.fit_pca(samples, dim)
+        # The first worker to fit wins; everyone uses the stored projection
+        await redis_binary_client.set(projection_key, embeddings.DimensionReducer("pca", dim, mean, components).to_bytes(), nx=True)
+        blob = await redis_binary_client.get(projection_key)
+        print(f"Fitted PCA projection to {dim} dimensions on {len(samples)} embeddings")
+    reducer = embeddings.DimensionReducer.pca_from_bytes(blob, dim, vector_dimension)
+    if reducer is None:
+        print(f"Warning: stored PCA projection '{projection_key}' does not match the model; truncating vectors")
+        return embeddings.DimensionReducer("truncate", dim)
+    return reducer
+
+async def _configure_hash_vectors() -> None:
+    """
+    Set the dimension reduction, index name and key prefix of the hash vector layout.
+
+    Each type/dimension/reduction combination gets its own index and key prefix, so
+    changing the settings never mixes incompatible vectors; old entries expire.
+    """
+    global vector_reducer, vector_index_name, vector_key_prefix
+    vector_reducer = await _load_reducer()
+    tag = f"{VECTOR_DTYPE.lower()}_{vector_reducer.dim}{vector_reducer.suffix}"
+    vector_index_name = f"{VECTOR_INDEX_NAME}_{tag}"
+    vector_key_prefix = f"{HASH_VECTOR_KEY_PREFIX}{tag}:"
+
+async def _create_hash_vector_index() -> None:
+    """Create the RediSearch index over the hash vector layout if needed."""
+    await _configure_hash_vectors()
+    try:
+        await redis_client.ft(vector_index_name).info()
+        print(f"Vector index '{vector_index_name}' already exists.")
+    except redis.ResponseError:
+        print(f"Creating vector index '{vector_index_name}'...")
+        schema = [
+            TagField("role"),
+            TagField("conv_id"),
+            NumericField("timestamp"),
+            VectorField("embedding",
+                "HNSW", {
+                    "TYPE": VECTOR_DTYPE,
+                    "DIM": vector_reducer.dim,
+                    "DISTANCE_METRIC": "COSINE"
+                }
+            )
+        ]
+        definition = IndexDefinition(
+            prefix=[vector_key_prefix],
+            index_type=IndexType.HASH
+        )
+        await redis_client.ft(vector_index_name).create_index(fields=schema, definition=definition)
+        print(f"Created vector index '{vector_index_name}'")
+
+async def _message_positions(conv_ids: List[str]) -> Dict[str, int]:
+    """Map the message IDs of several conversations to their list positions."""
+    positions: Dict[str, int] = {}
+    for conv_id in conv_ids:
+        if COMPACT_STORAGE:
+            await _ensure_migrated(conv_id)
+            records = await redis_binary_client.lrange(f"{COMPACT_MSG_LIST_PREFIX}{conv_id}", 0, -1)
+            for pos, record in enumerate(records):
+                positions[f"{conv_id}_{message_codec.decode_message(record)[0]}"] = pos
+        else:
+            msg_ids = await redis_client.lrange(f"{MSG_LIST_PREFIX}{conv_id}", 0, -1)
+            positions.update((msg_id, pos) for pos, msg_id in enumerate(msg_ids))
+    return positions
+
+async def _migrate_json_vector_batch(keys: List[str]) -> int:
+    """Copy one batch of JSON vector documents into the hash layout; returns the number copied."""
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        for key in keys:
+            pipeline.execute_command("JSON.GET", key, "$")
+            pipeline.pttl(key)
+        replies = await pipeline.execute(raise_on_error=False)
+
+    docs = []
+    for raw, ttl_ms in zip(replies[::2], replies[1::2]):
+        # Keys that are not JSON documents come back as errors
+        if not isinstance(raw, str):
+            continue
+        try:
+            doc = json.loads(raw)[0]
+        except (ValueError, IndexError, KeyError, TypeError):
+            continue
+        embedding = doc.get("embedding")
+        if not doc.get("id") or not isinstance(embedding, list) or len(embedding) != vector_dimension:
+            continue
+        docs.append((doc, ttl_ms if isinstance(ttl_ms, int) and ttl_ms > 0 else REDIS_TTL_SECONDS * 1000))
+    if not docs:
+        return 0
+
+    positions = await _message_positions(list({doc.get("conv_id", "") for doc, _ in docs}))
+    blobs = _encode_vectors(np.asarray([doc["embedding"] for doc, _ in docs], dtype=np.float32))
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        for (doc, ttl_ms), blob in zip(docs, blobs):
+            vector_key = f"{vector_key_prefix}{doc['id']}"
+            pipeline.hset(vector_key, mapping={
+                'msg_id': doc['id'],
+                'conv_id': doc.get('conv_id', ''),
+                'role': doc.get('role', 'user'),
+                'timestamp': int(doc.get('timestamp', 0)),
+                'pos': positions.get(doc['id'], -1),
+                'embedding': blob
+            })
+            # The copy expires with the document it came from
+            pipeline.pexpire(vector_key, ttl_ms)
+        await pipeline.execute()
+    return len(docs)
+
+async def _migrate_json_vectors() -> None:
+    """
+    Copy vectors indexed in the RedisJSON layout into the current hash layout, once per layout.
+
+    Embeddings are reduced and converted like new ones and keep their remaining TTL. The
+    JSON documents are left to expire, so switching back to the json format still works.
+    """
+    marker = f"{JSON_VECTOR_MIGRATION_PREFIX}{vector_key_prefix}"
+    # Only one worker migrates; the claim expires so a migration cut short by a crash is retried
+    if not await redis_client.set(marker, WORKER_ID, nx=True, ex=3600):
+        return
+    migrated = 0
+    batch: List[str] = []
+    try:
+        async for key in redis_client.scan_iter(match=f"{VECTOR_KEY_PREFIX}*", count=500):
+            batch.append(key)
+            if len(batch) >= JSON_VECTOR_MIGRATION_BATCH:
+                migrated += await _migrate_json_vector_batch(batch)
+                batch = []
+        if batch:
+            migrated += await _migrate_json_vector_batch(batch)
+    except Exception as e:
+        # Let the next start try again
+        await redis_client.delete(marker)
+        print(f"Warning: Could not migrate JSON vectors to '{vector_key_prefix}' - {str(e)}")
+        return
+    await redis_client.set(marker, "done")
+    if migrated:
+        print(f"Migrated {migrated} vectors from the JSON layout to '{vector_key_prefix}'")
+
+def _encode_vectors(matrix: np.ndarray) -> List[bytes]:
+    """Reduce embeddings and convert them to blobs of the configured vector type."""
+    reduced = vector_reducer.apply(matrix) if vector_reducer is not None else np.asarray(matrix, dtype=np.float32)
+    return [row.tobytes() for row in reduced.astype(embeddings.VECTOR_NUMPY_DTYPES[VECTOR_DTYPE])]
+
+def _conversation_generation(conv_id: str) -> int:
+    return _conversation_generations.get(conv_id, _generation_floor)
+
+def _bump_conversation_generation(conv_id: Optional[str] = None) -> None:
+    """Mark a conversation (all conversations if None) as changed for in-flight tail reads."""
+    global _generation_counter, _generation_floor
+    _generation_counter += 1
+    if conv_id is None:
+        _conversation_generations.clear()
+        _generation_floor = _generation_counter
+        return
+    _conversation_generations[conv_id] = _generation_counter
+    _conversation_generations.move_to_end(conv_id)
+    while len(_conversation_generations) > CONVERSATION_CACHE_SIZE:
+        _, evicted = _conversation_generations.popitem(last=False)
+        _generation_floor = max(_generation_floor, evicted)
+
+def _apply_conversation_update(data: str) -> None:
+    """Handle a "<worker>|<conv_id>|<pos>" update; pos -1 means the conversation was cleared."""
+    try:
+        worker_id, rest = data.split("|", 1)
+        conv_id, pos = rest.rsplit("|", 1)
+        pos = int(pos)
+    except ValueError:
+        return
+    if worker_id == WORKER_ID:
+        return
+    _bump_conversation_generation(conv_id)
+    cached = _conversation_cache.get(conv_id)
+    # A tail that already includes the announced message is still valid
+    if cached is not None and (pos < 0 or cached["total"] <= pos):
+        del _conversation_cache[conv_id]
+        CONVERSATION_CACHE_STATS["invalidations"] += 1
+
+async def _listen_for_conversation_updates() -> None:
+    """Subscribe to conversation updates and drop cached tails that other workers changed."""
+    global _cache_coherent
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(CONV_UPDATES_CHANNEL)
+            # Anything cached or read while unsubscribed may have missed updates
+            _conversation_cache.clear()
+            _bump_conversation_generation()
+            _cache_coherent = True
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _apply_conversation_update(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Warning: Conversation update listener error - {str(e)}")
+            await asyncio.sleep(1)
+        finally:
+            _cache_coherent = False
+            _conversation_cache.clear()
+            _bump_conversation_generation()
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+# Append a message and refresh the conversation's sliding TTLs in one server-side call,
+# then announce the write so other workers can drop their cached tail.
+# The user's conversation index is a sorted set scored by the update time in microseconds;
+# conversations whose metadata has expired (no update within the TTL) are pruned from it.
+# KEYS: message hash, conversation message list, conversation hash, user conversations sorted set
+# ARGV: role, content, timestamp, timestamp_micro, datetime_iso, datetime_readable, user_id, conv_id, ttl,
+#       message hash prefix (stripped from KEYS[1] to get the message ID), worker ID, updates channel
+# Returns the message's position in the conversation list.
+_SAVE_MESSAGE_LUA = """
+local ttl = tonumber(ARGV[9])
+local pos = redis.call('RPUSH', KEYS[2], string.sub(KEYS[1], string.len(ARGV[10]) + 1)) - 1
+redis.call('HSET', KEYS[1],
+    'role', ARGV[1], 'content', ARGV[2], 'timestamp', ARGV[3], 'timestamp_micro', ARGV[4],
+    'datetime_iso', ARGV[5], 'datetime_readable', ARGV[6], 'pos', pos)
+redis.call('HSET', KEYS[3], 'updated_at', ARGV[3], 'updated_at_iso', ARGV[5], 'user_id', ARGV[7])
+redis.call('HINCRBY', KEYS[3], 'message_count', 1)
+redis.call('ZADD', KEYS[4], ARGV[4], ARGV[8])
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', '(' .. (tonumber(ARGV[4]) - ttl * 1000000))
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+redis.call('EXPIRE', KEYS[4], ttl)
+redis.call('PUBLISH', ARGV[12], ARGV[11] .. '|' .. ARGV[8] .. '|' .. pos)
+return pos
+"""
+
+_save_message_script = redis_client.register_script(_SAVE_MESSAGE_LUA)
+
+# Compact format: append a packed record to the conversation list, same bookkeeping as above.
+# KEYS: compact message list, conversation hash, user conversations sorted set
+# ARGV: record, timestamp, datetime_iso, user_id, conv_id, ttl, worker ID, updates channel, timestamp_micro
+_SAVE_COMPACT_MESSAGE_LUA = """
+local ttl = tonumber(ARGV[6])
+local pos = redis.call('RPUSH', KEYS[1], ARGV[1]) - 1
+redis.call('HSET', KEYS[2], 'updated_at', ARGV[2], 'updated_at_iso', ARGV[3], 'user_id', ARGV[4])
+redis.call('HINCRBY', KEYS[2], 'message_count', 1)
+redis.call('ZADD', KEYS[3], ARGV[9], ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', '(' .. (tonumber(ARGV[9]) - ttl * 1000000))
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+redis.call('PUBLISH', ARGV[8], ARGV[7] .. '|' .. ARGV[5] .. '|' .. pos)
+return pos
+"""
+
+# Replace the compact list with the given records and drop the old message ID list, unless
+# either list changed since it was read.
+# KEYS: compact message list, old message ID list
+# ARGV: expected old list length, expected compact list length (0 if absent), ttl, records...
+# Returns the number of records written, or -1 if a list changed.
+_MIGRATE_CONVERSATION_LUA = """
+if redis.call('LLEN', KEYS[2]) ~= tonumber(ARGV[1]) then return -1 end
+if redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[2]) then return -1 end
+redis.call('DEL', KEYS[1])
+for i = 4, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+if #ARGV > 3 then redis.call('EXPIRE', KEYS[1], ARGV[3]) end
+redis.call('DEL', KEYS[2])
+return #ARGV - 3
+"""
+
+_save_compact_message_script = redis_binary_client.register_script(_SAVE_COMPACT_MESSAGE_LUA)
+_migrate_conversation_script = redis_binary_client.register_script(_MIGRATE_CONVERSATION_LUA)
+
+# Conversations this worker has already checked for old-layout data, in LRU order
+_migrated_conversations: "OrderedDict[str, bool]" = OrderedDict()
+# Users whose old unordered conversation set has been moved into the sorted index
+_backfilled_users: set = set()
+
+MIGRATION_STATS = {
+    "conversations": 0,
+    "messages": 0,
+}
+
+async def _ensure_migrated(conv_id: str) -> None:
+    """
+    Lazily move a conversation stored in the old msg:/msgs: layout into the compact list.
+
+    If the compact list already exists (old-layout messages written after it was created,
+    e.g. by a worker still running older code), the old messages are merged into it by
+    timestamp, skipping any it already holds.
+    """
+    if conv_id in _migrated_conversations:
+        _migrated_conversations.move_to_end(conv_id)
+        return
+
+    list_key = f"{MSG_LIST_PREFIX}{conv_id}"
+    compact_key = f"{COMPACT_MSG_LIST_PREFIX}{conv_id}"
+    checked = False
+    for _ in range(3):
+        legacy_ids = await redis_client.lrange(list_key, 0, -1)
+        if not legacy_ids:
+            checked = True
+            break
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for msg_id in legacy_ids:
+                pipeline.hmget(f"{MSG_HASH_PREFIX}{msg_id}", "role", "content", "timestamp_micro")
+            rows = await pipeline.execute()
+        legacy = [
+            (int(timestamp_micro or 0), message_codec.encode_message(role or "user", content or "", int(timestamp_micro or 0)))
+            for role, content, timestamp_micro in rows
+            if role is not None or content is not None
+        ]
+        existing = await redis_binary_client.lrange(compact_key, 0, -1)
+        if existing:
+            current = [(message_codec.decode_message(record)[0], record) for record in existing]
+            known = {timestamp_micro for timestamp_micro, _ in current}
+            added = [entry for entry in legacy if entry[0] not in known]
+            records = [record for _, record in sorted(current + added, key=lambda entry: entry[0])]
+        else:
+            added = legacy
+            records = [record for _, record in legacy]
+        migrated = await _migrate_conversation_script(
+            keys=[compact_key, list_key],
+            args=[len(legacy_ids), len(existing), REDIS_TTL_SECONDS, *records]
+        )
+        if migrated < 0:
+            # A list changed while it was read; try again with fresh copies
+            continue
+        checked = True
+        if existing and added:
+            # Merged messages shift positions, so cached tails of this conversation are dropped everywhere
+            _conversation_cache.pop(conv_id, None)
+            _bump_conversation_generation(conv_id)
+            await redis_client.publish(CONV_UPDATES_CHANNEL, f"{WORKER_ID}|{conv_id}|-1")
+        if added:
+            MIGRATION_STATS["conversations"] += 1
+            MIGRATION_STATS["messages"] += len(added)
+            print(f"Migrated conversation {conv_id} to compact storage ({len(added)} messages)")
+        if migrated > 0:
+            # The old list is gone and every message it referenced is in the compact list
+            await redis_client.delete(*[f"{MSG_HASH_PREFIX}{msg_id}" for msg_id in legacy_ids])
+        break
+
+    # Conversations whose lists kept changing are checked again on the next access
+    if not checked:
+        return
+    _migrated_conversations[conv_id] = True
+    while len(_migrated_conversations) > MIGRATION_CHECK_CACHE_SIZE:
+        _migrated_conversations.popitem(last=False)
+
 async def save_message(conv_id: str, role: str, content: str, user_id: str = "anonymous") -> str:
+    """
+    Save a message and return its ID. See save_message_with_position.
+    """
+    msg_id, _ = await save_message_with_position(conv_id, role, content, user_id)
+    return msg_id
+
+async def save_message_with_position(conv_id: str, role: str, content: str, user_id: str = "anonymous") -> Tuple[str, int]:
     """
     Save a message with memory-optimized structure.
     
+    The message record, list append, conversation metadata, user index and all TTL
+    refreshes are applied atomically by one Lua call (a single round trip). In the
+    compact format the message is a packed record in the conversation's list;
+    otherwise it gets its own hash.
+    
     Args:
         conv_id: Conversation identifier
         role: Message role (user/assistant/system)
@@ -145,81 +646,205 @@ async def save_message(conv_id: str, role: str, content: str, user_id: str = "an
         user_id: User identifier (defaults to anonymous)
         
     Returns:
-        Message ID
+        Message ID and the message's position in the conversation list
     """
     # Generate unique message ID with microsecond precision
     current_time = datetime.now()
     timestamp_micro = int(time.time() * 1000000)  # Microsecond precision
     msg_id = f"{conv_id}_{timestamp_micro}"
 
-    # Save message data efficiently using Redis hashes
-    await redis_client.hset(f"{MSG_HASH_PREFIX}{msg_id}", mapping={
-        "role": role,
-        "content": content,
-        "timestamp": int(time.time()),
-        "timestamp_micro": timestamp_micro,
-        "datetime_iso": current_time.isoformat(),
-        "datetime_readable": current_time.strftime("%Y-%m-%d %H:%M:%S.%f")
-    })
-    
-    # Add message ID to conversation list
-    await redis_client.rpush(f"{MSG_LIST_PREFIX}{conv_id}", msg_id)
-    
-    # Update conversation metadata
-    await redis_client.hset(f"{CONV_HASH_PREFIX}{conv_id}", mapping={
-        "updated_at": int(time.time()),
-        "updated_at_iso": current_time.isoformat(),
-        "user_id": user_id
-    })
-    
-    # Increment message count
-    await redis_client.hincrby(f"{CONV_HASH_PREFIX}{conv_id}", "message_count", 1)
-    
-    # Set TTL on all related keys
-    await redis_client.expire(f"{MSG_HASH_PREFIX}{msg_id}", REDIS_TTL_SECONDS)
-    await redis_client.expire(f"{MSG_LIST_PREFIX}{conv_id}", REDIS_TTL_SECONDS)
-    await redis_client.expire(f"{CONV_HASH_PREFIX}{conv_id}", REDIS_TTL_SECONDS)
-    
-    # Track user conversations
-    user_key = f"{USER_CONVS_PREFIX}{user_id}"
-    await redis_client.sadd(user_key, conv_id)
-    await redis_client.expire(user_key, REDIS_TTL_SECONDS)
+    if COMPACT_STORAGE:
+        await _ensure_migrated(conv_id)
+        pos = await _save_compact_message_script(
+            keys=[
+                f"{COMPACT_MSG_LIST_PREFIX}{conv_id}",
+                f"{CONV_HASH_PREFIX}{conv_id}",
+                f"{USER_CONVS_ZSET_PREFIX}{user_id}"
+            ],
+            args=[
+                message_codec.encode_message(role, content, timestamp_micro),
+                timestamp_micro // 1000000,
+                current_time.isoformat(),
+                user_id,
+                conv_id,
+                REDIS_TTL_SECONDS,
+                WORKER_ID,
+                CONV_UPDATES_CHANNEL,
+                timestamp_micro
+            ]
+        )
+        _append_to_cached_tail(conv_id, int(pos), role, content)
+        return msg_id, int(pos)
+
+    pos = await _save_message_script(
+        keys=[
+            f"{MSG_HASH_PREFIX}{msg_id}",
+            f"{MSG_LIST_PREFIX}{conv_id}",
+            f"{CONV_HASH_PREFIX}{conv_id}",
+            f"{USER_CONVS_ZSET_PREFIX}{user_id}"
+        ],
+        args=[
+            role,
+            content,
+            timestamp_micro // 1000000,
+            timestamp_micro,
+            current_time.isoformat(),
+            current_time.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            user_id,
+            conv_id,
+            REDIS_TTL_SECONDS,
+            MSG_HASH_PREFIX,
+            WORKER_ID,
+            CONV_UPDATES_CHANNEL
+        ]
+    )
+    _append_to_cached_tail(conv_id, int(pos), role, content)
     
-    return msg_id
+    return msg_id, int(pos)
+
+def _estimate_message_tokens(message: Dict[str, str]) -> int:
+    return len(message.get("content", "")) // CHARS_PER_TOKEN + MESSAGE_TOKEN_OVERHEAD
+
+def _cache_tail(conv_id: str, tail: Dict[str, Any]) -> None:
+    """Store a conversation tail, keeping at most CONVERSATION_CACHE_TAIL messages."""
+    if not _cache_coherent:
+        return
+    excess = len(tail["messages"]) - CONVERSATION_CACHE_TAIL
+    if excess > 0:
+        del tail["messages"][:excess]
+        tail["start"] += excess
+    _conversation_cache[conv_id] = tail
+    _conversation_cache.move_to_end(conv_id)
+    while len(_conversation_cache) > CONVERSATION_CACHE_SIZE:
+        _conversation_cache.popitem(last=False)
+
+def _append_to_cached_tail(conv_id: str, pos: int, role: str, content: str) -> None:
+    """Write-through for save_message; drops the tail if it missed an earlier write."""
+    _bump_conversation_generation(conv_id)
+    cached = _conversation_cache.get(conv_id)
+    if cached is None:
+        return
+    if cached["total"] != pos:
+        del _conversation_cache[conv_id]
+        CONVERSATION_CACHE_STATS["invalidations"] += 1
+        return
+    cached["messages"].append({"role": role, "content": content})
+    cached["total"] = pos + 1
+    CONVERSATION_CACHE_STATS["write_through"] += 1
+    _cache_tail(conv_id, cached)
+
+def _select_window(tail: Dict[str, Any], last_n: Optional[int], max_tokens: Optional[int]) -> Tuple[List[Dict[str, str]], bool]:
+    """
+    Pick the requested window from a conversation tail.
 
-async def get_conversation(conv_id: str) -> List[Dict[str, str]]:
+    Returns:
+        The window (copies of the messages) and whether the tail was long enough to
+        answer the request (it starts at the first message, holds last_n messages,
+        or the token budget ran out inside it)
+    """
+    messages = tail["messages"]
+    complete = tail["start"] == 0
+    if last_n is None and max_tokens is None:
+        return [dict(message) for message in messages], complete
+
+    window = messages[-last_n:] if last_n else messages
+    covered = complete or (last_n is not None and len(messages) >= last_n)
+    if max_tokens is not None:
+        used = 0
+        first = len(window)
+        for index in range(len(window) - 1, -1, -1):
+            cost = _estimate_message_tokens(window[index])
+            # Always keep at least the newest message
+            if used + cost > max_tokens and first < len(window):
+                covered = True
+                break
+            used += cost
+            first = index
+        window = window[first:]
+    return [dict(message) for message in window], covered
+
+async def _read_tail(conv_id: str, count: Optional[int]) -> Dict[str, Any]:
+    """
+    Read the last `count` messages of a conversation (all if None): one round trip in
+    the compact format, two with per-message hashes.
+    """
+    if COMPACT_STORAGE:
+        await _ensure_migrated(conv_id)
+        list_key = f"{COMPACT_MSG_LIST_PREFIX}{conv_id}"
+        async with redis_binary_client.pipeline(transaction=True) as pipeline:
+            pipeline.llen(list_key)
+            pipeline.lrange(list_key, -count if count else 0, -1)
+            total, records = await pipeline.execute()
+        messages = [message_codec.decode_message_dict(record) for record in records]
+        return {"messages": messages, "start": total - len(records), "total": total}
+
+    list_key = f"{MSG_LIST_PREFIX}{conv_id}"
+    async with redis_client.pipeline(transaction=True) as pipeline:
+        pipeline.llen(list_key)
+        pipeline.lrange(list_key, -count if count else 0, -1)
+        total, msg_ids = await pipeline.execute()
+
+    messages = []
+    if msg_ids:
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for msg_id in msg_ids:
+                pipeline.hmget(f"{MSG_HASH_PREFIX}{msg_id}", "role", "content")
+            results = await pipeline.execute()
+        for role, content in results:
+            if role is not None or content is not None:
+                messages.append({"role": role or "user", "content": content or ""})
+    return {"messages": messages, "start": total - len(msg_ids), "total": total}
+
+async def get_conversation(conv_id: str, last_n: Optional[int] = None, max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
     """
     Retrieve conversation messages efficiently.
     
+    Only the requested tail of the conversation is read, and recent tails are served
+    from an in-process write-through cache kept coherent through Redis pub/sub.
+    
     Args:
         conv_id: Conversation identifier
+        last_n: Return at most this many of the most recent messages
+        max_tokens: Return only as many recent messages as fit in this (estimated) token budget
         
     Returns:
-        List of message objects with role and content
+        List of message objects with role and content, oldest first
     """
-    # Get all message IDs for the conversation
-    msg_ids = await redis_client.lrange(f"{MSG_LIST_PREFIX}{conv_id}", 0, -1)
-    
-    if not msg_ids:
-        return []
-    
-    # Use pipeline for efficient batch retrieval
-    messages = []
-    async with redis_client.pipeline() as pipeline:
-        for msg_id in msg_ids:
-            pipeline.hgetall(f"{MSG_HASH_PREFIX}{msg_id}")
-        
-        results = await pipeline.execute()
-    
-    # Format messages
-    for result in results:
-        if result:
-            messages.append({
-                "role": result.get("role", "user"),
-                "content": result.get("content", "")
-            })
-    
-    return messages
+    cached = _conversation_cache.get(conv_id) if _cache_coherent else None
+    if cached is not None:
+        window, covered = _select_window(cached, last_n, max_tokens)
+        if covered:
+            _conversation_cache.move_to_end(conv_id)
+            CONVERSATION_CACHE_STATS["hits"] += 1
+            return window
+    CONVERSATION_CACHE_STATS["misses"] += 1
+
+    # Read a cache-sized tail; a token budget that outlasts it widens the read
+    fetch = None if last_n is None and max_tokens is None else max(last_n or 0, CONVERSATION_CACHE_TAIL)
+    generation = _conversation_generation(conv_id)
+    while True:
+        tail = await _read_tail(conv_id, fetch)
+        window, covered = _select_window(tail, last_n, max_tokens)
+        if covered or fetch is None:
+            break
+        fetch *= 4
+
+    # A write or invalidation that landed during the read may be missing from this tail
+    if _conversation_generation(conv_id) == generation:
+        _cache_tail(conv_id, tail)
+    else:
+        CONVERSATION_CACHE_STATS["stale_reads"] += 1
+    return window
+
+def get_conversation_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters for the conversation tail cache."""
+    lookups = CONVERSATION_CACHE_STATS["hits"] + CONVERSATION_CACHE_STATS["misses"]
+    return {
+        **CONVERSATION_CACHE_STATS,
+        "hit_rate": round(CONVERSATION_CACHE_STATS["hits"] / lookups, 3) if lookups else 0.0,
+        "cached_conversations": len(_conversation_cache),
+        "coherent": _cache_coherent,
+    }
 
 async def clear_conversation(conv_id: str) -> None:
     """
@@ -228,8 +853,12 @@ async def clear_conversation(conv_id: str) -> None:
     Args:
         conv_id: Conversation identifier
     """
-    # Get all message IDs
-    msg_ids = await redis_client.lrange(f"{MSG_LIST_PREFIX}{conv_id}", 0, -1)
+    # Get all message IDs and the owner, whose conversation index lists this conversation
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        pipeline.lrange(f"{MSG_LIST_PREFIX}{conv_id}", 0, -1)
+        pipeline.hget(f"{CONV_HASH_PREFIX}{conv_id}", "user_id")
+        msg_ids, user_id = await pipeline.execute()
+    _conversation_cache.pop(conv_id, None)
     
     # Use pipeline for efficient deletion
     async with redis_client.pipeline() as pipeline:
@@ -239,43 +868,155 @@ async def clear_conversation(conv_id: str) -> None:
         
         # Delete conversation data
         pipeline.delete(f"{MSG_LIST_PREFIX}{conv_id}")
+        pipeline.delete(f"{COMPACT_MSG_LIST_PREFIX}{conv_id}")
         pipeline.delete(f"{CONV_HASH_PREFIX}{conv_id}")
+        if user_id:
+            pipeline.zrem(f"{USER_CONVS_ZSET_PREFIX}{user_id}", conv_id)
+        
+        # Tell other workers to drop their cached tail
+        pipeline.publish(CONV_UPDATES_CHANNEL, f"{WORKER_ID}|{conv_id}|-1")
+        if vector_backend == "local":
+            # Vector hashes expire on their own; other workers drop them from their index now
+            pipeline.xadd(vector_index.VECTOR_UPDATES_STREAM, {'conv_id': conv_id, 'worker': WORKER_ID},
+                          maxlen=vector_index.VECTOR_UPDATES_MAXLEN, approximate=True)
         
         await pipeline.execute()
+    if vector_backend == "local":
+        vector_index.remove_conversation(conv_id)
+    # Reads that overlapped the deletion must not cache what they saw
+    _conversation_cache.pop(conv_id, None)
+    _bump_conversation_generation(conv_id)
 
-async def get_user_conversations(user_id: str = "anonymous", limit: int = 10) -> List[Dict[str, Any]]:
+async def _backfill_user_conversations(user_id: str) -> None:
     """
-    Get list of conversations for a user.
-    
+    Move a user's conversations from the old unordered set into the sorted index.
+
+    Runs once per user and worker; scores come from each conversation's updated_at.
+    Entries already in the sorted set (newer writes) are kept as they are.
+    """
+    if user_id in _backfilled_users:
+        return
+    old_key = f"{USER_CONVS_PREFIX}{user_id}"
+    conv_ids = await redis_client.smembers(old_key)
+    if conv_ids:
+        conv_ids = list(conv_ids)
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for conv_id in conv_ids:
+                pipeline.hget(f"{CONV_HASH_PREFIX}{conv_id}", "updated_at")
+            updated = await pipeline.execute()
+        scores = {conv_id: int(updated_at) * 1000000 for conv_id, updated_at in zip(conv_ids, updated) if updated_at}
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            if scores:
+                pipeline.zadd(f"{USER_CONVS_ZSET_PREFIX}{user_id}", scores, nx=True)
+                pipeline.expire(f"{USER_CONVS_ZSET_PREFIX}{user_id}", REDIS_TTL_SECONDS)
+            pipeline.delete(old_key)
+            await pipeline.execute()
+        print(f"Backfilled {len(scores)} conversations for user {user_id} into the sorted index")
+    _backfilled_users.add(user_id)
+
+def _parse_conversation_cursor(cursor: Optional[str]) -> Tuple[Optional[int], str]:
+    """Split a "<score>:<conv_id>" cursor; invalid or empty cursors start from the newest."""
+    if not cursor:
+        return None, ""
+    score, _, conv_id = cursor.partition(":")
+    try:
+        return int(score), conv_id
+    except ValueError:
+        return None, ""
+
+def _entries_after_cursor(ranges: List[List[Tuple[str, float]]], max_score: Optional[int],
+                          last_conv_id: str) -> List[Tuple[str, int]]:
+    """
+    Turn the ZREVRANGEBYSCORE replies of one page read into (conv_id, score) entries.
+
+    Without a cursor there is a single reply. With one, the first reply holds every
+    conversation tied with the cursor's score, in reverse member order; only those
+    sorting before the cursor's member are still unread. The second holds older ones.
+    """
+    entries = [(conv_id, int(score)) for conv_id, score in ranges[0] if max_score is None or conv_id < last_conv_id]
+    if len(ranges) > 1:
+        entries += [(conv_id, int(score)) for conv_id, score in ranges[1]]
+    return entries
+
+async def list_user_conversations(user_id: str = "anonymous", limit: int = 10,
+                                  cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Get one page of a user's conversations, most recently updated first.
+
+    Pages are read from the user's sorted conversation index, so the cost depends on
+    the page size rather than on how many conversations the user has. Metadata for
+    the page is fetched in one pipeline.
+
     Args:
         user_id: User identifier
         limit: Maximum number of conversations to return
-        
+        cursor: next_cursor from the previous page, or None for the first page
+
     Returns:
-        List of conversation metadata objects
+        Conversation metadata objects and the cursor of the next page (None on the last page)
     """
-    # Get user's conversation IDs
-    conv_ids = await redis_client.smembers(f"{USER_CONVS_PREFIX}{user_id}")
-    
-    if not conv_ids:
-        return []
-    
-    # Retrieve conversation metadata
-    conversations = []
-    for conv_id in conv_ids:
-        data = await redis_client.hgetall(f"{CONV_HASH_PREFIX}{conv_id}")
-        if data:
+    limit = max(1, min(limit, CONVERSATION_PAGE_MAX))
+    await _backfill_user_conversations(user_id)
+    index_key = f"{USER_CONVS_ZSET_PREFIX}{user_id}"
+    max_score, last_conv_id = _parse_conversation_cursor(cursor)
+
+    conversations: List[Dict[str, Any]] = []
+    next_cursor = None
+    # Entries whose metadata has expired are dropped, so a page can take another round
+    for _ in range(3):
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            if max_score is None:
+                pipeline.zrevrangebyscore(index_key, "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+            else:
+                pipeline.zrevrangebyscore(index_key, max_score, max_score, withscores=True)
+                pipeline.zrevrangebyscore(index_key, f"({max_score}", "-inf", start=0, num=limit + 1, withscores=True)
+            ranges = await pipeline.execute()
+        entries = _entries_after_cursor(ranges, max_score, last_conv_id)
+
+        has_more = len(entries) > limit - len(conversations)
+        entries = entries[:limit - len(conversations)]
+        if not entries:
+            next_cursor = None
+            break
+
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for conv_id, _ in entries:
+                pipeline.hgetall(f"{CONV_HASH_PREFIX}{conv_id}")
+            metadata = await pipeline.execute()
+
+        expired = []
+        for (conv_id, _), data in zip(entries, metadata):
+            if not data:
+                expired.append(conv_id)
+                continue
             # Convert timestamps and counts to appropriate types
             data["updated_at"] = int(data.get("updated_at", 0))
             data["message_count"] = int(data.get("message_count", 0))
             data["id"] = conv_id
             conversations.append(data)
+        if expired:
+            await redis_client.zrem(index_key, *expired)
+
+        last_conv_id, max_score = entries[-1][0], entries[-1][1]
+        next_cursor = f"{max_score}:{last_conv_id}" if has_more else None
+        if not has_more or len(conversations) >= limit:
+            break
+
+    return conversations, next_cursor
+
+async def get_user_conversations(user_id: str = "anonymous", limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Get list of conversations for a user, most recently updated first.
     
-    # Sort by last updated time (descending)
-    conversations.sort(key=lambda x: x["updated_at"], reverse=True)
-    
-    # Return limited number of results
-    return conversations[:limit]
+    Args:
+        user_id: User identifier
+        limit: Maximum number of conversations to return
+        
+    Returns:
+        List of conversation metadata objects
+    """
+    conversations, _ = await list_user_conversations(user_id, limit)
+    return conversations
 
 async def get_redis_memory_stats() -> Dict[str, Union[str, int]]:
     """
@@ -293,6 +1034,33 @@ async def get_redis_memory_stats() -> Dict[str, Union[str, int]]:
         "mem_fragmentation_ratio": info.get("mem_fragmentation_ratio", 0)
     }
 
+async def _embed_texts(texts: List[str], is_query: bool) -> np.ndarray:
+    """
+    Embed texts, reusing cached embeddings and encoding only the rest.
+
+    Queries get the BGE instruction prefix. Texts missing from the cache (repeated
+    ones only once) are encoded together with concurrent requests from other
+    conversations and then stored in the cache.
+    """
+    prefix = BGE_QUERY_INSTRUCTION if is_query else ""
+    inputs = [f"{prefix} {text}" for text in texts] if is_query else list(texts)
+    if embedding_cache is None:
+        return await embedding_service.embed(inputs)
+
+    keys = [embedding_cache.key(prefix, text) for text in texts]
+    found = await embedding_cache.get_many(keys)
+    # First position of every key still missing
+    missing: Dict[str, int] = {}
+    for index, embedding in enumerate(found):
+        if embedding is None:
+            missing.setdefault(keys[index], index)
+    if missing:
+        computed = await embedding_service.embed([inputs[index] for index in missing.values()])
+        new_embeddings = dict(zip(missing, computed))
+        await embedding_cache.put_many(list(new_embeddings.items()))
+        found = [embedding if embedding is not None else new_embeddings[key] for key, embedding in zip(keys, found)]
+    return np.asarray(found, dtype=np.float32)
+
 async def generate_embedding(text: str, is_query: bool = False) -> Optional[List[float]]:
     """
     Generate an embedding vector for the given text.
@@ -304,34 +1072,51 @@ async def generate_embedding(text: str, is_query: bool = False) -> Optional[List
     Returns:
         A list of floats representing the embedding vector, or None if generation fails
     """
-    if not vector_search_enabled or embedding_model is None:
+    if not vector_search_enabled or embedding_service is None:
         return None
 
     try:
-        # For BGE model, add instruction prefix for queries
-        if is_query:
-            text = f"{BGE_QUERY_INSTRUCTION} {text}"
-
-        # Generate embedding with normalization (recommended for BGE)
-        # Run in executor since it's CPU-bound
-        embedding = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: embedding_model.encode(text, normalize_embeddings=True)
-        )
-        return embedding.tolist()
+        embedding = await _embed_texts([text], is_query)
+        return embedding[0].tolist()
     except Exception as e:
         print(f"Error generating embedding: {str(e)}")
         return None
 
-async def index_message(msg_id: str, role: str, content: str, conv_id: str) -> bool:
+async def generate_embeddings(texts: List[str], is_query: bool = False) -> Optional[np.ndarray]:
+    """
+    Generate normalized embeddings for several texts through the shared embedding batches.
+
+    Args:
+        texts: The texts to embed
+        is_query: Whether these are queries (adds BGE instruction prefix)
+
+    Returns:
+        A float32 array of shape (len(texts), dimension), or None if generation fails
+    """
+    if not vector_search_enabled or embedding_service is None:
+        return None
+    if not texts:
+        return np.zeros((0, vector_dimension), dtype=np.float32)
+
+    try:
+        return await _embed_texts(texts, is_query)
+    except Exception as e:
+        print(f"Error generating embeddings: {str(e)}")
+        return None
+
+async def index_message(msg_id: str, role: str, content: str, conv_id: str, pos: Optional[int] = None) -> bool:
     """
     Index a message for vector search.
 
+    In the hash format the vector is stored as a binary blob next to a reference to
+    the message (ID and list position) instead of a copy of its content.
+
     Args:
         msg_id: Message identifier
         role: Message role ("user" or "assistant")
         content: Message content
         conv_id: Conversation identifier
+        pos: Position of the message in the conversation list, if known
 
     Returns:
         True if indexing was successful, False otherwise
@@ -339,6 +1124,41 @@ async def index_message(msg_id: str, role: str, content: str, conv_id: str) -> b
     if not vector_search_enabled:
         return False
 
+    if not _uses_json_vectors():
+        try:
+            # Generate embedding (don't use query instruction for stored messages)
+            embedding = await generate_embeddings([content], is_query=False)
+            if embedding is None:
+                return False
+
+            vector_key = f"{vector_key_prefix}{msg_id}"
+            vector_blob = _encode_vectors(embedding)[0]
+            timestamp = int(time.time())
+            pos = pos if pos is not None else -1
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.hset(vector_key, mapping={
+                    'msg_id': msg_id,
+                    'conv_id': conv_id,
+                    'role': role,
+                    'timestamp': timestamp,
+                    'pos': pos,
+                    'embedding': vector_blob
+                })
+                # Set expiration time to match conversation TTL
+                pipeline.expire(vector_key, REDIS_TTL_SECONDS)
+                if vector_backend == "local":
+                    # Other workers load the new vector into their in-process index from this stream
+                    pipeline.xadd(vector_index.VECTOR_UPDATES_STREAM, {'key': vector_key, 'worker': WORKER_ID},
+                                  maxlen=vector_index.VECTOR_UPDATES_MAXLEN, approximate=True)
+                await pipeline.execute()
+            if vector_backend == "local":
+                stored = np.frombuffer(vector_blob, dtype=embeddings.VECTOR_NUMPY_DTYPES[VECTOR_DTYPE])
+                vector_index.add(vector_key, stored, conv_id, role, timestamp, msg_id, pos)
+            return True
+        except Exception as e:
+            print(f"Error indexing message: {str(e)}")
+            return False
+
     try:
         # Generate embedding (don't use query instruction for stored messages)
         embedding = await generate_embedding(content, is_query=False)
@@ -367,6 +1187,71 @@ async def index_message(msg_id: str, role: str, content: str, conv_id: str) -> b
         print(f"Error indexing message: {str(e)}")
         return False
 
+async def _load_message_contents(refs: List[Tuple[str, str, int]]) -> List[Optional[str]]:
+    """
+    Resolve indexed message references to their content in one pipeline.
+
+    Args:
+        refs: (conv_id, msg_id, pos) per message; pos -1 if unknown
+
+    Returns:
+        Content per reference, or None if the message no longer exists
+    """
+    if not refs:
+        return []
+    async with redis_binary_client.pipeline(transaction=False) as pipeline:
+        for conv_id, msg_id, pos in refs:
+            pipeline.hget(f"{MSG_HASH_PREFIX}{msg_id}", "content")
+            if pos >= 0:
+                pipeline.lindex(f"{COMPACT_MSG_LIST_PREFIX}{conv_id}", pos)
+        replies = iter(await pipeline.execute())
+
+    contents: List[Optional[str]] = []
+    for conv_id, msg_id, pos in refs:
+        content = next(replies)
+        record = next(replies) if pos >= 0 else None
+        if content is not None:
+            contents.append(content.decode("utf-8"))
+            continue
+        # Compact records are matched by timestamp, so a position reused after a clear is not mistaken for the message
+        if record is not None:
+            timestamp_micro, _, record_content = message_codec.decode_message(record)
+            if msg_id == f"{conv_id}_{timestamp_micro}":
+                contents.append(record_content)
+                continue
+        contents.append(None)
+    return contents
+
+def _uses_json_vectors() -> bool:
+    """Whether vectors are RedisJSON documents (only possible with Redis Stack)."""
+    return vector_backend == "redisearch" and VECTOR_STORAGE_FORMAT == "json"
+
+async def _search_local_index(query_embedding: np.ndarray, limit: int,
+                              filter_conv_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Search the in-process vector index and resolve the message contents."""
+    query_vector = vector_reducer.apply(query_embedding)[0]
+    # Similarity is computed against the stored (possibly FLOAT16) vectors
+    matches = [
+        (key, meta, similarity)
+        for key, meta, similarity in vector_index.search(query_vector, limit, conv_id=filter_conv_id)
+        if similarity >= VECTOR_SIMILARITY_THRESHOLD
+    ]
+    contents = await _load_message_contents([(meta['conv_id'], meta['msg_id'], meta['pos']) for _, meta, _ in matches])
+    messages = []
+    for (_, meta, similarity), content in zip(matches, contents):
+        if content is None:
+            continue
+        messages.append({
+            'id': meta['msg_id'],
+            'content': content,
+            'role': meta['role'],
+            'conv_id': meta['conv_id'],
+            'timestamp': int(meta['timestamp']),
+            'pos': int(meta['pos']),
+            'similarity': similarity
+        })
+    return messages
+
 async def search_similar_messages(query: str, limit: int = 5,
                                 filter_conv_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """
@@ -385,7 +1270,7 @@ async def search_similar_messages(query: str, limit: int = 5,
 
     try:
         # Generate embedding for the query (with BGE instruction)
-        query_embedding = await generate_embedding(query, is_query=True)
+        query_embedding = await generate_embeddings([query], is_query=True)
         if query_embedding is None:
             return []
 
@@ -398,66 +1283,174 @@ async def search_similar_messages(query: str, limit: int = 5,
         else:
             query_str = base_query
 
-        # Convert embedding to bytes for Redis
-        query_vector = np.array(query_embedding, dtype=np.float32).tobytes()
+        if vector_backend == "local":
+            return await _search_local_index(query_embedding, limit, filter_conv_id)
 
-        # Execute vector search
-        q = Query(query_str).return_fields("content", "role", "conv_id", "timestamp", "score").dialect(2)
+        if _uses_json_vectors():
+            # Convert embedding to bytes for Redis
+            query_vector = query_embedding[0].tobytes()
+            q = Query(query_str).return_fields("content", "role", "conv_id", "timestamp", "score").dialect(2)
+            index_name = VECTOR_INDEX_NAME
+        else:
+            query_vector = _encode_vectors(query_embedding)[0]
+            q = Query(query_str).return_fields("msg_id", "role", "conv_id", "timestamp", "pos", "score").dialect(2)
+            index_name = vector_index_name
 
-        results = await redis_client.ft(VECTOR_INDEX_NAME).search(
+        # Execute vector search
+        results = await redis_client.ft(index_name).search(
             q,
             query_params={"BLOB": query_vector}
         )
 
+        # The index returns cosine distance; convert it to similarity before the threshold
+        docs = [doc for doc in results.docs if 1 - float(doc.score) >= VECTOR_SIMILARITY_THRESHOLD]
+        if _uses_json_vectors():
+            contents = [doc.content for doc in docs]
+        else:
+            contents = await _load_message_contents([(doc.conv_id, doc.msg_id, int(doc.pos)) for doc in docs])
+
         # Format results
         messages = []
-        for doc in results.docs:
-            score = float(doc.score)
-            # Only include results above similarity threshold
-            if score >= VECTOR_SIMILARITY_THRESHOLD:
-                messages.append({
-                    'id': doc.id.split(':')[-1],  # Extract ID from key
-                    'content': doc.content,
-                    'role': doc.role,
-                    'conv_id': doc.conv_id,
-                    'timestamp': int(doc.timestamp),
-                    'similarity': score
-                })
+        for doc, content in zip(docs, contents):
+            # Messages that expired or were cleared since indexing are skipped
+            if content is None:
+                continue
+            messages.append({
+                'id': getattr(doc, 'msg_id', None) or doc.id.split(':')[-1],  # Extract ID from key
+                'content': content,
+                'role': doc.role,
+                'conv_id': doc.conv_id,
+                'timestamp': int(doc.timestamp),
+                'similarity': 1 - float(doc.score)
+            })
+            if not _uses_json_vectors():
+                messages[-1]['pos'] = int(doc.pos)
 
         return messages
     except Exception as e:
         print(f"Error searching messages: {str(e)}")
         return []
 
-async def find_context_for_query(query: str, limit: int = 3) -> List[Dict[str, Any]]:
+def _merge_windows(positions: List[int], window: int) -> List[Tuple[int, int]]:
+    """Merge the [pos - window, pos + window] ranges of several hits, joining overlapping or adjacent ones."""
+    merged: List[Tuple[int, int]] = []
+    for pos in sorted(positions):
+        start, end = max(0, pos - window), pos + window
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+async def _read_message_ranges(ranges: List[Tuple[str, int, int]]) -> List[List[Dict[str, Any]]]:
+    """
+    Read position ranges of several conversations.
+
+    Compact conversations are answered by the first pipeline; conversations still in
+    the hash layout need one more pipeline for their message hashes.
+
+    Args:
+        ranges: (conv_id, start, end) with inclusive list positions
+
+    Returns:
+        Messages per range, each with role, content, pos and msg_id
+    """
+    async with redis_binary_client.pipeline(transaction=False) as pipeline:
+        for conv_id, start, end in ranges:
+            pipeline.lrange(f"{COMPACT_MSG_LIST_PREFIX}{conv_id}", start, end)
+            pipeline.lrange(f"{MSG_LIST_PREFIX}{conv_id}", start, end)
+        replies = await pipeline.execute()
+
+    windows: List[List[Dict[str, Any]]] = []
+    hash_ranges = []  # (range index, start, message IDs)
+    for index, (conv_id, start, _) in enumerate(ranges):
+        records, msg_ids = replies[2 * index], replies[2 * index + 1]
+        window = []
+        for offset, record in enumerate(records):
+            timestamp_micro, role, content = message_codec.decode_message(record)
+            window.append({"role": role, "content": content, "pos": start + offset, "msg_id": f"{conv_id}_{timestamp_micro}"})
+        if not records and msg_ids:
+            hash_ranges.append((index, start, [msg_id.decode("utf-8") for msg_id in msg_ids]))
+        windows.append(window)
+
+    if hash_ranges:
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for _, _, msg_ids in hash_ranges:
+                for msg_id in msg_ids:
+                    pipeline.hmget(f"{MSG_HASH_PREFIX}{msg_id}", ["role", "content"])
+            fields = iter(await pipeline.execute())
+        for index, start, msg_ids in hash_ranges:
+            for offset, msg_id in enumerate(msg_ids):
+                role, content = next(fields)
+                if role is not None and content is not None:
+                    windows[index].append({"role": role, "content": content, "pos": start + offset, "msg_id": msg_id})
+    return windows
+
+async def find_context_for_query(query: str, limit: int = 3, window: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Find relevant context across all conversations for a query.
     This is useful for providing context to the model from past interactions.
 
+    Each match gets the `window` messages before and after it instead of its whole
+    conversation. Windows of matches in the same conversation are merged and every
+    range is read in one pipeline; matches without a stored position fall back to
+    the conversation tail, read concurrently.
+
     Args:
         query: The query text
         limit: Maximum number of results to return
+        window: Messages on each side of a match (defaults to CONTEXT_WINDOW_MESSAGES)
 
     Returns:
-        List of message objects with conversation context
+        List of message objects with their surrounding context
     """
+    window = config.CONTEXT_WINDOW_MESSAGES if window is None else max(0, window)
+
     # First search for similar messages
     similar_messages = await search_similar_messages(query, limit=limit)
 
     if not similar_messages:
         return []
 
-    # For each similar message, get conversation context
-    results = []
+    # JSON-format vectors do not store positions; hash-layout messages record theirs
+    unknown = [msg for msg in similar_messages if msg.get('pos', -1) < 0]
+    if unknown:
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for msg in unknown:
+                pipeline.hget(f"{MSG_HASH_PREFIX}{msg['id']}", "pos")
+            for msg, pos in zip(unknown, await pipeline.execute()):
+                msg['pos'] = int(pos) if pos is not None else -1
+
+    positions: Dict[str, List[int]] = {}
     for msg in similar_messages:
-        conv_id = msg.get('conv_id')
-        if conv_id:
-            # Get a few messages around this one for context
-            conversation = await get_conversation(conv_id)
+        if msg['pos'] >= 0:
+            positions.setdefault(msg['conv_id'], []).append(msg['pos'])
+    ranges = [(conv_id, start, end) for conv_id, conv_positions in positions.items()
+              for start, end in _merge_windows(conv_positions, window)]
+    tail_conv_ids = list(dict.fromkeys(msg['conv_id'] for msg in similar_messages if msg['pos'] < 0))
+
+    windows, *tails = await asyncio.gather(
+        _read_message_ranges(ranges),
+        *(get_conversation(conv_id, last_n=2 * window + 1) for conv_id in tail_conv_ids)
+    )
+    tail_by_conv = dict(zip(tail_conv_ids, tails))
 
-            # Add conversation reference to the result
-            msg['context'] = conversation
+    results = []
+    for msg in similar_messages:
+        conv_id, pos = msg['conv_id'], msg['pos']
+        if pos < 0:
+            msg['context'] = tail_by_conv.get(conv_id, [])
             results.append(msg)
+            continue
+        merged = next(messages for (range_conv, start, end), messages in zip(ranges, windows)
+                      if range_conv == conv_id and start <= pos <= end)
+        context = [message for message in merged if abs(message['pos'] - pos) <= window]
+        # A position reused after the conversation was cleared holds a different message
+        if not any(message['pos'] == pos and message['msg_id'] == msg['id'] for message in context):
+            continue
+        msg['context'] = [{"role": message["role"], "content": message["content"]} for message in context]
+        msg['context_start'] = context[0]['pos']
+        results.append(msg)
 
     return results
 
@@ -470,7 +1463,203 @@ def is_vector_search_enabled() -> bool:
     """
     return vector_search_enabled
 
+def get_embedding_stats() -> Dict[str, Any]:
+    """
+    Get embedding batching, throughput and cache metrics for this worker.
+
+    Returns:
+        Batcher metrics with cache hit rates, or {"enabled": False} without an embedding model
+    """
+    if embedding_service is None:
+        return {"enabled": False}
+    stats = {"enabled": True, **embedding_service.get_stats()}
+    if embedding_cache is not None:
+        stats["cache"] = embedding_cache.get_stats()
+    return stats
+
+def get_vector_index_stats() -> Dict[str, Any]:
+    """
+    Get the active vector search backend and, for the in-process index, its metrics.
+
+    Returns:
+        Backend name, index name or key prefix, and local index counters when used
+    """
+    stats: Dict[str, Any] = {"backend": vector_backend}
+    if vector_backend == "local":
+        stats.update(key_prefix=vector_key_prefix, **vector_index.get_stats())
+    elif vector_backend == "redisearch":
+        stats["index"] = VECTOR_INDEX_NAME if _uses_json_vectors() else vector_index_name
+    return stats
+
 # Close the Redis connection when done
 async def close():
-    """Close the Redis connection"""
-    await redis_client.close()
\ No newline at end of file
+    """Close the Redis connections"""
+    global _invalidation_task, embedding_service, embedding_cache
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        _invalidation_task = None
+    if embedding_service is not None:
+        await embedding_service.close()
+        embedding_service = None
+    embedding_cache = None
+    if vector_backend == "local":
+        await vector_index.stop()
+    await redis_client.close()
+    await redis_binary_client.close()
+
+async def conversation_memory_usage(conv_id: str) -> int:
+    """Bytes used by a conversation's message storage (both layouts), via MEMORY USAGE."""
+    keys = [f"{MSG_LIST_PREFIX}{conv_id}", f"{COMPACT_MSG_LIST_PREFIX}{conv_id}"]
+    keys += [f"{MSG_HASH_PREFIX}{msg_id}" for msg_id in await redis_client.lrange(f"{MSG_LIST_PREFIX}{conv_id}", 0, -1)]
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        for key in keys:
+            pipeline.memory_usage(key)
+        usages = await pipeline.execute()
+    return sum(usage or 0 for usage in usages)
+
+async def benchmark_save_message(iterations: int = 200) -> Dict[str, float]:
+    """
+    Compare the single-call save_message against the previous sequence of ten
+    separate commands, on throwaway keys, and the storage each layout needs.
+
+    Returns:
+        Average milliseconds and bytes per message for each variant
+    """
+    conv_id = f"bench_{int(time.time())}"
+    user_id = f"bench_user_{conv_id}"
+    content = "benchmark message " * 20
+
+    async def save_serial(index: int) -> None:
+        msg_id = f"{conv_id}_serial_{index}"
+        current_time = datetime.now()
+        now = int(time.time())
+        await redis_client.hset(f"{MSG_HASH_PREFIX}{msg_id}", mapping={
+            "role": "user",
+            "content": content,
+            "timestamp": now,
+            "timestamp_micro": int(time.time() * 1000000),
+            "datetime_iso": current_time.isoformat(),
+            "datetime_readable": current_time.strftime("%Y-%m-%d %H:%M:%S.%f")
+        })
+        await redis_client.rpush(f"{MSG_LIST_PREFIX}{conv_id}", msg_id)
+        await redis_client.hset(f"{CONV_HASH_PREFIX}{conv_id}", mapping={"updated_at": now, "user_id": user_id})
+        await redis_client.hincrby(f"{CONV_HASH_PREFIX}{conv_id}", "message_count", 1)
+        await redis_client.expire(f"{MSG_HASH_PREFIX}{msg_id}", REDIS_TTL_SECONDS)
+        await redis_client.expire(f"{MSG_LIST_PREFIX}{conv_id}", REDIS_TTL_SECONDS)
+        await redis_client.expire(f"{CONV_HASH_PREFIX}{conv_id}", REDIS_TTL_SECONDS)
+        await redis_client.sadd(f"{USER_CONVS_PREFIX}{user_id}", conv_id)
+        await redis_client.expire(f"{USER_CONVS_PREFIX}{user_id}", REDIS_TTL_SECONDS)
+
+    results = {}
+    for name, save in (("serial", save_serial),
+                       ("single_call", lambda index: save_message(conv_id, "user", content, user_id))):
+        await clear_conversation(conv_id)
+        started = time.perf_counter()
+        for index in range(iterations):
+            await save(index)
+        results[f"{name}_ms"] = (time.perf_counter() - started) * 1000 / iterations
+        try:
+            results[f"{name}_bytes"] = await conversation_memory_usage(conv_id) / iterations
+        except Exception:
+            results[f"{name}_bytes"] = 0.0
+
+    await clear_conversation(conv_id)
+    await redis_client.delete(f"{USER_CONVS_PREFIX}{user_id}", f"{USER_CONVS_ZSET_PREFIX}{user_id}")
+    results["speedup"] = results["serial_ms"] / results["single_call_ms"] if results["single_call_ms"] else 0.0
+    return results
+
+async def vector_memory_report(samples: int = 50, content_chars: int = 600) -> Dict[str, Any]:
+    """
+    Compare the memory used per indexed message by each vector storage layout.
+
+    Writes `samples` throwaway documents per layout outside the index prefixes,
+    measures them with MEMORY USAGE and deletes them. The vector copy held by the
+    HNSW index is estimated separately from the vector type and dimension.
+    Live index sizes come from FT.INFO.
+
+    Args:
+        samples: Documents written per layout
+        content_chars: Message length used for the JSON layout's content copy
+
+    Returns:
+        Per-layout bytes per message and the live index stats
+    """
+    dimension = vector_dimension
+    reduced_dim = vector_reducer.dim if vector_reducer is not None and vector_reducer.mode != "none" else min(config.VECTOR_REDUCED_DIM, dimension)
+    vectors = embeddings.normalize_rows(np.random.default_rng(0).standard_normal((samples, dimension)).astype(np.float32))
+    content = ("memory report sample text " * (content_chars // 26 + 1))[:content_chars]
+    prefix = f"vector_report:{uuid.uuid4().hex}:"
+    layouts = {
+        "json_float32": ("json", np.float32, dimension),
+        "hash_float32": ("hash", np.float32, dimension),
+        "hash_float16": ("hash", np.float16, dimension),
+        f"hash_float16_{reduced_dim}d": ("hash", np.float16, reduced_dim),
+    }
+
+    report: Dict[str, Any] = {"dimension": dimension, "samples": samples, "layouts": {}}
+    for name, (kind, dtype, dim) in layouts.items():
+        keys = [f"{prefix}{name}:{index}" for index in range(samples)]
+        rows = embeddings.normalize_rows(vectors[:, :dim]).astype(dtype)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                for index, key in enumerate(keys):
+                    msg_id = f"report_{int(time.time() * 1000000)}_{index}"
+                    if kind == "json":
+                        pipeline.execute_command("JSON.SET", key, "$", json.dumps({
+                            'id': msg_id, 'content': content, 'role': 'user', 'conv_id': 'report',
+                            'timestamp': int(time.time()), 'embedding': rows[index].tolist()
+                        }))
+                    else:
+                        pipeline.hset(key, mapping={
+                            'msg_id': msg_id, 'conv_id': 'report', 'role': 'user',
+                            'timestamp': int(time.time()), 'pos': index, 'embedding': rows[index].tobytes()
+                        })
+                await pipeline.execute()
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                for key in keys:
+                    pipeline.memory_usage(key)
+                usages = await pipeline.execute()
+            keyspace_bytes = sum(usage or 0 for usage in usages) / samples
+            index_vector_bytes = dim * np.dtype(dtype).itemsize
+            report["layouts"][name] = {
+                "keyspace_bytes": round(keyspace_bytes),
+                "index_vector_bytes": index_vector_bytes,
+                "total_bytes": round(keyspace_bytes + index_vector_bytes),
+            }
+        except Exception as e:
+            report["layouts"][name] = {"error": str(e)}
+        finally:
+            await redis_client.delete(*keys)
+
+    baseline = report["layouts"].get("json_float32", {}).get("total_bytes")
+    if baseline:
+        for layout in report["layouts"].values():
+            if "total_bytes" in layout:
+                layout["ratio_to_json"] = round(layout["total_bytes"] / baseline, 3)
+
+    report["active"] = get_vector_index_stats()
+    if vector_backend == "redisearch":
+        try:
+            info = await redis_client.ft(report["active"]["index"]).info()
+            report["active"].update({
+                "num_docs": info.get("num_docs"),
+                "vector_index_sz_mb": info.get("vector_index_sz_mb"),
+                "inverted_sz_mb": info.get("inverted_sz_mb"),
+            })
+        except Exception as e:
+            report["active"]["error"] = str(e)
+    return report
+
+if __name__ == "__main__":
+    async def main_benchmark():
+        results = await benchmark_save_message()
+        print(f"save_message, serial commands: {results['serial_ms']:.3f} ms/message, {results['serial_bytes']:.0f} bytes/message")
+        print(f"save_message, single Lua call ({MESSAGE_STORAGE_FORMAT if COMPACT_STORAGE else 'hash'} format): "
+              f"{results['single_call_ms']:.3f} ms/message, {results['single_call_bytes']:.0f} bytes/message")
+        print(f"Speedup: {results['speedup']:.1f}x")
+        report = await vector_memory_report()
+        for name, layout in report["layouts"].items():
+            print(f"Vector storage {name}: {layout}")
+        await close()
+
+    asyncio.run(main_benchmark())
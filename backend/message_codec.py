@@ -0,0 +1,69 @@
+import os
+import zlib
+import logging
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger("message_codec")
+
+# msgpack is required for the compact storage format; memory falls back to hashes without it
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# zstd is optional: long messages fall back to zlib when the zstandard package is not installed
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+
+MESSAGE_COMPRESS_MIN_BYTES = int(os.getenv("MESSAGE_COMPRESS_MIN_BYTES", "1024"))  # Compress message content at or above this size
+
+# Content codecs, stored per record so readers never need to guess
+CODEC_PLAIN = 0
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+
+# Roles are stored as small integers; unknown roles are stored as text
+_ROLE_CODES = {"user": 0, "assistant": 1, "system": 2}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+def is_available() -> bool:
+    """Whether the compact format can be used (msgpack installed)."""
+    return msgpack is not None
+
+def encode_message(role: str, content: str, timestamp_micro: int) -> bytes:
+    """
+    Pack one message into a compact record: [timestamp_micro, role, codec, content].
+
+    The message ID and all date fields of the hash layout are derived from
+    timestamp_micro, so they are not stored. Content of MESSAGE_COMPRESS_MIN_BYTES
+    or more is compressed when that actually saves space.
+    """
+    data = content.encode("utf-8")
+    codec = CODEC_PLAIN
+    if len(data) >= MESSAGE_COMPRESS_MIN_BYTES:
+        if zstandard is not None:
+            compressed, compressed_codec = _zstd_compressor.compress(data), CODEC_ZSTD
+        else:
+            compressed, compressed_codec = zlib.compress(data, 6), CODEC_ZLIB
+        if len(compressed) < len(data):
+            data, codec = compressed, compressed_codec
+    return msgpack.packb([timestamp_micro, _ROLE_CODES.get(role, role), codec, data], use_bin_type=True)
+
+def decode_message(record: bytes) -> Tuple[int, str, str]:
+    """Unpack a record into (timestamp_micro, role, content)."""
+    timestamp_micro, role, codec, data = msgpack.unpackb(record, raw=False)
+    if codec == CODEC_ZSTD:
+        data = _zstd_decompressor.decompress(data)
+    elif codec == CODEC_ZLIB:
+        data = zlib.decompress(data)
+    role = _ROLE_NAMES.get(role, role) if isinstance(role, int) else role
+    return timestamp_micro, role, data.decode("utf-8")
+
+def decode_message_dict(record: bytes) -> Dict[str, Any]:
+    """Unpack a record into the role/content dict used for prompts."""
+    _, role, content = decode_message(record)
+    return {"role": role, "content": content}
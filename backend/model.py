@@ -1,6 +1,7 @@
 from llama_cpp import Llama
 import os
 import asyncio
+import threading
 from typing import List, Dict, Any, AsyncIterator, Union, Optional
 import utils
 import re # Added for checking commands
@@ -28,6 +29,10 @@ llm = Llama(
     verbose=config.LLAMA_VERBOSE
 )
 
+# llama.cpp contexts are not thread-safe: every call into `llm` is serialized through this lock
+# so blocking completions can run in an executor without overlapping a stream.
+_llm_lock = asyncio.Lock()
+
 def _extract_and_clean_command(text: str) -> tuple[Optional[str], str]:
     """Detects /think or /no_think, returns the command and text with command removed."""
     text_lower = text.lower()
@@ -116,15 +121,20 @@ async def generate_response(
     print(f"[MODEL_DEBUG] generate_response: Effective system prompt for model: '{effective_system_prompt}'")
     print(f"[MODEL_DEBUG] generate_response: Final prompt string to model (first 300 chars): {final_prompt_str[:300]}")
 
-    response = llm(
-        prompt=final_prompt_str,
-        max_tokens=max_tokens,
-        temperature=config.TEMPERATURE,
-        top_k=config.TOP_K,
-        top_p=config.TOP_P,
-        min_p=config.MIN_P,
-        repeat_penalty=config.REPEAT_PENALTY
-    )
+    # Run the blocking completion off the event loop so concurrent pipeline stages keep progressing
+    async with _llm_lock:
+        response = await asyncio.get_event_loop().run_in_executor(
+            None,
+            lambda: llm(
+                prompt=final_prompt_str,
+                max_tokens=max_tokens,
+                temperature=config.TEMPERATURE,
+                top_k=config.TOP_K,
+                top_p=config.TOP_P,
+                min_p=config.MIN_P,
+                repeat_penalty=config.REPEAT_PENALTY
+            )
+        )
     return response["choices"][0]["text"]
 
 async def generate_stream(
@@ -204,30 +214,66 @@ async def generate_stream(
     print(f"[MODEL_DEBUG] generate_stream: Effective system prompt for model: '{effective_system_prompt}'")
     print(f"[MODEL_DEBUG] generate_stream: Final prompt string to model (first 300 chars): {final_prompt_str[:300]}")
 
-    stream = llm(
-        prompt=final_prompt_str,
-        max_tokens=max_tokens,
-        temperature=config.TEMPERATURE,
-        top_k=config.TOP_K,
-        top_p=config.TOP_P,
-        min_p=config.MIN_P,
-        repeat_penalty=config.REPEAT_PENALTY,
-        stream=True
-    )
-
-    try:
-        for chunk_idx, chunk in enumerate(stream):
-            chunk_str_repr = str(chunk)
-            print(f"[MODEL_DEBUG] generate_stream: Received chunk {chunk_idx}: {chunk_str_repr[:200]}{'...' if len(chunk_str_repr) > 200 else ''}")
-            try:
-                token = chunk["choices"][0]["text"]
-                print(f"[MODEL_TOKEN_DEBUG] Raw token from llama-cpp: '{token.encode('unicode_escape').decode('utf-8')}'")
-                yield token
-            except (KeyError, IndexError) as e_chunk:
-                print(f"[MODEL_ERROR] generate_stream: Error accessing token in chunk {chunk_idx}: {e_chunk}. Chunk: {chunk_str_repr}")
-    except Exception as e_stream:
-        print(f"[MODEL_ERROR] generate_stream: Exception during llm streaming: {e_stream}")
-        print(f"[MODEL_ERROR] generate_stream: Traceback:\n{traceback.format_exc()}")
-        # Put the exception itself or a marker onto the queue if needed, or re-raise.
-        # For now, re-raising will propagate it to the task.
-        raise e_stream # Send error sentinel
\ No newline at end of file
+    # The blocking llama iterator runs on an executor thread and hands tokens back through a queue,
+    # so other pipeline stages keep running on the event loop while tokens are generated.
+    # The model lock is held until the producer thread has stopped.
+    loop = asyncio.get_running_loop()
+    tokens: asyncio.Queue = asyncio.Queue()
+    stop_event = threading.Event()
+    done = object()
+
+    def _produce() -> None:
+        stream = None
+        try:
+            stream = llm(
+                prompt=final_prompt_str,
+                max_tokens=max_tokens,
+                temperature=config.TEMPERATURE,
+                top_k=config.TOP_K,
+                top_p=config.TOP_P,
+                min_p=config.MIN_P,
+                repeat_penalty=config.REPEAT_PENALTY,
+                stream=True
+            )
+            for chunk_idx, chunk in enumerate(stream):
+                if stop_event.is_set():
+                    break
+                chunk_str_repr = str(chunk)
+                print(f"[MODEL_DEBUG] generate_stream: Received chunk {chunk_idx}: {chunk_str_repr[:200]}{'...' if len(chunk_str_repr) > 200 else ''}")
+                try:
+                    token = chunk["choices"][0]["text"]
+                except (KeyError, IndexError) as e_chunk:
+                    print(f"[MODEL_ERROR] generate_stream: Error accessing token in chunk {chunk_idx}: {e_chunk}. Chunk: {chunk_str_repr}")
+                    continue
+                loop.call_soon_threadsafe(tokens.put_nowait, token)
+        except Exception as e_stream:
+            print(f"[MODEL_ERROR] generate_stream: Exception during llm streaming: {e_stream}")
+            print(f"[MODEL_ERROR] generate_stream: Traceback:\n{traceback.format_exc()}")
+            loop.call_soon_threadsafe(tokens.put_nowait, e_stream)
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            loop.call_soon_threadsafe(tokens.put_nowait, done)
+
+    async with _llm_lock:
+        producer = loop.run_in_executor(None, _produce)
+        try:
+            while True:
+                item = await tokens.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item # Propagate the streaming error to the caller's task
+                print(f"[MODEL_TOKEN_DEBUG] Raw token from llama-cpp: '{item.encode('unicode_escape').decode('utf-8')}'")
+                yield item
+        finally:
+            # Abandoned or failed streams stop the producer before the model is released
+            stop_event.set()
+            cancelled = False
+            while not producer.done():
+                try:
+                    await asyncio.shield(producer)
+                except asyncio.CancelledError:
+                    cancelled = True # Keep the lock until the thread is out of llama
+            if cancelled:
+                raise asyncio.CancelledError()
@@ -0,0 +1,264 @@
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import memory
+
+logger = logging.getLogger("passages")
+
+# Constants
+PASSAGE_TARGET_CHARS = int(os.getenv("PASSAGE_TARGET_CHARS", "600"))  # Approximate passage size when splitting page content
+WEB_PROMPT_TOKEN_BUDGET = int(os.getenv("WEB_PROMPT_TOKEN_BUDGET", "1500"))  # Tokens of source text allowed in the web prompt
+CHARS_PER_TOKEN = 4  # Rough estimate used for budgeting, good enough for English web text
+MIN_PASSAGE_CHARS = 40  # Shorter passages are merged into their neighbours or dropped
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "8"))  # Differing bits (of 64) still counted as a duplicate; unrelated texts differ by ~32
+MIN_DEDUP_CHARS = 80  # Content blocks shorter than this are never treated as duplicates
+SHINGLE_SIZE = 3  # Words per shingle for SimHash fingerprints
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text from its length."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+_WORD_PATTERN = re.compile(r'\w+')
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of text over word shingles.
+    Near-duplicate texts (syndicated copies, boilerplate edits) differ in only a few bits.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return 0
+    shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little') for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # Each shingle votes on every bit; the fingerprint keeps the majority
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int32)
+    votes = bits.sum(axis=0) * 2 - len(shingles)
+    return int(np.bitwise_or.reduce(np.left_shift(np.uint64(1), _BIT_SHIFTS[votes > 0]), initial=np.uint64(0)))
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count('1')
+
+def _is_near_duplicate(fingerprint: int, seen: List[int]) -> bool:
+    return any(hamming_distance(fingerprint, other) <= SIMHASH_MAX_DISTANCE for other in seen)
+
+def dedupe_articles(articles: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Remove near-duplicate sources and content blocks before prompt assembly.
+
+    Articles are expected in rank order; the first copy of duplicated text is kept.
+    A whole article is dropped when its text is a near-duplicate of an earlier one
+    (syndicated copies), otherwise individual content blocks repeated from earlier
+    articles are removed. Articles are updated in place.
+
+    Args:
+        articles: Formatted articles from format_search_results
+
+    Returns:
+        Counts of removed sources and blocks and the estimated tokens saved
+    """
+    stats = {"sources_removed": 0, "blocks_removed": 0, "tokens_saved": 0}
+    seen_documents: List[int] = []
+    seen_blocks: List[int] = []
+    kept = []
+
+    for article in articles:
+        content = article.get('content', [])
+        document_text = ' '.join(elem.get('text', '') for elem in content)
+        if document_text:
+            fingerprint = simhash(document_text)
+            if _is_near_duplicate(fingerprint, seen_documents):
+                stats["sources_removed"] += 1
+                stats["tokens_saved"] += estimate_tokens(document_text)
+                logger.info(f"Dropping near-duplicate source {article.get('url', '')}")
+                continue
+            seen_documents.append(fingerprint)
+
+        unique_content = []
+        for elem in content:
+            text = elem.get('text', '')
+            if len(text) >= MIN_DEDUP_CHARS:
+                fingerprint = simhash(text)
+                if _is_near_duplicate(fingerprint, seen_blocks):
+                    stats["blocks_removed"] += 1
+                    stats["tokens_saved"] += estimate_tokens(text)
+                    continue
+                seen_blocks.append(fingerprint)
+            unique_content.append(elem)
+        article['content'] = unique_content
+        kept.append(article)
+
+    articles[:] = kept
+    return stats
+
+def _split_long_text(text: str, target_chars: int) -> List[str]:
+    """Split a single long block at sentence boundaries into chunks of about target_chars."""
+    chunks: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        # Text without sentence punctuation is cut at fixed length
+        while len(sentence) > target_chars * 2:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:target_chars])
+            sentence = sentence[target_chars:]
+        if current and len(current) + len(sentence) + 1 > target_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_passages(content: List[Dict[str, str]], target_chars: int = PASSAGE_TARGET_CHARS) -> List[str]:
+    """
+    Group extracted content elements into passages of roughly target_chars.
+
+    Headings start a new passage and stay attached to the text that follows them,
+    so a passage keeps its section context when it is ranked on its own.
+
+    Args:
+        content: Extracted elements ({'type', 'text'}) in document order
+        target_chars: Approximate passage length in characters
+
+    Returns:
+        Passages in document order
+    """
+    passages: List[str] = []
+    current = ""
+
+    def flush() -> None:
+        nonlocal current
+        if len(current) >= MIN_PASSAGE_CHARS:
+            passages.append(current)
+        current = ""
+
+    for elem in content:
+        text = elem.get('text', '')
+        if not text:
+            continue
+        if elem.get('type', 'p').startswith('h'):
+            flush()
+            current = text
+            continue
+        if len(text) > target_chars * 2:
+            flush()
+            passages.extend(chunk for chunk in _split_long_text(text, target_chars) if len(chunk) >= MIN_PASSAGE_CHARS)
+            continue
+        if current and len(current) + len(text) + 1 > target_chars:
+            flush()
+        current = f"{current}\n{text}" if current else text
+    flush()
+    return passages
+
+def pack_passages(
+    scores: np.ndarray,
+    passage_refs: List[Tuple[int, int, str]],
+    num_articles: int,
+    token_budget: int
+) -> Dict[int, List[Tuple[int, str]]]:
+    """
+    Pick the highest scoring passages that fit in token_budget.
+
+    The best passage of every article is considered first so each source that
+    made it into the results can still be cited; the rest of the budget goes to
+    the highest scores overall. Passages that do not fit are skipped so smaller
+    ones can still use the remaining budget.
+
+    Returns:
+        Article index -> [(passage index, text)] in document order
+    """
+    order = np.argsort(-scores, kind='stable')
+    best_per_article: Dict[int, int] = {}
+    for ref_index in order:
+        article_index = passage_refs[ref_index][0]
+        if article_index not in best_per_article:
+            best_per_article[article_index] = int(ref_index)
+            if len(best_per_article) == num_articles:
+                break
+
+    selected: Dict[int, List[Tuple[int, str]]] = {}
+    chosen = set()
+    used = 0
+    for ref_index in [*best_per_article.values(), *(int(i) for i in order)]:
+        if ref_index in chosen:
+            continue
+        article_index, passage_index, text = passage_refs[ref_index]
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            continue
+        chosen.add(ref_index)
+        used += cost
+        selected.setdefault(article_index, []).append((passage_index, text))
+
+    for article_passages in selected.values():
+        article_passages.sort()
+    return selected
+
+async def select_passages(query: str, articles: List[Dict[str, Any]], token_budget: int = WEB_PROMPT_TOKEN_BUDGET) -> Optional[Dict[str, int]]:
+    """
+    Rank the passages of every article against the query and keep the best ones.
+
+    Splits each article's content into passages, embeds them together with the
+    query (concurrent calls that share one embedding batch), scores them by cosine
+    similarity to the query and packs the best into token_budget. Selected passages
+    are stored in article['passages'] (document order); articles with nothing
+    selected are removed, so no source is cited without text.
+
+    Args:
+        query: The user's question
+        articles: Formatted articles from format_search_results, updated in place
+        token_budget: Estimated tokens of source text to keep
+
+    Returns:
+        Ranking stats, or None if embeddings are unavailable (articles are left untouched)
+    """
+    passage_refs: List[Tuple[int, int, str]] = []  # (article index, passage index, text)
+    for article_index, article in enumerate(articles):
+        for passage_index, text in enumerate(split_passages(article.get('content', []))):
+            passage_refs.append((article_index, passage_index, text))
+    if not passage_refs:
+        return None
+
+    # The query carries the instruction prefix, so it is a separate call, issued together with the passages
+    query_embedding, passage_embeddings = await asyncio.gather(
+        memory.generate_embeddings([query], is_query=True),
+        memory.generate_embeddings([text for _, _, text in passage_refs])
+    )
+    if query_embedding is None or passage_embeddings is None:
+        return None
+
+    # Embeddings are normalized, so the dot product is the cosine similarity
+    scores = passage_embeddings @ query_embedding[0]
+    selected = pack_passages(scores, passage_refs, len(articles), token_budget)
+
+    for article_index, article in enumerate(articles):
+        article['passages'] = [text for _, text in selected.get(article_index, [])]
+    sources = len(articles)
+    articles[:] = [article for article in articles if article['passages']]
+
+    stats = {
+        "sources_dropped": sources - len(articles),
+        "passages": len(passage_refs),
+        "selected": sum(len(article_passages) for article_passages in selected.values()),
+        "input_tokens": sum(estimate_tokens(text) for _, _, text in passage_refs),
+        "prompt_tokens": sum(estimate_tokens(text) for article_passages in selected.values() for _, text in article_passages),
+    }
+    logger.info(f"Passage ranking kept {stats['selected']}/{stats['passages']} passages, "
+                f"~{stats['prompt_tokens']} of ~{stats['input_tokens']} tokens")
+    return stats
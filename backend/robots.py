@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import ClientTimeout
+
+from . import memory
+
+logger = logging.getLogger("robots")
+
+# Constants
+ROBOTS_CACHE_TTL = int(os.getenv("ROBOTS_CACHE_TTL", "86400"))  # Seconds to keep a fetched robots.txt policy
+ROBOTS_ERROR_TTL = int(os.getenv("ROBOTS_ERROR_TTL", "600"))  # Seconds to keep an allow-all policy after a failed fetch
+ROBOTS_MEMORY_CACHE_SIZE = int(os.getenv("ROBOTS_MEMORY_CACHE_SIZE", "2048"))  # Hosts kept in the in-process tier
+ROBOTS_USER_AGENT = os.getenv("ROBOTS_USER_AGENT", "*").lower()  # Product token used to select robots.txt groups
+ROBOTS_FETCH_TIMEOUT = 5  # Seconds
+ROBOTS_MAX_BYTES = 512 * 1024  # Ignore anything past this size, as recommended by RFC 9309
+ROBOTS_KEY_PREFIX = "robots:"  # Redis tier, shared across workers
+
+class RobotsPolicy:
+    """
+    Parsed robots.txt rules for one user agent, following RFC 9309:
+    the longest matching rule wins, Allow wins ties, and `*` / `$` wildcards are supported.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[bool, str]]] = None):
+        # (allow, pattern) pairs, compiled once per policy
+        self.rules = rules or []
+        self._compiled = [(allow, len(pattern), _compile_pattern(pattern)) for allow, pattern in self.rules]
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str = ROBOTS_USER_AGENT) -> "RobotsPolicy":
+        """Parse robots.txt content, keeping the rules of the groups that apply to user_agent."""
+        groups: List[Tuple[List[str], List[Tuple[bool, str]]]] = []
+        agents: List[str] = []
+        rules: List[Tuple[bool, str]] = []
+        in_rules = False
+
+        for raw_line in text.splitlines():
+            line = raw_line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            field, value = line.split(':', 1)
+            field = field.strip().lower()
+            value = value.strip()
+
+            if field == 'user-agent':
+                # A user-agent line after rules starts a new group
+                if in_rules:
+                    groups.append((agents, rules))
+                    agents, rules, in_rules = [], [], False
+                agents.append(value.lower())
+            elif field in ('allow', 'disallow'):
+                in_rules = True
+                if agents and value:  # An empty Disallow means "allow everything"
+                    rules.append((field == 'allow', value))
+        if agents:
+            groups.append((agents, rules))
+
+        # Prefer groups naming our product token, otherwise fall back to the "*" groups
+        matched = [group_rules for group_agents, group_rules in groups
+                   if user_agent != '*' and any(agent != '*' and agent in user_agent for agent in group_agents)]
+        if not matched:
+            matched = [group_rules for group_agents, group_rules in groups if '*' in group_agents]
+        return cls([rule for group_rules in matched for rule in group_rules])
+
+    def is_allowed(self, url: str) -> bool:
+        """Return True if the path (and query) of url may be fetched."""
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+        if path == '/robots.txt':
+            return True
+
+        best_length = -1
+        allowed = True
+        for allow, length, regex in self._compiled:
+            if regex.match(path) and (length > best_length or (length == best_length and allow)):
+                best_length = length
+                allowed = allow
+        return allowed
+
+    def to_json(self) -> str:
+        return json.dumps(self.rules)
+
+    @classmethod
+    def from_json(cls, data: str) -> "RobotsPolicy":
+        return cls([(bool(allow), pattern) for allow, pattern in json.loads(data)])
+
+def _compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Translate a robots.txt path pattern with `*` and a trailing `$` into a regex."""
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    regex = '.*'.join(re.escape(part) for part in pattern.split('*'))
+    return re.compile(regex + ('$' if anchored else ''))
+
+# In-process tier: origin -> (policy, expires_at), kept in LRU order
+_policy_cache: "OrderedDict[str, Tuple[RobotsPolicy, float]]" = OrderedDict()
+# Concurrent lookups for the same origin share one fetch
+_inflight: Dict[str, "asyncio.Future[RobotsPolicy]"] = {}
+
+ROBOTS_STATS = {
+    "memory_hits": 0,
+    "redis_hits": 0,
+    "fetches": 0,
+    "fetch_errors": 0,
+    "denied": 0,
+}
+
+def _origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+def _remember(origin: str, policy: RobotsPolicy, ttl: int) -> None:
+    _policy_cache[origin] = (policy, time.time() + ttl)
+    _policy_cache.move_to_end(origin)
+    while len(_policy_cache) > ROBOTS_MEMORY_CACHE_SIZE:
+        _policy_cache.popitem(last=False)
+
+def get_cached_policy(url: str) -> Optional[RobotsPolicy]:
+    """Return the in-process policy for the url's host if present and fresh, without any I/O."""
+    origin = _origin(url)
+    entry = _policy_cache.get(origin)
+    if entry is None:
+        return None
+    policy, expires_at = entry
+    if expires_at < time.time():
+        del _policy_cache[origin]
+        return None
+    _policy_cache.move_to_end(origin)
+    ROBOTS_STATS["memory_hits"] += 1
+    return policy
+
+async def _fetch_policy(origin: str, session: aiohttp.ClientSession, fetch_user_agent: Optional[str]) -> Tuple[RobotsPolicy, int]:
+    """Download and parse robots.txt for an origin. Returns the policy and how long to cache it."""
+    ROBOTS_STATS["fetches"] += 1
+    try:
+        headers = {'User-Agent': fetch_user_agent} if fetch_user_agent else None
+        async with session.get(f"{origin}/robots.txt", headers=headers,
+                               timeout=ClientTimeout(total=ROBOTS_FETCH_TIMEOUT)) as response:
+            if response.status == 200:
+                body = await response.content.read(ROBOTS_MAX_BYTES)
+                return RobotsPolicy.parse(body.decode('utf-8', errors='replace')), ROBOTS_CACHE_TTL
+            # 4xx means no restrictions; keep other statuses only briefly
+            return RobotsPolicy(), ROBOTS_CACHE_TTL if 400 <= response.status < 500 else ROBOTS_ERROR_TTL
+    except Exception as e:
+        # If we can't check robots.txt, assume it's allowed
+        ROBOTS_STATS["fetch_errors"] += 1
+        logger.debug(f"Could not fetch robots.txt for {origin}: {e}")
+        return RobotsPolicy(), ROBOTS_ERROR_TTL
+
+async def _load_policy(origin: str, session: aiohttp.ClientSession, fetch_user_agent: Optional[str]) -> RobotsPolicy:
+    # Shared Redis tier first, so workers do not each download the same robots.txt
+    redis_key = f"{ROBOTS_KEY_PREFIX}{origin}"
+    try:
+        async with memory.redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.get(redis_key)
+            pipeline.ttl(redis_key)
+            cached, ttl = await pipeline.execute()
+        if cached:
+            ROBOTS_STATS["redis_hits"] += 1
+            policy = RobotsPolicy.from_json(cached)
+            _remember(origin, policy, ttl if ttl and ttl > 0 else ROBOTS_ERROR_TTL)
+            return policy
+    except Exception as e:
+        logger.debug(f"Robots Redis lookup failed for {origin}: {e}")
+
+    policy, ttl = await _fetch_policy(origin, session, fetch_user_agent)
+    _remember(origin, policy, ttl)
+    try:
+        await memory.redis_client.set(redis_key, policy.to_json(), ex=ttl)
+    except Exception as e:
+        logger.debug(f"Robots Redis store failed for {origin}: {e}")
+    return policy
+
+async def get_policy(url: str, session: aiohttp.ClientSession, fetch_user_agent: Optional[str] = None) -> RobotsPolicy:
+    """Return the robots policy for the url's host from memory, Redis, or a fresh fetch."""
+    policy = get_cached_policy(url)
+    if policy is not None:
+        return policy
+
+    origin = _origin(url)
+    inflight = _inflight.get(origin)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.ensure_future(_load_policy(origin, session, fetch_user_agent))
+    _inflight[origin] = future
+    future.add_done_callback(lambda _: _inflight.pop(origin, None))
+    return await asyncio.shield(future)
+
+async def is_allowed(url: str, session: aiohttp.ClientSession, fetch_user_agent: Optional[str] = None) -> bool:
+    """
+    Check if the URL is allowed according to robots.txt.
+    Returns True if allowed or unable to check, False if disallowed.
+    """
+    try:
+        policy = await get_policy(url, session, fetch_user_agent)
+    except Exception as e:
+        logger.debug(f"Could not check robots.txt for {url}: {e}")
+        return True
+    allowed = policy.is_allowed(url)
+    if not allowed:
+        ROBOTS_STATS["denied"] += 1
+    return allowed
+
+def get_robots_stats() -> Dict[str, int]:
+    """Return robots cache counters."""
+    return {**ROBOTS_STATS, "cached_hosts": len(_policy_cache)}
@@ -1,4 +1,5 @@
 import asyncio
+import re
 from datetime import datetime
 from typing import Dict, Any, Optional
 import logging
@@ -14,6 +15,32 @@ logger = logging.getLogger(__name__)
 ROUTE_GENERAL = "GENERAL"
 ROUTE_WEB = "WEB"
 
+# Weighted cues for the speculative WEB heuristic. Kept deliberately cheap: it only decides
+# whether to start a web search early, the LLM classifier still makes the final call.
+_WEB_CUE_PATTERNS = [
+    (re.compile(r"\b(today|tonight|yesterday|last night|this (week|month|year)|right now|currently)\b"), 0.45),
+    (re.compile(r"\b(latest|newest|recent(ly)?|current|upcoming|breaking|live)\b"), 0.35),
+    (re.compile(r"\b(news|headlines?|weather|forecast|score[sd]?|standings|schedule|election|polls?)\b"), 0.45),
+    (re.compile(r"\b(price|stock|shares?|market|exchange rate|bitcoin|crypto)\b"), 0.35),
+    (re.compile(r"\b(who (won|is winning|leads)|who is the (current )?(president|ceo|prime minister|coach))\b"), 0.5),
+    (re.compile(r"\b(release date|version|update|announced?|launch(ed)?)\b"), 0.2),
+    (re.compile(r"\b20[2-9]\d\b"), 0.3),
+]
+_GENERAL_CUE_PATTERN = re.compile(r"\b(explain|define|definition|history of|how (do|does|to)|write|poem|story|prove|calculate|what is the meaning)\b")
+
+def speculative_web_score(query: str) -> float:
+    """
+    Scores how likely a query is to be routed to WEB using keyword cues only.
+
+    Returns a value between 0.0 and 1.0. Used to decide whether to start a speculative
+    web search in parallel with `classify_query`; it never replaces the classifier.
+    """
+    text = query.lower()
+    score = sum(weight for pattern, weight in _WEB_CUE_PATTERNS if pattern.search(text))
+    if _GENERAL_CUE_PATTERN.search(text):
+        score -= 0.3
+    return max(0.0, min(1.0, score))
+
 async def classify_query(query: str, conv_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
     """Classifies the user query to determine the appropriate route (WEB or GENERAL)."""
     current_date_str = datetime.now().strftime("%Y-%m-%d")
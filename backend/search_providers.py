@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import random
+import asyncio
+import inspect
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus
+
+import aiohttp
+from aiohttp import ClientTimeout
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger("search_providers")
+
+# Constants
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GOOGLE_CSE_KEY = os.getenv("GOOGLE_CSE_KEY")
+GOOGLE_API_URL = "https://www.googleapis.com/customsearch/v1"
+GOOGLE_MAX_RESULTS = 10  # Google API limits to 10 results per call
+
+SEARCH_PROVIDERS = [name.strip().lower() for name in os.getenv("SEARCH_PROVIDERS", "google,duckduckgo").split(",") if name.strip()]
+SEARCH_FANOUT_FALLBACK = "fallback"  # Ask providers one at a time in SEARCH_PROVIDERS order
+SEARCH_FANOUT_RACE = "race"  # Ask all providers at once and take the first non-empty answer
+SEARCH_FANOUT = os.getenv("SEARCH_FANOUT", SEARCH_FANOUT_FALLBACK).lower()
+SEARCH_PROVIDER_TIMEOUT = float(os.getenv("SEARCH_PROVIDER_TIMEOUT", "8"))  # Seconds per provider call
+SEARCH_BREAKER_THRESHOLD = int(os.getenv("SEARCH_BREAKER_THRESHOLD", "3"))  # Consecutive failures that open a provider's breaker
+SEARCH_BREAKER_RESET_SECONDS = int(os.getenv("SEARCH_BREAKER_RESET_SECONDS", "60"))  # Open time before a single trial call
+LATENCY_EWMA_ALPHA = 0.3
+
+# Mock provider settings, for local testing without network access or API keys
+MOCK_SEARCH_RESULTS_FILE = os.getenv("MOCK_SEARCH_RESULTS_FILE")  # Optional JSON list of {"title", "href", "body"}
+MOCK_SEARCH_LATENCY = float(os.getenv("MOCK_SEARCH_LATENCY", "0"))  # Seconds
+MOCK_SEARCH_FAILURE_RATE = float(os.getenv("MOCK_SEARCH_FAILURE_RATE", "0"))  # 0..1
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    Closed: calls go through. After `threshold` consecutive failures the breaker opens
+    and calls are skipped for `reset_seconds`; then one trial call is let through
+    (half-open), which closes the breaker on success or reopens it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = SEARCH_BREAKER_THRESHOLD, reset_seconds: int = SEARCH_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Search provider breaker opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.time()
+
+    def release(self) -> None:
+        """Give back a trial slot without an outcome (the call was cancelled)."""
+        self.trial_in_flight = False
+
+class SearchProvider(ABC):
+    """
+    Base class for search engines. Results are dicts with "title", "href", "body" and "source".
+    Subclasses keep their clients for the lifetime of the process.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "empty": 0,
+            "failures": 0,
+            "cancelled": 0,
+            "skipped": 0,          # Calls not made because the breaker was open
+            "latency_ewma_ms": None,
+            "last_error": None,
+        }
+
+    def is_available(self) -> bool:
+        """Whether the provider is configured and its client library is installed."""
+        return True
+
+    @abstractmethod
+    async def search(self, query: str, num_results: int, session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+        """Run one query and return up to num_results results."""
+
+    async def close(self) -> None:
+        """Release long-lived clients."""
+
+    def record_latency(self, seconds: float) -> None:
+        latency_ms = seconds * 1000
+        previous = self.stats["latency_ewma_ms"]
+        self.stats["latency_ewma_ms"] = round(
+            latency_ms if previous is None else LATENCY_EWMA_ALPHA * latency_ms + (1 - LATENCY_EWMA_ALPHA) * previous, 1
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "available": self.is_available(), "breaker": self.breaker.state}
+
+class GoogleProvider(SearchProvider):
+    """Google Custom Search over the shared HTTP session (no discovery document, no per-query client)."""
+
+    name = "google"
+
+    def is_available(self) -> bool:
+        return bool(GOOGLE_API_KEY and GOOGLE_CSE_KEY)
+
+    async def search(self, query: str, num_results: int, session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+        params = {
+            "key": GOOGLE_API_KEY,
+            "cx": GOOGLE_CSE_KEY,
+            "q": query,
+            "num": min(num_results, GOOGLE_MAX_RESULTS)
+        }
+        async with session.get(GOOGLE_API_URL, params=params, timeout=ClientTimeout(total=SEARCH_PROVIDER_TIMEOUT)) as response:
+            if response.status != 200:
+                error_data = await response.text()
+                raise RuntimeError(f"Google Custom Search API error: {response.status} - {error_data[:200]}")
+            google_results = await response.json()
+
+        # Format results to match expected structure
+        return [
+            {
+                "title": item.get("title", ""),
+                "href": item.get("link", ""),
+                "body": item.get("snippet", ""),
+                "source": "Google"
+            }
+            for item in google_results.get("items", [])
+        ]
+
+class DuckDuckGoProvider(SearchProvider):
+    """DuckDuckGo through one long-lived duckduckgo_search client (async if the installed version has one)."""
+
+    name = "duckduckgo"
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+        self._is_async = False
+        try:
+            from duckduckgo_search import AsyncDDGS
+            self._client_class = AsyncDDGS
+            self._is_async = True
+        except ImportError:
+            try:
+                from duckduckgo_search import DDGS
+                self._client_class = DDGS
+            except ImportError:
+                logger.warning("DuckDuckGo search module not available. Install with: pip install duckduckgo-search")
+                self._client_class = None
+
+    def is_available(self) -> bool:
+        return self._client_class is not None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = self._client_class()
+        return self._client
+
+    async def search(self, query: str, num_results: int, session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+        client = self._get_client()
+        if not self._is_async:
+            # Sync client: run the whole call in the default executor
+            loop = asyncio.get_event_loop()
+            results = await loop.run_in_executor(None, lambda: list(client.text(query, max_results=num_results) or []))
+        else:
+            # Depending on the library version text() returns a coroutine or an async generator
+            response = client.text(query, max_results=num_results)
+            if inspect.isawaitable(response):
+                results = list(await response or [])
+            else:
+                results = [result async for result in response]
+        return [{**result, "source": "DuckDuckGo"} for result in results]
+
+    async def close(self) -> None:
+        client, self._client = self._client, None
+        closer = getattr(client, "__aexit__", None)
+        if closer is not None:
+            try:
+                await closer(None, None, None)
+            except Exception as e:
+                logger.debug(f"Error closing DuckDuckGo client: {e}")
+
+class MockProvider(SearchProvider):
+    """
+    Local provider for testing: returns results from MOCK_SEARCH_RESULTS_FILE, or generated
+    example.com results, with optional artificial latency and failure rate.
+    """
+
+    name = "mock"
+
+    def __init__(self, results: Optional[List[Dict[str, Any]]] = None):
+        super().__init__()
+        self._results = results
+        if self._results is None and MOCK_SEARCH_RESULTS_FILE:
+            with open(MOCK_SEARCH_RESULTS_FILE, "r", encoding="utf-8") as f:
+                self._results = json.load(f)
+
+    async def search(self, query: str, num_results: int, session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+        if MOCK_SEARCH_LATENCY:
+            await asyncio.sleep(MOCK_SEARCH_LATENCY)
+        if random.random() < MOCK_SEARCH_FAILURE_RATE:
+            raise RuntimeError("Mock search provider failure")
+        if self._results is not None:
+            return [{**result, "source": "Mock"} for result in self._results[:num_results]]
+        return [
+            {
+                "title": f"Mock result {i + 1} for {query}",
+                "href": f"https://example.com/mock/{i + 1}?q={quote_plus(query)}",
+                "body": f"Mock snippet {i + 1} about {query}.",
+                "source": "Mock"
+            }
+            for i in range(num_results)
+        ]
+
+PROVIDER_CLASSES = {
+    GoogleProvider.name: GoogleProvider,
+    DuckDuckGoProvider.name: DuckDuckGoProvider,
+    MockProvider.name: MockProvider,
+}
+
+def _build_providers() -> List[SearchProvider]:
+    providers = []
+    for name in SEARCH_PROVIDERS:
+        provider_class = PROVIDER_CLASSES.get(name)
+        if provider_class is None:
+            logger.warning(f"Unknown search provider '{name}' in SEARCH_PROVIDERS")
+            continue
+        provider = provider_class()
+        if provider.is_available():
+            logger.info(f"Search provider '{name}' enabled")
+        else:
+            logger.warning(f"Search provider '{name}' is not configured or not installed")
+        providers.append(provider)
+    return providers
+
+providers: List[SearchProvider] = _build_providers()
+
+def search_available() -> bool:
+    """True if at least one configured provider can be used."""
+    return any(provider.is_available() for provider in providers)
+
+async def _call_provider(provider: SearchProvider, query: str, num_results: int, session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+    """Call one provider, updating its breaker and metrics. Failures are logged and returned as []."""
+    provider.stats["calls"] += 1
+    started = time.monotonic()
+    try:
+        results = await asyncio.wait_for(provider.search(query, num_results, session), SEARCH_PROVIDER_TIMEOUT)
+    except asyncio.CancelledError:
+        provider.stats["cancelled"] += 1
+        provider.breaker.release()
+        raise
+    except Exception as e:
+        provider.record_latency(time.monotonic() - started)
+        provider.stats["failures"] += 1
+        provider.stats["last_error"] = str(e) or type(e).__name__
+        provider.breaker.record_failure()
+        logger.error(f"Search provider '{provider.name}' failed: {provider.stats['last_error']}")
+        return []
+
+    provider.record_latency(time.monotonic() - started)
+    provider.breaker.record_success()
+    if results:
+        provider.stats["successes"] += 1
+        logger.info(f"Search provider '{provider.name}' returned {len(results)} results")
+    else:
+        provider.stats["empty"] += 1
+    return results
+
+def _admit(provider: SearchProvider) -> bool:
+    """Ask the provider's breaker for a call slot, counting skips."""
+    if provider.breaker.allow():
+        return True
+    provider.stats["skipped"] += 1
+    return False
+
+async def search(query: str, num_results: int, session: aiohttp.ClientSession, fanout: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Search with the configured providers.
+
+    Args:
+        query: Query to send to the engines
+        num_results: Number of results wanted
+        session: Shared HTTP session for providers that speak HTTP directly
+        fanout: "fallback" (providers in order until one returns results) or
+            "race" (all at once, first non-empty answer wins); defaults to SEARCH_FANOUT
+
+    Returns:
+        Search results, or an empty list if every provider failed or returned nothing
+    """
+    available = [provider for provider in providers if provider.is_available()]
+    if not available:
+        logger.error("No search provider available. Configure Google Custom Search API or install duckduckgo-search.")
+        return []
+
+    if (fanout or SEARCH_FANOUT) != SEARCH_FANOUT_RACE:
+        for provider in available:
+            if not _admit(provider):
+                continue
+            results = await _call_provider(provider, query, num_results, session)
+            if results:
+                return results
+        return []
+
+    tasks = [
+        asyncio.create_task(_call_provider(provider, query, num_results, session))
+        for provider in available if _admit(provider)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            results = await next_done
+            if results:
+                return results
+        return []
+    finally:
+        # Losers are cancelled once a provider has answered
+        for task in tasks:
+            task.cancel()
+
+async def close() -> None:
+    """Close long-lived provider clients."""
+    for provider in providers:
+        await provider.close()
+
+def get_provider_stats() -> Dict[str, Any]:
+    """Return per-provider call counters, latency and breaker state."""
+    return {
+        "fanout": SEARCH_FANOUT,
+        "providers": {provider.name: provider.get_stats() for provider in providers}
+    }
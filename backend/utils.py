@@ -1,4 +1,5 @@
-from typing import List, Dict
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
 
 def format_chat_prompt(system_prompt: str, conversation_history: List[Dict[str, str]]) -> str:
     """
@@ -50,6 +51,40 @@ def format_simple_prompt(system_prompt: str, user_prompt: str) -> str:
 <|im_start|>assistant
 """
 
+def start_stage_graph(
+    stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Sequence[str]]]
+) -> Dict[str, "asyncio.Task[Any]"]:
+    """
+    Schedules a small dependency graph of async stages and returns one task per stage.
+
+    Each stage is a (coroutine_function, dependencies) pair. A stage starts as soon as
+    all of its dependencies have finished and receives their results as keyword
+    arguments named after the dependency. Independent stages run concurrently.
+
+    Args:
+        stages: Mapping of stage name to (coroutine_function, dependency names).
+                Dependencies must be declared before the stages that use them.
+
+    Returns:
+        A dictionary of stage name to asyncio.Task. Callers await only the stages they
+        need; a failed stage propagates its exception to every dependent stage.
+    """
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_stage(func: Callable[..., Awaitable[Any]], deps: Sequence[str]) -> Any:
+        dep_results = {}
+        for dep in deps:
+            dep_results[dep] = await tasks[dep]
+        return await func(**dep_results)
+
+    for name, (func, deps) in stages.items():
+        missing = [dep for dep in deps if dep not in tasks]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on undeclared stage(s): {', '.join(missing)}")
+        tasks[name] = asyncio.create_task(run_stage(func, tuple(deps)), name=f"stage:{name}")
+
+    return tasks
+
 # Example usage (can be removed or kept for testing):
 if __name__ == '__main__':
     sys_prompt = "You are a helpful AI assistant. Your role is to provide concise and accurate answers."
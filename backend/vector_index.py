@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger("vector_index")
+
+# Constants
+LOCAL_VECTOR_INDEX_PATH = config.LOCAL_VECTOR_INDEX_PATH  # Snapshot path prefix; empty disables persistence
+VECTOR_UPDATES_STREAM = "vector_updates"  # Keys of newly indexed vectors, followed by every worker
+VECTOR_UPDATES_MAXLEN = 10000  # Approximate stream length kept; older updates are covered by the startup rebuild
+VECTOR_UPDATES_BLOCK_MS = 2000  # XREAD wait; must stay below the Redis client's socket timeout
+REBUILD_BATCH_SIZE = 500  # Keys scanned and loaded per pipeline during a rebuild
+INITIAL_CAPACITY = 1024
+COMPACT_DEAD_RATIO = 0.25  # Rows are compacted once this share of them is removed
+EXPIRE_INTERVAL_SECONDS = 300  # How often rows past the Redis TTL are dropped from the index
+_FIELDS = (b"embedding", b"conv_id", b"role", b"timestamp", b"msg_id", b"pos")
+
+class LocalVectorIndex:
+    """
+    Exact in-process vector index over a contiguous float32 matrix.
+
+    Rows are normalized vectors, so a matrix-vector product gives cosine similarity
+    for every row at once and argpartition picks the top k. Metadata lives in
+    parallel arrays; conversation IDs are stored as integer codes so filters are
+    vectorized too. Removed rows are masked and compacted in bulk.
+    """
+
+    def __init__(self, dim: int, capacity: int = INITIAL_CAPACITY):
+        self.dim = dim
+        self.count = 0
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.conv_codes = np.zeros(capacity, dtype=np.int32)
+        self.keys: List[str] = []
+        self.meta: List[Dict[str, Any]] = []  # msg_id, conv_id, role, pos per row
+        self.rows: Dict[str, int] = {}
+        self._conv_code_map: Dict[str, int] = {}
+        self.removed = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.valid)
+        if needed <= capacity:
+            return
+        capacity = max(capacity, INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        # A matrix mapped from a snapshot is copied into memory here, on the first growth
+        for name in ("matrix", "valid", "timestamps", "conv_codes"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _conv_code(self, conv_id: str) -> int:
+        return self._conv_code_map.setdefault(conv_id, len(self._conv_code_map) + 1)
+
+    def upsert(self, key: str, vector: np.ndarray, conv_id: str, role: str, timestamp: float, msg_id: str, pos: int) -> None:
+        """Add a vector, or replace the one stored under the same key."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        row = self.rows.get(key)
+        if row is None:
+            self._grow(self.count + 1)
+            row = self.count
+            self.count += 1
+            self.keys.append(key)
+            self.meta.append({})
+            self.rows[key] = row
+        self.matrix[row] = vector
+        self.valid[row] = True
+        self.timestamps[row] = timestamp
+        self.conv_codes[row] = self._conv_code(conv_id)
+        self.meta[row] = {"msg_id": msg_id, "conv_id": conv_id, "role": role, "pos": pos}
+
+    def remove(self, key: str) -> None:
+        """Mask the row stored under key; rows are compacted once enough are removed."""
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.valid[row] = False
+        self.removed += 1
+        self._maybe_compact()
+
+    def _remove_rows(self, mask: np.ndarray) -> int:
+        """Mask the valid rows selected by mask; returns how many were removed."""
+        rows = np.flatnonzero(mask & self.valid[:self.count])
+        for row in rows:
+            self.rows.pop(self.keys[row], None)
+        self.valid[rows] = False
+        self.removed += len(rows)
+        self._maybe_compact()
+        return len(rows)
+
+    def remove_conversation(self, conv_id: str) -> int:
+        """Remove every row of a conversation; returns how many were removed."""
+        code = self._conv_code_map.get(conv_id)
+        if code is None:
+            return 0
+        return self._remove_rows(self.conv_codes[:self.count] == code)
+
+    def expire(self, min_timestamp: float) -> int:
+        """Remove rows indexed before min_timestamp; returns how many were removed."""
+        return self._remove_rows(self.timestamps[:self.count] < min_timestamp)
+
+    def _maybe_compact(self) -> None:
+        if self.removed > COMPACT_DEAD_RATIO * max(self.count, 1):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop removed rows and rebuild the key and conversation code maps."""
+        keep = np.flatnonzero(self.valid[:self.count])
+        self.matrix[:len(keep)] = self.matrix[keep]
+        self.timestamps[:len(keep)] = self.timestamps[keep]
+        self.keys = [self.keys[row] for row in keep]
+        self.meta = [self.meta[row] for row in keep]
+        self.count = len(keep)
+        self.valid[:] = False
+        self.valid[:self.count] = True
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        # Conversations whose vectors are all gone are forgotten
+        self._conv_code_map = {}
+        for row, meta in enumerate(self.meta):
+            self.conv_codes[row] = self._conv_code(meta["conv_id"])
+        self.removed = 0
+
+    def search(self, query: np.ndarray, k: int, conv_id: Optional[str] = None,
+               min_timestamp: float = 0.0) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        Find the k most similar vectors.
+
+        Args:
+            query: Normalized query vector of the index dimension
+            k: Number of results
+            conv_id: Only search this conversation
+            min_timestamp: Skip vectors indexed before this time (expired in Redis)
+
+        Returns:
+            (key, metadata with timestamp, cosine similarity) tuples, most similar first
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        mask = self.valid[:self.count].copy()
+        if min_timestamp:
+            mask &= self.timestamps[:self.count] >= min_timestamp
+        if conv_id is not None:
+            code = self._conv_code_map.get(conv_id)
+            if code is None:
+                return []
+            mask &= self.conv_codes[:self.count] == code
+        available = int(mask.sum())
+        if available == 0:
+            return []
+
+        # One pass over the contiguous matrix; filtered rows are pushed below every real score
+        scores = self.matrix[:self.count] @ np.asarray(query, dtype=np.float32)
+        scores[~mask] = -np.inf
+        k = min(k, available)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.keys[row], {**self.meta[row], "timestamp": float(self.timestamps[row])}, float(scores[row])) for row in top]
+
+    def save(self, path: str) -> None:
+        """
+        Write a snapshot: the matrix as a .npy file (memory-mapped when loaded) and
+        the metadata as JSON. Files are replaced atomically.
+        """
+        if self.removed:
+            self.compact()
+        matrix_path, meta_path = f"{path}.npy", f"{path}.json"
+        suffix = f".{os.getpid()}.tmp"  # Workers sharing the path never write the same temporary file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f"{matrix_path}{suffix}", "wb") as f:
+            np.save(f, self.matrix[:self.count])
+        with open(f"{meta_path}{suffix}", "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "keys": self.keys,
+                "meta": self.meta,
+                "timestamps": self.timestamps[:self.count].tolist(),
+            }, f)
+        os.replace(f"{matrix_path}{suffix}", matrix_path)
+        os.replace(f"{meta_path}{suffix}", meta_path)
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> Optional["LocalVectorIndex"]:
+        """
+        Load a snapshot written by save; None if there is no usable snapshot.
+
+        The matrix stays memory-mapped (copy-on-write, so updates never touch the file)
+        until the index first grows; only the metadata is read up front.
+        """
+        try:
+            with open(f"{path}.json") as f:
+                manifest = json.load(f)
+            matrix = np.load(f"{path}.npy", mmap_mode="c")
+        except (OSError, ValueError) as e:
+            logger.info(f"No vector index snapshot loaded from {path}: {e}")
+            return None
+        if manifest.get("dim") != dim or matrix.shape != (len(manifest["keys"]), dim):
+            logger.warning(f"Ignoring vector index snapshot {path}: dimension or size mismatch")
+            return None
+
+        count = len(manifest["keys"])
+        if count == 0:
+            return None
+        index = cls(dim, capacity=count)
+        index.matrix = matrix
+        index.valid[:count] = True
+        index.timestamps[:count] = manifest["timestamps"]
+        index.keys = manifest["keys"]
+        index.meta = manifest["meta"]
+        index.count = count
+        index.rows = {key: row for row, key in enumerate(index.keys)}
+        for row, meta in enumerate(index.meta):
+            index.conv_codes[row] = index._conv_code(meta["conv_id"])
+        return index
+
+# Module state: one index per worker, kept current from Redis
+index: Optional[LocalVectorIndex] = None
+_redis = None
+_key_prefix = ""
+_snapshot_path = ""
+_vector_dtype = np.float32
+_ttl = 0
+_follow_task: Optional[asyncio.Task] = None
+_last_stream_id = "0-0"
+_worker_id = b""  # Updates written by this worker are already in its index
+_next_expire = 0.0
+
+LOCAL_INDEX_STATS = {
+    "rebuilt": 0,       # Vectors loaded from Redis at startup
+    "snapshot": 0,      # Vectors loaded from the on-disk snapshot
+    "dropped": 0,       # Snapshot vectors whose Redis key no longer exists
+    "updates": 0,       # Vectors added from other workers' updates
+    "removed": 0,       # Vectors of cleared conversations
+    "expired": 0,       # Vectors dropped after the Redis TTL
+    "searches": 0,
+    "search_seconds": 0.0,
+}
+
+def _decode(value: Optional[bytes]) -> str:
+    return value.decode("utf-8") if value is not None else ""
+
+def _add_from_fields(key: str, values: List[Optional[bytes]]) -> bool:
+    """Add one vector from its Redis hash fields; False if the hash is incomplete."""
+    blob, conv_id, role, timestamp, msg_id, pos = values
+    if blob is None or len(blob) != index.dim * np.dtype(_vector_dtype).itemsize:
+        return False
+    index.upsert(key, np.frombuffer(blob, dtype=_vector_dtype), _decode(conv_id), _decode(role),
+                 float(timestamp or 0), _decode(msg_id), int(pos or -1))
+    return True
+
+async def _load_keys(keys: List[str]) -> int:
+    async with _redis.pipeline(transaction=False) as pipeline:
+        for key in keys:
+            pipeline.hmget(key, _FIELDS)
+        results = await pipeline.execute()
+    return sum(_add_from_fields(key, values) for key, values in zip(keys, results))
+
+async def _rebuild() -> None:
+    """Bring the index in line with the vector hashes in Redis."""
+    existing = set()
+    batch: List[str] = []
+    async for raw_key in _redis.scan_iter(match=f"{_key_prefix}*", count=REBUILD_BATCH_SIZE):
+        key = _decode(raw_key)
+        existing.add(key)
+        if key not in index.rows:
+            batch.append(key)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            LOCAL_INDEX_STATS["rebuilt"] += await _load_keys(batch)
+            batch = []
+    if batch:
+        LOCAL_INDEX_STATS["rebuilt"] += await _load_keys(batch)
+    for key in [key for key in index.rows if key not in existing]:
+        index.remove(key)
+        LOCAL_INDEX_STATS["dropped"] += 1
+
+def _expire() -> None:
+    """Drop rows whose Redis hashes have expired, at most once per EXPIRE_INTERVAL_SECONDS."""
+    global _next_expire
+    now = time.time()
+    if not _ttl or now < _next_expire:
+        return
+    _next_expire = now + EXPIRE_INTERVAL_SECONDS
+    LOCAL_INDEX_STATS["expired"] += index.expire(now - _ttl)
+
+async def _follow_updates() -> None:
+    """Apply vectors added and conversations cleared by any worker, in stream order, until cancelled."""
+    global _last_stream_id
+    while True:
+        try:
+            _expire()
+            response = await _redis.xread({VECTOR_UPDATES_STREAM: _last_stream_id}, count=REBUILD_BATCH_SIZE, block=VECTOR_UPDATES_BLOCK_MS)
+            if not response:
+                continue
+            entries = response[0][1]
+            keys: List[str] = []
+            for _, fields in entries:
+                if fields.get(b"worker") == _worker_id:
+                    continue
+                if b"conv_id" in fields:
+                    # Load what came before the clear first, so the clear removes it too
+                    if keys:
+                        LOCAL_INDEX_STATS["updates"] += await _load_keys(keys)
+                        keys = []
+                    LOCAL_INDEX_STATS["removed"] += index.remove_conversation(_decode(fields[b"conv_id"]))
+                    continue
+                key = _decode(fields.get(b"key"))
+                if key.startswith(_key_prefix):
+                    keys.append(key)
+            if keys:
+                LOCAL_INDEX_STATS["updates"] += await _load_keys(keys)
+            _last_stream_id = _decode(entries[-1][0])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Vector update follower error: {e}")
+            await asyncio.sleep(1)
+
+async def start(redis_binary_client, key_prefix: str, dim: int, vector_dtype: Any, ttl: int, worker_id: str = "") -> None:
+    """
+    Load the snapshot (if any), rebuild the rest from Redis and follow new vectors.
+
+    Args:
+        redis_binary_client: Redis client returning bytes
+        key_prefix: Prefix of the vector hashes to index
+        dim: Stored vector dimension
+        vector_dtype: numpy type of the stored blobs
+        ttl: Seconds vectors live in Redis; older ones are skipped in searches and dropped periodically
+        worker_id: ID this worker writes into its update entries; those entries are skipped
+    """
+    global index, _redis, _key_prefix, _snapshot_path, _vector_dtype, _ttl, _follow_task, _last_stream_id, _worker_id
+    _redis, _key_prefix, _vector_dtype, _ttl = redis_binary_client, key_prefix, vector_dtype, ttl
+    _worker_id = worker_id.encode("utf-8")
+    # One snapshot per vector layout, named after its key prefix
+    if LOCAL_VECTOR_INDEX_PATH:
+        _snapshot_path = f"{LOCAL_VECTOR_INDEX_PATH}_{key_prefix.strip(':').replace(':', '_')}"
+
+    # Updates after this point are replayed by the follower, so none fall between rebuild and follow
+    latest = await _redis.xrevrange(VECTOR_UPDATES_STREAM, count=1)
+    _last_stream_id = _decode(latest[0][0]) if latest else "0-0"
+
+    started = time.perf_counter()
+    if _snapshot_path:
+        index = LocalVectorIndex.load(_snapshot_path, dim)
+        if index is not None:
+            LOCAL_INDEX_STATS["snapshot"] = len(index)
+    if index is None:
+        index = LocalVectorIndex(dim)
+    await _rebuild()
+    logger.info(f"Local vector index ready with {len(index)} vectors "
+                f"({LOCAL_INDEX_STATS['snapshot']} from snapshot, {LOCAL_INDEX_STATS['rebuilt']} from Redis) "
+                f"in {time.perf_counter() - started:.2f}s")
+    _follow_task = asyncio.create_task(_follow_updates())
+
+async def stop() -> None:
+    """Stop following updates and write the snapshot if persistence is enabled."""
+    global _follow_task
+    if _follow_task is not None:
+        _follow_task.cancel()
+        await asyncio.gather(_follow_task, return_exceptions=True)
+        _follow_task = None
+    if index is not None and _snapshot_path:
+        try:
+            index.save(_snapshot_path)
+        except OSError as e:
+            logger.error(f"Could not save vector index snapshot: {e}")
+
+def add(key: str, vector: np.ndarray, conv_id: str, role: str, timestamp: float, msg_id: str, pos: int) -> None:
+    """Add a vector this worker just stored, without waiting for the update stream."""
+    if index is not None:
+        index.upsert(key, vector, conv_id, role, timestamp, msg_id, pos)
+
+def remove_conversation(conv_id: str) -> None:
+    """Drop the vectors of a conversation this worker just cleared."""
+    if index is not None:
+        LOCAL_INDEX_STATS["removed"] += index.remove_conversation(conv_id)
+
+def search(query: np.ndarray, k: int, conv_id: Optional[str] = None) -> List[Tuple[str, Dict[str, Any], float]]:
+    """Top-k search over vectors that have not expired in Redis. See LocalVectorIndex.search."""
+    if index is None:
+        return []
+    started = time.perf_counter()
+    results = index.search(query, k, conv_id=conv_id, min_timestamp=time.time() - _ttl if _ttl else 0.0)
+    LOCAL_INDEX_STATS["searches"] += 1
+    LOCAL_INDEX_STATS["search_seconds"] += time.perf_counter() - started
+    return results
+
+def get_stats() -> Dict[str, Any]:
+    """Return index size and search counters."""
+    stats: Dict[str, Any] = dict(LOCAL_INDEX_STATS)
+    stats["vectors"] = len(index) if index is not None else 0
+    stats["matrix_mb"] = round(index.matrix.nbytes / 1048576, 2) if index is not None else 0.0
+    stats["avg_search_ms"] = round(stats["search_seconds"] * 1000 / stats["searches"], 3) if stats["searches"] else 0.0
+    return stats
@@ -1,19 +1,28 @@
 import os
 import time
-import json
 import aiohttp
-import aiofiles
 import logging
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup
+from typing import List, Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
 import asyncio
 from urllib.parse import urlparse
+from datetime import datetime
 import re
-import hashlib
 import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from aiohttp import ClientTimeout
 from dotenv import load_dotenv
 
+from . import memory
+from . import robots
+from . import web_cache
+from . import html_extraction
+from . import passages
+from . import domain_stats
+from . import search_providers
+
 # Load environment variables
 load_dotenv()
 
@@ -22,17 +31,62 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger("web_access_async")
 
 # Constants
-CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
 CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Cache results for 1 hour by default
+PAGE_CACHE_RETENTION = int(os.getenv("PAGE_CACHE_RETENTION", str(7 * 86400)))  # Keep expired pages this long for conditional revalidation
+PAGE_REFRESH_AHEAD_SECONDS = int(os.getenv("PAGE_REFRESH_AHEAD_SECONDS", "300"))  # Refresh hot pages this long before they expire
+PAGE_HOT_HITS = int(os.getenv("PAGE_HOT_HITS", "2"))  # Cache hits after which a page counts as hot
+PAGE_HIT_TRACKING_SIZE = 4096  # URLs whose hit counts are tracked per worker
+WEB_CACHE_MEMORY_BYTES = int(os.getenv("WEB_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))  # In-process tier cap (compressed bytes)
+WEB_CACHE_SHARED_BYTES = int(os.getenv("WEB_CACHE_SHARED_BYTES", str(64 * 1024 * 1024)))  # Redis tier cap (compressed bytes)
 MAX_SEARCH_RESULTS = 5
 MAX_CONTENT_LENGTH = 10000  # Maximum number of characters to extract from a page
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(2 * 1024 * 1024)))  # Stop reading page bodies past this size
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))  # HTML parser processes; 0 uses threads
 REQUEST_TIMEOUT = 10  # Seconds
-RATE_LIMIT_DELAY = 0.5  # Delay between requests in seconds
 MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 0.25  # Seconds; retries back off exponentially with jitter from this base
+
+# Page fetch engine: results are consumed as they complete and fetching stops early
+FETCH_TARGET_SOURCES = int(os.getenv("FETCH_TARGET_SOURCES", "3"))  # Stop after this many usable sources
+FETCH_TARGET_CHARS = int(os.getenv("FETCH_TARGET_CHARS", "20000"))  # ...or once this much content has been collected
+FETCH_BUDGET_SECONDS = float(os.getenv("FETCH_BUDGET_SECONDS", "6"))  # Overall deadline for fetching a result set
+FETCH_HEDGE_DELAY = float(os.getenv("FETCH_HEDGE_DELAY", "1.5"))  # Start a backup URL when nothing completes within this delay
+MIN_USABLE_CONTENT_CHARS = 200  # Pages with less extracted text do not count as a usable source
+
+# Web answer tiers: "snippets" answers from search engine snippets only, "full" fetches and
+# parses every result page, "auto" uses snippets when they score as sufficient for the query.
+WEB_MODE_AUTO = "auto"
+WEB_MODE_SNIPPETS = "snippets"
+WEB_MODE_FULL = "full"
+WEB_MODES = (WEB_MODE_AUTO, WEB_MODE_SNIPPETS, WEB_MODE_FULL)
+DEFAULT_WEB_MODE = os.getenv("WEB_MODE", WEB_MODE_AUTO).lower()
+SNIPPET_SUFFICIENCY_THRESHOLD = float(os.getenv("SNIPPET_SUFFICIENCY_THRESHOLD", "0.75"))  # Cosine score needed to skip page fetching
+SNIPPET_SUFFICIENCY_TOP_N = 2  # Number of best-matching snippets averaged into the sufficiency score
+
+# Search results cache: keyed on the normalized base query (without the date suffix) and a
+# freshness class, with stale-while-revalidate so repeated queries never wait on the engine
+SEARCH_FRESHNESS_NEWS = "news"
+SEARCH_FRESHNESS_GENERAL = "general"
+SEARCH_CACHE_TTLS = {
+    SEARCH_FRESHNESS_NEWS: int(os.getenv("SEARCH_CACHE_NEWS_TTL", "900")),  # 15 minutes for news-like queries
+    SEARCH_FRESHNESS_GENERAL: int(os.getenv("SEARCH_CACHE_GENERAL_TTL", "21600")),  # 6 hours otherwise
+}
+SEARCH_CACHE_STALE_SECONDS = int(os.getenv("SEARCH_CACHE_STALE_SECONDS", "3600"))  # Serve stale while refreshing for this long
+_NEWS_QUERY_PATTERN = re.compile(
+    r"\b(today|tonight|yesterday|last night|now|live|latest|breaking|news|headlines?|weather|forecast|"
+    r"scores?|standings|results?|election|polls?|price|stocks?|market|this week)\b"
+)
+_DATE_SUFFIX_PATTERN = re.compile(r"\s+as of \d{4} [a-z]+ \d{1,2}\s*$")
+
+# Shared outbound HTTP client (connection pooling, keep-alive and DNS caching)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # Total open connections across all hosts
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "4"))  # Open connections per host
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))  # Seconds to cache DNS resolutions
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))  # Seconds to keep idle connections open
 
 # Google Custom Search API config
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GOOGLE_CSE_KEY = os.getenv("GOOGLE_CSE_KEY")
+GOOGLE_API_KEY = search_providers.GOOGLE_API_KEY
+GOOGLE_CSE_KEY = search_providers.GOOGLE_CSE_KEY
 
 # User agent rotation for better scraping resilience
 USER_AGENTS = [
@@ -43,50 +97,74 @@ USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36 OPR/120.0.0.0"
 ]
 
-# Create cache directory if it doesn't exist
-os.makedirs(CACHE_DIR, exist_ok=True)
-
-# Check if Google Custom Search API keys are available
-if GOOGLE_API_KEY and GOOGLE_CSE_KEY:
-    logger.info("Google Custom Search API configured")
-    SEARCH_AVAILABLE = True
-
-    # Initialize Google Custom Search API client
-    try:
-        import googleapiclient.discovery
-
-        def get_google_search_service():
-            return googleapiclient.discovery.build(
-                "customsearch", "v1", developerKey=GOOGLE_API_KEY
-            )
-
-        # Test the configuration
-        search_service = get_google_search_service()
-        logger.info("Google Custom Search API client initialized successfully")
-    except ImportError:
-        logger.warning("Google API Python Client not available. Install with: pip install google-api-python-client")
-        # Continue with direct API calls via aiohttp
-    except Exception as e:
-        logger.error(f"Error initializing Google Custom Search API client: {e}")
-        # Continue with direct API calls via aiohttp
-else:
-    logger.warning("Google Custom Search API keys not found. Please set GOOGLE_API_KEY and GOOGLE_CSE_KEY in .env file")
-    SEARCH_AVAILABLE = False
-
-    # Fallback to DuckDuckGo if available
-    try:
-        from duckduckgo_search import AsyncDDGS
-        search_client = AsyncDDGS()
-        logger.info("Falling back to DuckDuckGo search")
-        SEARCH_AVAILABLE = True
-    except ImportError:
-        try:
-            from duckduckgo_search import DDGS
-            logger.info("Using sync DuckDuckGo client with asyncio wrapper")
-            SEARCH_AVAILABLE = True
-        except ImportError:
-            logger.warning("DuckDuckGo search module not available. Install with: pip install duckduckgo-search")
-            SEARCH_AVAILABLE = False
+# Extracted page content, shared across workers through Redis
+page_cache = web_cache.TieredCache(
+    namespace="page",
+    memory_max_bytes=WEB_CACHE_MEMORY_BYTES,
+    shared_max_bytes=WEB_CACHE_SHARED_BYTES,
+    retention_seconds=max(CACHE_TTL, PAGE_CACHE_RETENTION)
+)
+# Per-worker hit counts used to find hot pages, in LRU order
+_page_hits: "OrderedDict[str, int]" = OrderedDict()
+# In-flight background page refreshes, keyed by normalized URL
+_page_refreshes: Dict[str, asyncio.Task] = {}
+
+# Search engine results, kept long enough to serve stale entries while they refresh
+search_cache = web_cache.TieredCache(
+    namespace="search",
+    memory_max_bytes=WEB_CACHE_MEMORY_BYTES // 8,
+    shared_max_bytes=WEB_CACHE_SHARED_BYTES // 8,
+    retention_seconds=max(SEARCH_CACHE_TTLS.values()) + SEARCH_CACHE_STALE_SECONDS
+)
+# In-flight background refreshes, keyed by search cache key
+_search_refreshes: Dict[str, asyncio.Task] = {}
+
+# Search engines are pluggable providers (see search_providers)
+SEARCH_AVAILABLE = search_providers.search_available()
+
+# Application-scoped HTTP session, created by init_http_client() from main.lifespan
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def _create_http_session() -> aiohttp.ClientSession:
+    """Create a pooled client session. aiohttp speaks HTTP/1.1, so reuse comes from keep-alive."""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        use_dns_cache=True,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=ClientTimeout(total=REQUEST_TIMEOUT)
+    )
+
+async def init_http_client() -> aiohttp.ClientSession:
+    """Create the shared HTTP session used by every outbound request in this module."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_http_session()
+        logger.info(f"Shared HTTP client initialized (pool={HTTP_POOL_LIMIT}, per_host={HTTP_POOL_LIMIT_PER_HOST})")
+    return _http_session
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return the shared HTTP session.
+    Created lazily if init_http_client() was not called (e.g. when used outside the app).
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_http_session()
+    return _http_session
+
+async def close_http_client() -> None:
+    """Close the shared HTTP session and its pooled connections."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    await search_providers.close()
 
 def get_random_user_agent() -> str:
     """Get a random user agent from the list."""
@@ -96,206 +174,174 @@ async def check_robots_txt(url: str, session: aiohttp.ClientSession) -> bool:
     """
     Check if the URL is allowed according to robots.txt.
     Returns True if allowed or unable to check, False if disallowed.
+    Policies are cached per host (see robots.py).
     """
-    try:
-        parsed_url = urlparse(url)
-        robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-        
-        headers = {'User-Agent': get_random_user_agent()}
-        timeout = ClientTimeout(total=5)
-        
-        async with session.get(robots_url, headers=headers, timeout=timeout) as response:
-            if response.status == 200:
-                text = await response.text()
-                # Basic parsing - check if path is disallowed
-                path = parsed_url.path or "/"
-                lines = text.lower().split('\n')
-                disallow_next = False
-                
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('user-agent:') and ('*' in line or 'bot' in line):
-                        disallow_next = True
-                    elif disallow_next and line.startswith('disallow:'):
-                        disallowed_path = line.replace('disallow:', '').strip()
-                        if disallowed_path and path.startswith(disallowed_path):
-                            logger.warning(f"Path {path} is disallowed by robots.txt")
-                            return False
-                    elif line.startswith('user-agent:'):
-                        disallow_next = False
-    except Exception as e:
-        # If we can't check robots.txt, assume it's allowed
-        logger.debug(f"Could not check robots.txt for {url}: {e}")
-    
-    return True
-
-def get_cache_path(url: str) -> str:
-    """Generate a unique cache filename for the given URL."""
-    url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
-    return os.path.join(CACHE_DIR, f"{url_hash}.json")
+    return await robots.is_allowed(url, session, fetch_user_agent=get_random_user_agent())
 
-def is_cache_valid(cache_path: str) -> bool:
-    """Check if a cache file exists and is still valid (not expired)."""
-    if not os.path.exists(cache_path):
-        return False
-    
-    # Check file age
-    file_age = time.time() - os.path.getmtime(cache_path)
-    return file_age < CACHE_TTL
-
-async def save_to_cache(url: str, data: Dict[str, Any]) -> None:
-    """Save data to the cache."""
-    cache_path = get_cache_path(url)
-    cache_data = {
-        'url': url,
-        'timestamp': time.time(),
-        'data': data
-    }
-    async with aiofiles.open(cache_path, 'w', encoding='utf-8') as f:
-        await f.write(json.dumps(cache_data))
+async def save_to_cache(url: str, data: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+    """Save extracted page data to the web content cache, with the validators needed for conditional GETs."""
+    await page_cache.set(web_cache.normalize_url(url), data, url=url, etag=etag, last_modified=last_modified)
 
 async def load_from_cache(url: str) -> Optional[Dict[str, Any]]:
-    """Load data from the cache if available and valid."""
-    cache_path = get_cache_path(url)
-    if is_cache_valid(cache_path):
-        try:
-            async with aiofiles.open(cache_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                cache_data = json.loads(content)
-                return cache_data.get('data')
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Error reading cache file: {e}")
-    
+    """Load extracted page data from the cache if available and still fresh."""
+    entry = await page_cache.get_entry(web_cache.normalize_url(url))
+    if entry and time.time() - entry.get('stored_at', 0) < CACHE_TTL:
+        return entry.get('value')
     return None
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text content."""
-    # Replace multiple whitespace chars with a single space
-    text = re.sub(r'\s+', ' ', text)
-    # Remove leading/trailing whitespace
-    text = text.strip()
-    return text
+# Shared with the extraction engine so snippets and page text are normalized the same way
+clean_text = html_extraction.clean_text
 
-async def extract_content(html: str, url: str) -> Dict[str, Any]:
+# Dedicated process pool for HTML parsing, created by init_extraction_pool() from main.lifespan
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+async def init_extraction_pool() -> Optional[ProcessPoolExecutor]:
     """
-    Extract relevant content from HTML using BeautifulSoup.
+    Start EXTRACTION_WORKERS parser processes and warm each one up.
+
+    Parsing holds the GIL, so in the default thread pool concurrent extractions serialize and
+    stall the event loop. Workers are started with forkserver/spawn rather than fork so they do
+    not inherit the loaded LLM and embedding model.
+    """
+    global _extraction_pool
+    if EXTRACTION_WORKERS <= 0 or _extraction_pool is not None:
+        return _extraction_pool
+
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    _extraction_pool = ProcessPoolExecutor(
+        max_workers=EXTRACTION_WORKERS,
+        mp_context=multiprocessing.get_context(start_method)
+    )
+    loop = asyncio.get_event_loop()
+    try:
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(_extraction_pool, html_extraction.warm_up) for _ in range(EXTRACTION_WORKERS)
+        ])
+        logger.info(f"Extraction pool ready: {len(set(pids))} {html_extraction.ACTIVE_BACKEND} worker(s) via {start_method}")
+    except Exception as e:
+        logger.error(f"Could not start extraction pool, using threads: {e}")
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+    return _extraction_pool
+
+async def close_extraction_pool() -> None:
+    """Stop the extraction worker processes."""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+async def extract_content(html: Union[str, bytes], url: str, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract relevant content from HTML (see html_extraction for the parser backends).
     Focus on important elements like headers, paragraphs, etc.
     
-    Run in executor since BeautifulSoup is CPU-bound.
+    Runs in the extraction process pool when available (raw bytes in, tuples out),
+    otherwise in the default thread pool.
     """
+    global _extraction_pool
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _extract_content_sync, html, url)
-
-def _extract_content_sync(html: str, url: str) -> Dict[str, Any]:
-    """Synchronous version of extract_content for executor"""
-    # Specify parser for consistency
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    # Remove script, style, iframe, noscript, svg, header, nav, footer elements and comments
-    # Also remove elements with common non-content roles
-    for element in soup([
-        'script', 'style', 'iframe', 'noscript', 'svg', 
-        'header', 'nav', 'footer',
-        lambda tag: tag.has_attr('role') and tag['role'] in ['navigation', 'banner', 'contentinfo', 'search', 'complementary']
-    ]):
-        element.decompose()
-    
-    # Extract title
-    title = soup.title.string if soup.title else ""
-    
-    # Extract meta description
-    meta_desc = ""
-    meta_tag = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-    if meta_tag and meta_tag.get('content'):
-        meta_desc = meta_tag.get('content')
-    
-    # Extract main content
-    content_elements = []
-    
-    # Try to find main content containers - add more common selectors
-    main_content_selectors = [
-        'main',
-        'article',
-        'div[role="main"]',
-        'div#main',
-        'div.main',
-        'div#content',
-        'div.content',
-        'div#main-content',
-        'div.main-content',
-        'div.entry-content' 
-    ]
-    target_container = None
-    for selector in main_content_selectors:
-        target_container = soup.select_one(selector)
-        if target_container:
-            break # Found a primary container
-    
-    # If no specific main content area found, fallback to soup.body, but this is less ideal
-    target_scope = target_container if target_container else soup.body
-    
-    if target_scope:
-        # Get all headings, paragraphs, and list items
-        # Consider only elements with meaningful text length
-        min_text_len = 25 # Minimum characters for a text block to be considered
-
-        for elem in target_scope.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'blockquote', 'td', 'th']): # Added td, th
-            text = clean_text(elem.get_text(separator=' ', strip=True)) # Use separator and strip
-            if text and len(text) > min_text_len: 
-                elem_type = elem.name
-                # Avoid adding text that is identical to the title or meta description if it's just a short P tag
-                if elem_type == 'p' and (text == title or text == meta_desc) and len(text) < 150:
-                    continue
-                content_elements.append({
-                    'type': elem_type,
-                    'text': text
-                })
-    
-    # Limit total content length
-    total_text_len = 0
-    filtered_elements = []
-    
-    for elem in content_elements:
-        if total_text_len + len(elem['text']) > MAX_CONTENT_LENGTH:
-            # Add a truncated version if we're close to the limit
-            if total_text_len < MAX_CONTENT_LENGTH - 100:
-                available_space = MAX_CONTENT_LENGTH - total_text_len
-                elem['text'] = elem['text'][:available_space - 3] + "..."
-                filtered_elements.append(elem)
+    pool = _extraction_pool
+    if pool is not None:
+        try:
+            compact = await loop.run_in_executor(
+                pool, html_extraction.extract_compact, html, url, MAX_CONTENT_LENGTH, encoding
+            )
+            return html_extraction.expand_compact(url, compact)
+        except BrokenProcessPool:
+            # Concurrent extractions all see the same broken pool; the first one retires it
+            if _extraction_pool is pool:
+                logger.error("Extraction process pool broke, falling back to threads")
+                _extraction_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+    return await loop.run_in_executor(
+        None, html_extraction.extract_content, html, url, MAX_CONTENT_LENGTH, encoding
+    )
+
+async def read_capped_body(response: aiohttp.ClientResponse, max_bytes: int = MAX_DOWNLOAD_BYTES) -> bytes:
+    """Stream the response body, stopping once max_bytes have been read."""
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body.extend(chunk)
+        if len(body) >= max_bytes:
+            logger.info(f"Download cap of {max_bytes} bytes reached for {response.url}, truncating")
+            del body[max_bytes:]
             break
-        
-        filtered_elements.append(elem)
-        total_text_len += len(elem['text'])
-    
-    # Parse domain for citation
-    domain = urlparse(url).netloc
-    
-    return {
-        'url': url,
-        'domain': domain,
-        'title': clean_text(title),
-        'description': clean_text(meta_desc),
-        'content': filtered_elements
-    }
+    return bytes(body)
+
+def _count_page_hit(cache_key: str) -> int:
+    """Count a cache hit for a page and return its hit count in this worker."""
+    hits = _page_hits.pop(cache_key, 0) + 1
+    _page_hits[cache_key] = hits
+    while len(_page_hits) > PAGE_HIT_TRACKING_SIZE:
+        _page_hits.popitem(last=False)
+    return hits
+
+async def _refresh_page(cache_key: str, url: str, entry: Dict[str, Any]) -> None:
+    """Background revalidation of a hot page that is about to expire."""
+    try:
+        if await download_page(url, get_http_session(), entry) is not None:
+            PAGE_CACHE_STATS["refreshes"] += 1
+    except Exception as e:
+        logger.error(f"Background page refresh failed for {url}: {e}")
+    finally:
+        _page_refreshes.pop(cache_key, None)
 
 async def fetch_url(url: str, session: aiohttp.ClientSession) -> Optional[Dict[str, Any]]:
     """
     Fetch content from a URL with caching and best practices.
     Returns extracted content or None if the request fails.
+
+    Fresh cache entries are returned directly; hot pages close to expiry are refreshed
+    in the background. Expired entries with an ETag or Last-Modified are revalidated
+    with a conditional GET, so an unchanged page (304) is not downloaded or parsed again.
     """
     # Check cache first
-    cached_data = await load_from_cache(url)
-    if cached_data:
-        logger.info(f"Using cached content for: {url}")
-        return cached_data
-    
-    # Check robots.txt
-    if not await check_robots_txt(url, session):
-        logger.warning(f"URL {url} is disallowed by robots.txt")
-        return None
+    cache_key = web_cache.normalize_url(url)
+    entry = await page_cache.get_entry(cache_key)
+    if entry:
+        age = time.time() - entry.get('stored_at', 0)
+        if age < CACHE_TTL:
+            logger.info(f"Using cached content for: {url}")
+            PAGE_CACHE_STATS["fresh_hits"] += 1
+            hits = _count_page_hit(cache_key)
+            if hits >= PAGE_HOT_HITS and age > CACHE_TTL - PAGE_REFRESH_AHEAD_SECONDS and cache_key not in _page_refreshes:
+                _page_refreshes[cache_key] = asyncio.create_task(_refresh_page(cache_key, url, entry))
+            return entry.get('value')
+        if not (entry.get('etag') or entry.get('last_modified')):
+            entry = None
+    
+    return await download_page(url, session, entry)
+
+async def download_page(url: str, session: aiohttp.ClientSession, cached_entry: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Download, extract and cache a page.
+
+    Args:
+        url: Page URL
+        session: Shared HTTP session
+        cached_entry: Expired page cache entry with validators; when given the request is
+            conditional and a 304 response reuses the cached extraction
+
+    Returns:
+        Extracted content, or None if the page could not be used
+    """
+    domain = urlparse(url).netloc.lower()
+    
+    # Check robots.txt: decide immediately from a cached policy, otherwise fetch the
+    # policy in parallel with the page and discard the page if it turns out disallowed
+    robots_task = None
+    cached_policy = robots.get_cached_policy(url)
+    if cached_policy is not None:
+        if not cached_policy.is_allowed(url):
+            logger.warning(f"URL {url} is disallowed by robots.txt")
+            domain_stats.record_outcome(domain, domain_stats.OUTCOME_ROBOTS_DENIED)
+            return None
+    else:
+        robots_task = asyncio.ensure_future(check_robots_txt(url, session))
     
-    # Not in cache, fetch from web
-    logger.info(f"Fetching content from: {url}")
+    # Not in cache (or expired), fetch from web
+    logger.info(f"{'Revalidating' if cached_entry else 'Fetching'} content from: {url}")
     
     headers = {
         'User-Agent': get_random_user_agent(),
@@ -306,215 +352,322 @@ async def fetch_url(url: str, session: aiohttp.ClientSession) -> Optional[Dict[s
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1'
     }
+    if cached_entry:
+        if cached_entry.get('etag'):
+            headers['If-None-Match'] = cached_entry['etag']
+        if cached_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cached_entry['last_modified']
     
     timeout = ClientTimeout(total=REQUEST_TIMEOUT)
     
+    loop = asyncio.get_event_loop()
+    # The last failed attempt; a fetch records one outcome however many attempts it takes
+    failure: Optional[Tuple[str, float]] = None
     for attempt in range(MAX_RETRIES):
+        started = loop.time()
         try:
             async with session.get(url, headers=headers, timeout=timeout) as response:
+                # Unchanged since it was cached: keep the extracted content and restart its TTL
+                if response.status == 304 and cached_entry:
+                    elapsed, started = loop.time() - started, None
+                    if robots_task is not None and not await robots_task:
+                        logger.warning(f"URL {url} is disallowed by robots.txt")
+                        domain_stats.record_outcome(domain, domain_stats.OUTCOME_ROBOTS_DENIED, elapsed)
+                        return None
+                    domain_stats.record_outcome(domain, domain_stats.OUTCOME_OK, elapsed)
+                    logger.info(f"Not modified, reusing cached content for: {url}")
+                    await save_to_cache(url, cached_entry['value'], cached_entry.get('etag'), cached_entry.get('last_modified'))
+                    PAGE_CACHE_STATS["not_modified"] += 1
+                    return cached_entry['value']
+                
+                # Error pages are never extracted or cached; server errors are retried below
+                response.raise_for_status()
+                
                 # Check if content is HTML
                 content_type = response.headers.get('Content-Type', '').lower()
                 if not ('text/html' in content_type or 'application/xhtml+xml' in content_type):
                     logger.warning(f"Skipping non-HTML content: {content_type} for {url}")
+                    domain_stats.record_outcome(domain, domain_stats.OUTCOME_NON_HTML, loop.time() - started)
                     return None
                 
-                html = await response.text()
+                html = await read_capped_body(response)
+                encoding = response.charset
+                elapsed, started = loop.time() - started, None  # Response received; later failures say nothing about the host
+                
+                # Exactly one outcome per fetch: a robots denial replaces the response status
+                if robots_task is not None and not await robots_task:
+                    logger.warning(f"URL {url} is disallowed by robots.txt")
+                    domain_stats.record_outcome(domain, domain_stats.OUTCOME_ROBOTS_DENIED, elapsed)
+                    return None
+                domain_stats.record_outcome(domain, domain_stats.OUTCOME_OK, elapsed)
                 
                 # Extract content
-                extracted_data = await extract_content(html, url)
+                extracted_data = await extract_content(html, url, encoding)
                 
                 # Save to cache
-                await save_to_cache(url, extracted_data)
-                
-                # Rate limiting
-                await asyncio.sleep(RATE_LIMIT_DELAY)
+                await save_to_cache(url, extracted_data, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                PAGE_CACHE_STATS["refetched" if cached_entry else "downloads"] += 1
                 
                 return extracted_data
         
         except asyncio.TimeoutError:
             logger.error(f"Timeout error fetching {url} (attempt {attempt + 1}/{MAX_RETRIES})")
+            if started is not None:
+                failure = (domain_stats.OUTCOME_TIMEOUT, loop.time() - started)
         except aiohttp.ClientError as e:
             logger.error(f"Client error fetching {url}: {e} (attempt {attempt + 1}/{MAX_RETRIES})")
+            if started is not None:
+                failure = (domain_stats.OUTCOME_ERROR, loop.time() - started)
+            # 4xx responses will not change on a retry
+            if isinstance(e, aiohttp.ClientResponseError) and e.status < 500:
+                break
+        except asyncio.CancelledError:
+            # Stopped by the fetch engine (hedged or over budget): the host was at least this slow
+            if failure is not None:
+                domain_stats.record_outcome(domain, *failure)
+            elif started is not None:
+                domain_stats.record_outcome(domain, domain_stats.OUTCOME_CANCELLED, loop.time() - started)
+            raise
         except Exception as e:
             logger.error(f"Unexpected error fetching {url}: {e}")
+            if started is not None:
+                domain_stats.record_outcome(domain, domain_stats.OUTCOME_ERROR, loop.time() - started)
+            elif failure is not None:
+                domain_stats.record_outcome(domain, *failure)
             return None
         
-        # Wait before retry
+        # Wait before retry (exponential backoff with jitter; the fetch budget bounds the total)
         if attempt < MAX_RETRIES - 1:
-            await asyncio.sleep(attempt + 1)
+            await asyncio.sleep(RETRY_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5))
     
+    if failure is not None:
+        domain_stats.record_outcome(domain, *failure)
     return None
 
 async def search_web(query: str, num_results: int = MAX_SEARCH_RESULTS) -> List[Dict[str, Any]]:
     """
-    Search the web using Google Custom Search API or fallback to DuckDuckGo.
+    Search the web with the configured providers (Google Custom Search, DuckDuckGo, ...).
     """
-    if not SEARCH_AVAILABLE:
-        logger.error("Search functionality not available. Configure Google Custom Search API or install duckduckgo-search.")
-        return []
-
+    logger.info(f"Searching for: {query}")
     try:
-        logger.info(f"Searching for: {query}")
-
-        # Use Google Custom Search API if keys are available
-        if GOOGLE_API_KEY and GOOGLE_CSE_KEY:
-            try:
-                # First try using the Google API Python Client
-                try:
-                    import googleapiclient.discovery
-                    import googleapiclient.errors
-
-                    # Run in executor since the Google API client is synchronous
-                    loop = asyncio.get_event_loop()
-                    search_results = await loop.run_in_executor(
-                        None,
-                        lambda: _google_search_sync(query, num_results)
-                    )
-
-                    if search_results and len(search_results) > 0:
-                        return search_results
-
-                except (ImportError, NameError):
-                    logger.warning("Google API Python Client not available, falling back to direct API calls")
-                    # Fall through to direct API call method
-
-                # Fallback to direct API call using aiohttp
-                logger.info("Using direct Google Custom Search API call")
-                api_url = "https://www.googleapis.com/customsearch/v1"
-                params = {
-                    "key": GOOGLE_API_KEY,
-                    "cx": GOOGLE_CSE_KEY,
-                    "q": query,
-                    "num": min(num_results, 10)  # Google API limits to 10 results per call
-                }
-
-                # Make async request to Google Custom Search API
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(api_url, params=params) as response:
-                        if response.status == 200:
-                            google_results = await response.json()
-                            logger.info(f"Google search returned {len(google_results.get('items', []))} results")
-
-                            # Format results to match expected structure
-                            results = []
-                            for item in google_results.get("items", []):
-                                results.append({
-                                    "title": item.get("title", ""),
-                                    "href": item.get("link", ""),
-                                    "body": item.get("snippet", ""),
-                                    "source": "Google"
-                                })
-                            return results
-                        else:
-                            error_data = await response.text()
-                            logger.error(f"Google Custom Search API error: {response.status} - {error_data}")
-                            # Fall through to DuckDuckGo as backup
-            except Exception as e:
-                logger.error(f"Error using Google Custom Search API: {e}")
-                # Fall through to DuckDuckGo as backup
-
-        # Fallback to DuckDuckGo
-        logger.info("Falling back to DuckDuckGo search")
-        # Try async client first
-        try:
-            from duckduckgo_search import AsyncDDGS
-            async with AsyncDDGS() as ddgs:
-                results = []
-                async for result in ddgs.text(query, max_results=num_results):
-                    results.append(result)
-                return results
-        except (NameError, ImportError):
-            # Fallback to sync client in executor
-            try:
-                from duckduckgo_search import DDGS
-                loop = asyncio.get_event_loop()
-                sync_client = DDGS()
-                results = await loop.run_in_executor(
-                    None,
-                    lambda: list(sync_client.text(query, max_results=num_results))
-                )
-                return results
-            except ImportError:
-                logger.error("Neither Google Custom Search API nor DuckDuckGo search are available")
-                return []
+        return await search_providers.search(query, num_results, get_http_session())
     except Exception as e:
         logger.error(f"Error during search: {e}")
         return []
 
-def _google_search_sync(query: str, num_results: int) -> List[Dict[str, Any]]:
-    """Synchronous function to search Google using the official client library."""
+def content_length(result: Dict[str, Any]) -> int:
+    """Total characters of extracted text in a fetched page."""
+    return sum(len(elem.get('text', '')) for elem in result.get('content', []))
+
+async def fetch_search_results_content(
+    search_results: List[Dict[str, Any]],
+    target_sources: int = FETCH_TARGET_SOURCES,
+    target_chars: int = FETCH_TARGET_CHARS,
+    budget_seconds: float = FETCH_BUDGET_SECONDS
+) -> List[Dict[str, Any]]:
+    """
+    Fetch the actual content from search results URLs, consuming fetches as they complete.
+
+    Starts one fetch per wanted source and returns as soon as `target_sources` usable
+    pages or `target_chars` of content have been collected, or the overall budget runs
+    out. Failed fetches are replaced by the next result URL, and if nothing completes
+    within FETCH_HEDGE_DELAY a backup URL is started to hedge against slow hosts.
+    Remaining fetches are cancelled. Results keep the search engine's ranking order.
+
+    Candidates are tried in the order given by the per-domain scoreboard: domains
+    whose circuit is open are skipped and slow or failing domains are tried last.
+    """
+    ranked = [(rank, result) for rank, result in enumerate(search_results) if result.get('href')]
+    if not ranked:
+        return []
+    candidates = await domain_stats.order_candidates(
+        [(rank, result, urlparse(result['href']).netloc.lower()) for rank, result in ranked]
+    )
+    ranked = [(rank, result) for rank, result, _ in candidates]
+
+    # Reuse the shared pooled session
+    session = get_http_session()
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + budget_seconds
+
+    backups = list(ranked)
+    running: Dict[asyncio.Task, Any] = {}
+    collected = []
+    collected_chars = 0
+
+    def launch_next() -> bool:
+        if not backups:
+            return False
+        rank, search_result = backups.pop(0)
+        task = asyncio.create_task(fetch_url(search_result['href'], session))
+        running[task] = (rank, search_result)
+        return True
+
+    for _ in range(min(target_sources, len(backups))):
+        launch_next()
+
     try:
-        import googleapiclient.discovery
-        import googleapiclient.errors
-
-        # Build a service object
-        service = googleapiclient.discovery.build(
-            "customsearch", "v1", developerKey=GOOGLE_API_KEY
-        )
-
-        # Execute the search
-        res = service.cse().list(
-            q=query,
-            cx=GOOGLE_CSE_KEY,
-            num=min(num_results, 10)
-        ).execute()
-
-        # Format results to match expected structure
-        results = []
-        for item in res.get("items", []):
-            results.append({
-                "title": item.get("title", ""),
-                "href": item.get("link", ""),
-                "body": item.get("snippet", ""),
-                "source": "Google"
-            })
+        while running and len(collected) < target_sources and collected_chars < target_chars:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning(f"Fetch budget of {budget_seconds}s exhausted with {len(collected)} usable sources")
+                FETCH_STATS["budget_exhausted"] += 1
+                break
+
+            done, _ = await asyncio.wait(
+                running.keys(),
+                timeout=min(FETCH_HEDGE_DELAY, remaining),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not done:
+                # Nothing finished in time: hedge slow hosts with the next result URL
+                if launch_next():
+                    FETCH_STATS["hedged"] += 1
+                continue
 
-        return results
+            for task in done:
+                rank, search_result = running.pop(task)
+                url = search_result['href']
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.error(f"Error processing {url}: {e}")
+                    result = None
+
+                if result and content_length(result) >= MIN_USABLE_CONTENT_CHARS:
+                    # Combine search result metadata with page content
+                    collected.append((rank, {
+                        **result,
+                        'snippet': search_result.get('body', ''),
+                        'title': result.get('title') or search_result.get('title', '')
+                    }))
+                    collected_chars += content_length(result)
+                else:
+                    # Replace the failed or empty source with the next candidate
+                    FETCH_STATS["unusable"] += 1
+                    launch_next()
+    finally:
+        # Cancel stragglers once the targets or the budget are reached
+        for task in running:
+            task.cancel()
+        FETCH_STATS["cancelled"] += len(running)
+
+    FETCH_STATS["fetch_sets"] += 1
+    FETCH_STATS["sources"] += len(collected)
+    collected.sort(key=lambda item: item[0])
+    return [result for _, result in collected]
+
+def with_date_suffix(query_for_engine: str) -> str:
+    """Add current date to the engine-specific query for time-sensitive questions."""
+    current_date = datetime.now().strftime("%Y %B %d")
+    return f"{query_for_engine} as of {current_date}"
+
+def normalize_search_query(query: str) -> str:
+    """Normalize an engine query for cache keys: case, punctuation, whitespace and any date suffix."""
+    query = _DATE_SUFFIX_PATTERN.sub('', query.lower())
+    query = re.sub(r"[^\w\s'-]", ' ', query)
+    return clean_text(query)
+
+def classify_query_freshness(query: str) -> str:
+    """Return "news" for queries whose answers change quickly, otherwise "general"."""
+    return SEARCH_FRESHNESS_NEWS if _NEWS_QUERY_PATTERN.search(query.lower()) else SEARCH_FRESHNESS_GENERAL
+
+async def _refresh_search(cache_key: str, query_for_engine: str, num_results: int) -> None:
+    """Background revalidation of a stale search cache entry."""
+    try:
+        results = await search_web_api_call(with_date_suffix(query_for_engine), num_results)
+        if results:
+            await search_cache.set(cache_key, results)
+            SEARCH_CACHE_STATS["refreshes"] += 1
     except Exception as e:
-        logger.error(f"Error in Google Search sync: {e}")
-        return []
+        logger.error(f"Background search refresh failed for '{query_for_engine}': {e}")
+    finally:
+        _search_refreshes.pop(cache_key, None)
 
-async def fetch_search_results_content(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+async def cached_search(query_for_engine: str, num_results: int = MAX_SEARCH_RESULTS) -> List[Dict[str, Any]]:
     """
-    Fetch the actual content from search results URLs in parallel.
+    Search with a results cache keyed on the normalized base query and its freshness class.
+
+    Fresh entries are returned directly. Entries past their TTL but within
+    SEARCH_CACHE_STALE_SECONDS are returned immediately while a background task
+    revalidates them (stale-while-revalidate). Anything older is a miss and hits the
+    engine live with the current date suffix.
     """
-    urls = [result.get('href') for result in search_results if result.get('href')]
-    
-    detailed_results = []
-    
-    # Create connector with connection pool
-    connector = aiohttp.TCPConnector(limit=10, limit_per_host=2)
-    timeout = ClientTimeout(total=REQUEST_TIMEOUT)
-    
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        # Create tasks for all URLs
-        tasks = []
-        for url in urls:
-            task = fetch_url(url, session)
-            tasks.append(task)
-        
-        # Process results as they complete
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for i, (url, result) in enumerate(zip(urls, results)):
-            if isinstance(result, Exception):
-                logger.error(f"Error processing {url}: {result}")
-                continue
-            
-            if result:
-                # Find the original search result for this URL
-                for search_result in search_results:
-                    if search_result.get('href') == url:
-                        # Combine search result metadata with page content
-                        combined_data = {
-                            **result,
-                            'snippet': search_result.get('body', ''),
-                            'title': result.get('title') or search_result.get('title', '')
-                        }
-                        detailed_results.append(combined_data)
-                        break
-    
-    return detailed_results
+    freshness = classify_query_freshness(query_for_engine)
+    ttl = SEARCH_CACHE_TTLS[freshness]
+    cache_key = f"{freshness}:{num_results}:{normalize_search_query(query_for_engine)}"
+
+    entry = await search_cache.get_entry(cache_key)
+    if entry and entry.get('value'):
+        age = time.time() - entry.get('stored_at', 0)
+        if age < ttl:
+            SEARCH_CACHE_STATS["fresh_hits"] += 1
+            logger.info(f"Search cache hit ({freshness}, age {age:.0f}s) for: '{query_for_engine}'")
+            return entry['value']
+        if age < ttl + SEARCH_CACHE_STALE_SECONDS:
+            SEARCH_CACHE_STATS["stale_hits"] += 1
+            logger.info(f"Serving stale search results ({freshness}, age {age:.0f}s) and refreshing: '{query_for_engine}'")
+            if cache_key not in _search_refreshes:
+                _search_refreshes[cache_key] = asyncio.create_task(_refresh_search(cache_key, query_for_engine, num_results))
+            return entry['value']
+
+    SEARCH_CACHE_STATS["misses"] += 1
+    engine_query = with_date_suffix(query_for_engine)
+    logger.info(f"Using time-enhanced engine query for search API: '{engine_query}'")
+    results = await search_web_api_call(engine_query, num_results)
+    if results:
+        await search_cache.set(cache_key, results)
+    return results
+
+def build_snippet_results(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Build detailed results from the search engine snippets alone, without fetching pages.
+    The shape matches fetch_search_results_content so the same formatting applies.
+    """
+    snippet_results = []
+    for result in search_results:
+        url = result.get('href')
+        snippet = clean_text(result.get('body') or '')
+        if not url or not snippet:
+            continue
+        snippet_results.append({
+            'url': url,
+            'domain': urlparse(url).netloc,
+            'title': clean_text(result.get('title') or ''),
+            'description': snippet,
+            'content': [{'type': 'p', 'text': snippet}],
+            'snippet': snippet
+        })
+    return snippet_results
+
+async def score_snippet_sufficiency(query: str, search_results: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Score how well the search engine snippets alone answer the query.
+
+    Embeds the query and the snippets concurrently, so they share one embedding
+    batch, and averages the best
+    SNIPPET_SUFFICIENCY_TOP_N cosine similarities. Returns None if embeddings
+    are unavailable (no embedding model loaded).
+    """
+    snippets = [clean_text(result.get('body') or '') for result in search_results]
+    snippets = [snippet for snippet in snippets if snippet]
+    if not snippets:
+        return 0.0
+
+    # The query carries the instruction prefix, so it is a separate call, issued together with the snippets
+    query_embedding, snippet_embeddings = await asyncio.gather(
+        memory.generate_embeddings([query], is_query=True),
+        memory.generate_embeddings(snippets)
+    )
+    if query_embedding is None or snippet_embeddings is None:
+        return None
+
+    # Embeddings are normalized, so the dot product is the cosine similarity
+    similarities = snippet_embeddings @ query_embedding[0]
+    top_n = min(SNIPPET_SUFFICIENCY_TOP_N, len(similarities))
+    best = similarities[similarities.argsort()[::-1][:top_n]]
+    return float(best.mean())
 
 def format_search_results(query: str, detailed_results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
@@ -577,6 +730,11 @@ def generate_search_prompt(user_query: str, search_results: Dict[str, Any]) -> s
     for i, article in enumerate(articles):
         prompt += f"SOURCE {i+1}: {article.get('title', 'Untitled')} ({article.get('domain', '')})\n"
         
+        # Passages ranked against the query, when passage selection ran
+        if 'passages' in article:
+            prompt += "\n...\n".join(article['passages']) + "\n\n"
+            continue
+        
         # Add the content from the article
         content_text = ""
         for elem in article.get('content', []):
@@ -598,32 +756,28 @@ def generate_search_prompt(user_query: str, search_results: Dict[str, Any]) -> s
     
     return prompt
 
-async def web_search(query_for_search_engine: str, original_cleaned_user_query: str) -> Dict[str, Any]:
+async def web_search(query_for_search_engine: str, original_cleaned_user_query: str, mode: Optional[str] = None) -> Dict[str, Any]:
     """
     Main function to handle web search and content retrieval.
     Uses query_for_search_engine for hitting search APIs.
     Uses original_cleaned_user_query for constructing prompts for the main LLM.
+    mode selects the answer tier (auto/snippets/full), defaulting to DEFAULT_WEB_MODE.
 
     Returns a dictionary with:
     - search_results: The formatted search results
     - model_prompt: Prompt to send to the model
     - citations: Formatted citations
+    - web_mode: The tier that produced the results ("snippets" or "full")
     """
+    mode = (mode or DEFAULT_WEB_MODE).lower()
+    if mode not in WEB_MODES:
+        logger.warning(f"Unknown web mode '{mode}', using '{DEFAULT_WEB_MODE}'")
+        mode = DEFAULT_WEB_MODE
     logger.info(f"Web access: Received query for search engine: '{query_for_search_engine}'")
     logger.info(f"Web access: Received original cleaned user query: '{original_cleaned_user_query}'")
 
-    # Add current date/time to the engine-specific query for time-sensitive questions
-    from datetime import datetime
-    current_date = datetime.now().strftime("%Y %B %d")
-    time_sensitive_engine_query = f"{query_for_search_engine} as of {current_date}"
-
-    # Search the web with the time-enhanced, engine-optimized query
-    logger.info(f"Using time-enhanced engine query for search API: '{time_sensitive_engine_query}'")
-    # The function previously named search_web (which makes the API calls) should be used here.
-    # Let's assume it's now _raw_search_engine_call or similar internal name if we refactored it,
-    # or that the existing search_web correctly uses its first param for the API call.
-    # For now, assuming the existing search_web function (that calls Google/DDG) will take this engine query.
-    search_api_results = await search_web_api_call(time_sensitive_engine_query) # search_web_api_call is the renamed search_web
+    # Search results are cached on the base query; the date suffix is only added for live calls
+    search_api_results = await cached_search(query_for_search_engine)
     
     if not search_api_results:
         return {
@@ -635,8 +789,23 @@ async def web_search(query_for_search_engine: str, original_cleaned_user_query:
             "citations": ""
         }
     
-    # Fetch content from search results
-    detailed_results = await fetch_search_results_content(search_api_results)
+    # Decide whether the snippets are enough or the result pages need to be fetched
+    web_tier = WEB_MODE_FULL
+    snippet_score = None
+    if mode == WEB_MODE_SNIPPETS:
+        web_tier = WEB_MODE_SNIPPETS
+    elif mode == WEB_MODE_AUTO:
+        snippet_score = await score_snippet_sufficiency(original_cleaned_user_query, search_api_results)
+        if snippet_score is not None and snippet_score >= SNIPPET_SUFFICIENCY_THRESHOLD:
+            web_tier = WEB_MODE_SNIPPETS
+        logger.info(f"Snippet sufficiency score: {snippet_score} (threshold {SNIPPET_SUFFICIENCY_THRESHOLD}) -> {web_tier}")
+
+    if web_tier == WEB_MODE_SNIPPETS:
+        detailed_results = build_snippet_results(search_api_results)
+    else:
+        # Fetch content from search results
+        detailed_results = await fetch_search_results_content(search_api_results)
+    TIER_STATS[web_tier] += 1
     
     if not detailed_results:
         return {
@@ -650,6 +819,19 @@ async def web_search(query_for_search_engine: str, original_cleaned_user_query:
     # Format the results - use original_cleaned_user_query here
     formatted_results = format_search_results(original_cleaned_user_query, detailed_results)
     
+    # Syndicated copies and repeated blocks would only add prefill for duplicate text
+    dedup_stats = passages.dedupe_articles(formatted_results['articles'])
+    formatted_results['num_results'] = len(formatted_results['articles'])
+    if dedup_stats["sources_removed"] or dedup_stats["blocks_removed"]:
+        logger.info(f"Dedup removed {dedup_stats['sources_removed']} source(s) and {dedup_stats['blocks_removed']} block(s), "
+                    f"saving ~{dedup_stats['tokens_saved']} tokens")
+    
+    # Keep only the passages most relevant to the question, within the prompt token budget
+    passage_stats = None
+    if web_tier == WEB_MODE_FULL:
+        passage_stats = await passages.select_passages(original_cleaned_user_query, formatted_results['articles'])
+        formatted_results['num_results'] = len(formatted_results['articles'])
+    
     # Generate a prompt for the model - use original_cleaned_user_query here
     model_prompt_for_llm = generate_search_prompt(original_cleaned_user_query, formatted_results)
     
@@ -660,104 +842,118 @@ async def web_search(query_for_search_engine: str, original_cleaned_user_query:
         "success": True,
         "search_results": formatted_results,
         "model_prompt": model_prompt_for_llm,
-        "citations": citations
+        "citations": citations,
+        "web_mode": web_tier,
+        "snippet_score": snippet_score,
+        "passage_stats": passage_stats,
+        "dedup_stats": dedup_stats
     }
 
-# Renaming the original search_web to search_web_api_call to make its role clearer
-# This function now solely focuses on interacting with the search engine APIs.
-async def search_web_api_call(query_for_engine: str, num_results: int = MAX_SEARCH_RESULTS) -> List[Dict[str, Any]]:
+# Counters for the page fetch engine
+FETCH_STATS = {
+    "fetch_sets": 0,         # Calls to fetch_search_results_content
+    "sources": 0,            # Usable sources returned
+    "unusable": 0,           # Fetches that failed or returned too little content
+    "hedged": 0,             # Backup URLs started because nothing completed in time
+    "cancelled": 0,          # Straggler fetches cancelled after reaching a target
+    "budget_exhausted": 0,   # Fetch sets cut off by the overall budget
+}
+
+# Page cache outcomes
+PAGE_CACHE_STATS = {
+    "fresh_hits": 0,     # Served from cache within CACHE_TTL
+    "not_modified": 0,   # Expired entries revalidated with a 304
+    "refetched": 0,      # Expired entries whose page had changed
+    "downloads": 0,      # Pages fetched without a usable cache entry
+    "refreshes": 0,      # Completed background refreshes of hot pages
+}
+
+# Search results cache outcomes
+SEARCH_CACHE_STATS = {
+    "fresh_hits": 0,   # Served from cache within TTL
+    "stale_hits": 0,   # Served stale while a background refresh ran
+    "misses": 0,       # Live engine calls on the request path
+    "refreshes": 0,    # Completed background refreshes
+}
+
+# Number of web answers produced by each tier
+TIER_STATS = {WEB_MODE_SNIPPETS: 0, WEB_MODE_FULL: 0}
+
+# Outcome counters for speculative searches started before route classification finishes
+SPECULATION_STATS = {
+    "started": 0,    # Speculative searches launched
+    "confirmed": 0,  # Route confirmed WEB and the speculative result was used
+    "wasted": 0,     # Route was GENERAL, speculative search cancelled or discarded
+    "failed": 0,     # Route confirmed WEB but the speculative search failed or errored
+}
+
+def start_speculative_search(query: str, mode: Optional[str] = None) -> "asyncio.Task[Dict[str, Any]]":
+    """
+    Start the full web pipeline (search API call + page fetch) for a query that is
+    likely to be routed to WEB, before the classifier has confirmed it.
+
+    The raw cleaned query is used for both the engine and the prompt because the
+    LLM query optimizer cannot run while the classifier holds the model.
     """
-    Search the web using Google Custom Search API or fallback to DuckDuckGo.
-    This is the raw call to the search engine using the (potentially optimized) query_for_engine.
+    SPECULATION_STATS["started"] += 1
+    logger.info(f"Starting speculative web search for: '{query}'")
+    return asyncio.create_task(
+        web_search(query_for_search_engine=query, original_cleaned_user_query=query, mode=mode),
+        name="speculative_web_search"
+    )
+
+async def resolve_speculative_search(task: "asyncio.Task[Dict[str, Any]]", confirmed: bool) -> Optional[Dict[str, Any]]:
     """
-    if not SEARCH_AVAILABLE:
-        logger.error("Search functionality not available. Configure Google Custom Search API or install duckduckgo-search.")
-        return []
+    Keep or discard a speculative search once the route is known.
 
-    try:
-        logger.info(f"Searching for: {query_for_engine}")
+    Returns the web_search result if the route was confirmed as WEB and the search
+    succeeded, otherwise None (the task is cancelled if it is still running).
+    """
+    if not confirmed:
+        if task.done() and not task.cancelled():
+            task.exception()  # Retrieve so a failed speculation is not reported as unhandled
+        task.cancel()
+        SPECULATION_STATS["wasted"] += 1
+        logger.info("Speculative web search discarded: route is not WEB")
+        return None
 
-        # Use Google Custom Search API if keys are available
-        if GOOGLE_API_KEY and GOOGLE_CSE_KEY:
-            try:
-                # First try using the Google API Python Client
-                try:
-                    import googleapiclient.discovery
-                    import googleapiclient.errors
-
-                    # Run in executor since the Google API client is synchronous
-                    loop = asyncio.get_event_loop()
-                    search_results = await loop.run_in_executor(
-                        None,
-                        lambda: _google_search_sync(query_for_engine, num_results)
-                    )
-
-                    if search_results and len(search_results) > 0:
-                        return search_results
-
-                except (ImportError, NameError):
-                    logger.warning("Google API Python Client not available, falling back to direct API calls")
-                    # Fall through to direct API call method
-
-                # Fallback to direct API call using aiohttp
-                logger.info("Using direct Google Custom Search API call")
-                api_url = "https://www.googleapis.com/customsearch/v1"
-                params = {
-                    "key": GOOGLE_API_KEY,
-                    "cx": GOOGLE_CSE_KEY,
-                    "q": query_for_engine,
-                    "num": min(num_results, 10)  # Google API limits to 10 results per call
-                }
-
-                # Make async request to Google Custom Search API
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(api_url, params=params) as response:
-                        if response.status == 200:
-                            google_results = await response.json()
-                            logger.info(f"Google search returned {len(google_results.get('items', []))} results")
-
-                            # Format results to match expected structure
-                            results = []
-                            for item in google_results.get("items", []):
-                                results.append({
-                                    "title": item.get("title", ""),
-                                    "href": item.get("link", ""),
-                                    "body": item.get("snippet", ""),
-                                    "source": "Google"
-                                })
-                            return results
-                        else:
-                            error_data = await response.text()
-                            logger.error(f"Google Custom Search API error: {response.status} - {error_data}")
-                            # Fall through to DuckDuckGo as backup
-            except Exception as e:
-                logger.error(f"Error using Google Custom Search API: {e}")
-                # Fall through to DuckDuckGo as backup
-
-        # Fallback to DuckDuckGo
-        logger.info("Falling back to DuckDuckGo search")
-        # Try async client first
-        try:
-            from duckduckgo_search import AsyncDDGS
-            async with AsyncDDGS() as ddgs:
-                results = []
-                async for result in ddgs.text(query_for_engine, max_results=num_results):
-                    results.append(result)
-                return results
-        except (NameError, ImportError):
-            # Fallback to sync client in executor
-            try:
-                from duckduckgo_search import DDGS
-                loop = asyncio.get_event_loop()
-                sync_client = DDGS()
-                results = await loop.run_in_executor(
-                    None,
-                    lambda: list(sync_client.text(query_for_engine, max_results=num_results))
-                )
-                return results
-            except ImportError:
-                logger.error("Neither Google Custom Search API nor DuckDuckGo search are available")
-                return []
+    try:
+        result = await task
     except Exception as e:
-        logger.error(f"Error during search: {e}")
-        return []
\ No newline at end of file
+        logger.error(f"Speculative web search failed: {e}")
+        result = None
+
+    if result and result.get("success"):
+        SPECULATION_STATS["confirmed"] += 1
+        return result
+
+    SPECULATION_STATS["failed"] += 1
+    return None
+
+def get_web_stats() -> Dict[str, Any]:
+    """Return runtime counters for the web pipeline."""
+    started = SPECULATION_STATS["started"]
+    return {
+        "tiers": dict(TIER_STATS),
+        "robots": robots.get_robots_stats(),
+        "page_cache": {"outcomes": dict(PAGE_CACHE_STATS), **page_cache.get_stats()},
+        "search_cache": {"outcomes": dict(SEARCH_CACHE_STATS), **search_cache.get_stats()},
+        "fetch": dict(FETCH_STATS),
+        "domains": domain_stats.get_domain_stats(),
+        "search_providers": search_providers.get_provider_stats(),
+        "extraction": {
+            "backend": html_extraction.ACTIVE_BACKEND,
+            "workers": EXTRACTION_WORKERS if _extraction_pool is not None else 0
+        },
+        "speculation": {
+            **SPECULATION_STATS,
+            "waste_rate": round(SPECULATION_STATS["wasted"] / started, 3) if started else 0.0
+        }
+    }
+
+# The raw call to the search engines, used by the search cache.
+async def search_web_api_call(query_for_engine: str, num_results: int = MAX_SEARCH_RESULTS) -> List[Dict[str, Any]]:
+    """
+    Search with the (potentially optimized) query_for_engine; see search_web.
+    """
+    return await search_web(query_for_engine, num_results)
@@ -0,0 +1,228 @@
+import json
+import time
+import zlib
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from . import memory
+
+logger = logging.getLogger("web_cache")
+
+# zstd is optional: entries fall back to zlib when the zstandard package is not installed
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+    COMPRESSION = "zstd"
+except ImportError:
+    logger.warning("zstandard not available, web cache entries use zlib. Install with: pip install zstandard")
+    COMPRESSION = "zlib"
+
+# One-byte codec tag in front of every blob so workers with different codecs can share entries
+_CODEC_ZSTD = b"z"
+_CODEC_ZLIB = b"l"
+
+CACHE_KEY_PREFIX = "webcache:"  # Redis tier: webcache:<namespace>:<digest> plus LRU bookkeeping keys
+
+# Query parameters that only track the visitor and never change page content
+_TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref_src", "_ga", "yclid"}
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL so that trivially different spellings share one cache entry:
+    lowercase scheme and host, default ports and fragments dropped, tracking
+    parameters removed, remaining query parameters sorted, trailing slash trimmed.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+def _compress(payload: bytes) -> bytes:
+    if COMPRESSION == "zstd":
+        return _CODEC_ZSTD + _zstd_compressor.compress(payload)
+    return _CODEC_ZLIB + zlib.compress(payload, 6)
+
+def _decompress(blob: bytes) -> bytes:
+    codec, body = blob[:1], blob[1:]
+    if codec == _CODEC_ZSTD:
+        return _zstd_decompressor.decompress(body)
+    return zlib.decompress(body)
+
+# Store a blob, account its size and evict least recently used entries until under the byte cap.
+# Entries that expired through their TTL keep their accounting until they reach the LRU head,
+# so the byte counter errs on the side of evicting early.
+# KEYS: entry key, LRU sorted set, size hash, byte counter
+# ARGV: blob, ttl seconds, now, max bytes, member digest, entry key prefix
+_SET_AND_EVICT_LUA = """
+local old = tonumber(redis.call('HGET', KEYS[3], ARGV[5]) or '0')
+local size = string.len(ARGV[1])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[5], size)
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[5])
+local total = redis.call('INCRBY', KEYS[4], size - old)
+local evicted = 0
+while total > tonumber(ARGV[4]) do
+    local oldest = redis.call('ZPOPMIN', KEYS[2])
+    if #oldest == 0 or oldest[1] == ARGV[5] then
+        if #oldest > 0 then redis.call('ZADD', KEYS[2], oldest[2], oldest[1]) end
+        break
+    end
+    local freed = tonumber(redis.call('HGET', KEYS[3], oldest[1]) or '0')
+    redis.call('HDEL', KEYS[3], oldest[1])
+    redis.call('UNLINK', ARGV[6] .. oldest[1])
+    total = redis.call('DECRBY', KEYS[4], freed)
+    evicted = evicted + 1
+end
+return evicted
+"""
+
+class TieredCache:
+    """
+    Two-tier cache for JSON-serializable values.
+
+    Tier 1 is an in-process LRU bounded by compressed bytes. Tier 2 is Redis, shared by all
+    workers, bounded by its own byte cap with LRU eviction done atomically server-side.
+    Entries are compressed once (zstd, or zlib as a fallback) and stored as-is in both tiers.
+
+    Entries are kept for `retention_seconds`; callers decide freshness from `stored_at`.
+    """
+
+    def __init__(self, namespace: str, memory_max_bytes: int, shared_max_bytes: int, retention_seconds: int):
+        self.namespace = namespace
+        self.memory_max_bytes = memory_max_bytes
+        self.shared_max_bytes = shared_max_bytes
+        self.retention_seconds = retention_seconds
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()  # digest -> (blob, expires_at)
+        self._memory_bytes = 0
+        self._prefix = f"{CACHE_KEY_PREFIX}{namespace}:"
+        self._lru_key = f"{self._prefix}__lru"
+        self._sizes_key = f"{self._prefix}__sizes"
+        self._bytes_key = f"{self._prefix}__bytes"
+        self._set_script = memory.redis_binary_client.register_script(_SET_AND_EVICT_LUA)
+        self.stats = {
+            "memory_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "shared_evictions": 0,
+            "bytes_written": 0,
+            "bytes_read": 0,
+        }
+
+    def _digest(self, key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _remember(self, digest: str, blob: bytes, expires_at: float) -> None:
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+        if len(blob) > self.memory_max_bytes:
+            return
+        self._entries[digest] = (blob, expires_at)
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (evicted_blob, _) = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted_blob)
+            self.stats["memory_evictions"] += 1
+
+    def _forget(self, digest: str) -> None:
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+
+    async def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored entry for key ({"value", "stored_at", ...metadata}) or None.
+        Checks the in-process tier first, then Redis (promoting hits into memory).
+        """
+        digest = self._digest(key)
+        now = time.time()
+
+        cached = self._entries.get(digest)
+        if cached is not None:
+            blob, expires_at = cached
+            if expires_at > now:
+                self._entries.move_to_end(digest)
+                self.stats["memory_hits"] += 1
+                return json.loads(_decompress(blob))
+            self._forget(digest)
+
+        try:
+            async with memory.redis_binary_client.pipeline(transaction=False) as pipeline:
+                pipeline.get(f"{self._prefix}{digest}")
+                pipeline.ttl(f"{self._prefix}{digest}")
+                pipeline.zadd(self._lru_key, {digest: now}, xx=True)
+                blob, ttl, _ = await pipeline.execute()
+        except Exception as e:
+            logger.debug(f"Shared web cache lookup failed: {e}")
+            blob, ttl = None, None
+
+        if not blob:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["shared_hits"] += 1
+        self.stats["bytes_read"] += len(blob)
+        self._remember(digest, blob, now + (ttl if ttl and ttl > 0 else self.retention_seconds))
+        return json.loads(_decompress(blob))
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return only the cached value for key, or None."""
+        entry = await self.get_entry(key)
+        return entry.get("value") if entry else None
+
+    async def set(self, key: str, value: Any, **metadata: Any) -> None:
+        """Store value (plus optional metadata fields) in both tiers."""
+        digest = self._digest(key)
+        now = time.time()
+        entry = {**metadata, "value": value, "stored_at": now}
+        blob = _compress(json.dumps(entry, separators=(",", ":")).encode("utf-8"))
+
+        self._remember(digest, blob, now + self.retention_seconds)
+        self.stats["stores"] += 1
+        self.stats["bytes_written"] += len(blob)
+
+        try:
+            evicted = await self._set_script(
+                keys=[f"{self._prefix}{digest}", self._lru_key, self._sizes_key, self._bytes_key],
+                args=[blob, self.retention_seconds, now, self.shared_max_bytes, digest, self._prefix]
+            )
+            self.stats["shared_evictions"] += int(evicted or 0)
+        except Exception as e:
+            logger.debug(f"Shared web cache store failed: {e}")
+
+    async def delete(self, key: str) -> None:
+        """Remove key from both tiers."""
+        digest = self._digest(key)
+        self._forget(digest)
+        try:
+            # LRU bookkeeping is left in place and reclaimed when the member reaches the LRU head
+            await memory.redis_binary_client.delete(f"{self._prefix}{digest}")
+        except Exception as e:
+            logger.debug(f"Shared web cache delete failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss/byte counters for this cache."""
+        lookups = self.stats["memory_hits"] + self.stats["shared_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["shared_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._entries),
+            "memory_bytes": self._memory_bytes,
+            "compression": COMPRESSION,
+        }
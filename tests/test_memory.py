@@ -0,0 +1,56 @@
+import pytest
+
+from backend import memory
+
+@pytest.mark.parametrize("cursor, expected", [
+    (None, (None, "")),
+    ("", (None, "")),
+    ("1792378919000000:conv_1", (1792378919000000, "conv_1")),
+    # Only the first colon separates the score from the conversation ID
+    ("42:user:conv:7", (42, "user:conv:7")),
+    ("42:", (42, "")),
+    ("not-a-score:conv_1", (None, "")),
+    ("1.5:conv_1", (None, "")),
+])
+def test_parse_conversation_cursor(cursor, expected):
+    assert memory._parse_conversation_cursor(cursor) == expected
+
+def test_cursor_round_trips_the_last_entry():
+    score, conv_id = 1792378919000000, "conv:with:colons"
+    assert memory._parse_conversation_cursor(f"{score}:{conv_id}") == (score, conv_id)
+
+def test_entries_without_cursor_keep_reply_order():
+    ranges = [[("c", 30.0), ("b", 20.0), ("a", 10.0)]]
+    assert memory._entries_after_cursor(ranges, None, "") == [("c", 30), ("b", 20), ("a", 10)]
+
+def test_entries_after_cursor_skip_ties_already_returned():
+    # Ties come back in reverse member order: the page ended at "m", so "z" and "m" were read
+    tied = [("z", 50.0), ("m", 50.0), ("k", 50.0), ("a", 50.0)]
+    older = [("y", 40.0), ("b", 30.0)]
+    entries = memory._entries_after_cursor([tied, older], 50, "m")
+    assert entries == [("k", 50), ("a", 50), ("y", 40), ("b", 30)]
+
+def test_entries_after_cursor_at_last_tie_continue_with_older():
+    tied = [("z", 50.0), ("m", 50.0)]
+    assert memory._entries_after_cursor([tied, [("y", 40.0)]], 50, "m") == [("y", 40)]
+    # A cursor whose conversation has since moved still skips the ties sorting after it
+    assert memory._entries_after_cursor([[("z", 50.0), ("a", 50.0)], []], 50, "m") == [("a", 50)]
+
+@pytest.mark.parametrize("positions, window, expected", [
+    ([], 2, []),
+    ([5], 2, [(3, 7)]),
+    ([5], 0, [(5, 5)]),
+    # Windows are clamped at the start of the conversation
+    ([0, 1], 2, [(0, 3)]),
+    # Overlapping windows merge
+    ([4, 6], 2, [(2, 8)]),
+    # Adjacent windows merge too, so no message is read twice or skipped between them
+    ([2, 7], 2, [(0, 9)]),
+    ([2, 8], 2, [(0, 4), (6, 10)]),
+    # Input order and duplicate hits do not matter
+    ([20, 3, 3, 10], 1, [(2, 4), (9, 11), (19, 21)]),
+    # A window inside a wider merged range does not shrink it
+    ([10, 11, 12], 3, [(7, 15)]),
+])
+def test_merge_windows(positions, window, expected):
+    assert memory._merge_windows(positions, window) == expected
@@ -0,0 +1,77 @@
+from backend import passages
+
+STORY = (
+    "The city council approved a new budget on Tuesday that increases funding for public parks, "
+    "libraries and road repairs across all districts over the next two years. Council members said "
+    "the plan was shaped by months of public hearings in which residents asked for safer streets and "
+    "longer library hours. The mayor is expected to sign the measure next week, and the first projects "
+    "could begin as early as the spring. Critics argued that the budget relies on optimistic revenue "
+    "forecasts and warned that a downturn could force cuts later."
+)
+OTHER_STORY = (
+    "Researchers discovered a new species of frog in the rainforest whose bright colors warn predators "
+    "that its skin contains a powerful toxin. The team spent three seasons recording its calls at night "
+    "and found that males change their song when rivals are nearby. Local guides helped the scientists "
+    "reach remote streams, and the findings were published in a journal this month."
+)
+BOILERPLATE = "Subscribe to our newsletter to get the latest headlines delivered to your inbox every single morning."
+
+def article(url: str, *texts: str) -> dict:
+    return {"url": url, "content": [{"type": "p", "text": text} for text in texts]}
+
+def test_simhash_is_stable_and_case_insensitive():
+    assert passages.simhash(STORY) == passages.simhash(STORY)
+    assert passages.simhash(STORY) == passages.simhash(STORY.upper())
+    assert passages.simhash("") == 0
+    assert passages.simhash("...") == 0
+
+def test_simhash_separates_near_duplicates_from_unrelated_text():
+    edited = STORY.replace("Tuesday", "Wednesday") + " Copyright Example News."
+    near = passages.hamming_distance(passages.simhash(STORY), passages.simhash(edited))
+    far = passages.hamming_distance(passages.simhash(STORY), passages.simhash(OTHER_STORY))
+    assert near <= passages.SIMHASH_MAX_DISTANCE < far
+
+def test_hamming_distance():
+    assert passages.hamming_distance(0, 0) == 0
+    assert passages.hamming_distance(0b1011, 0b0001) == 2
+    assert passages.hamming_distance(0, (1 << 64) - 1) == 64
+
+def test_syndicated_copy_is_dropped_and_first_copy_kept():
+    articles = [
+        article("https://a.example/story", STORY),
+        article("https://b.example/other", OTHER_STORY),
+        article("https://c.example/copy", STORY.replace("Tuesday", "Wednesday")),
+    ]
+    stats = passages.dedupe_articles(articles)
+    assert [a["url"] for a in articles] == ["https://a.example/story", "https://b.example/other"]
+    assert stats["sources_removed"] == 1
+    assert stats["blocks_removed"] == 0
+    assert stats["tokens_saved"] > 0
+
+def test_repeated_blocks_are_removed_from_later_articles():
+    articles = [
+        article("https://a.example/story", STORY, BOILERPLATE),
+        article("https://b.example/other", OTHER_STORY, BOILERPLATE),
+    ]
+    stats = passages.dedupe_articles(articles)
+    assert len(articles) == 2
+    assert [e["text"] for e in articles[0]["content"]] == [STORY, BOILERPLATE]
+    assert [e["text"] for e in articles[1]["content"]] == [OTHER_STORY]
+    assert stats == {"sources_removed": 0, "blocks_removed": 1,
+                     "tokens_saved": passages.estimate_tokens(BOILERPLATE)}
+
+def test_short_blocks_are_never_deduplicated():
+    short = "Read more."
+    assert len(short) < passages.MIN_DEDUP_CHARS
+    articles = [
+        article("https://a.example/story", STORY, short),
+        article("https://b.example/other", OTHER_STORY, short),
+    ]
+    stats = passages.dedupe_articles(articles)
+    assert [e["text"] for e in articles[1]["content"]] == [OTHER_STORY, short]
+    assert stats["blocks_removed"] == 0
+
+def test_articles_without_text_are_kept():
+    articles = [{"url": "https://a.example/empty", "content": []}, article("https://b.example/other", OTHER_STORY)]
+    assert passages.dedupe_articles(articles)["sources_removed"] == 0
+    assert len(articles) == 2
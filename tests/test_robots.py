@@ -0,0 +1,82 @@
+import pytest
+
+from backend.robots import RobotsPolicy
+
+def policy(text: str, user_agent: str = "*") -> RobotsPolicy:
+    return RobotsPolicy.parse(text, user_agent=user_agent)
+
+def test_longest_match_wins():
+    rules = policy("User-agent: *\nDisallow: /docs\nAllow: /docs/public\n")
+    assert not rules.is_allowed("https://example.com/docs/private")
+    assert rules.is_allowed("https://example.com/docs/public/page")
+    # The shorter Allow loses to a longer Disallow
+    rules = policy("User-agent: *\nAllow: /shop\nDisallow: /shop/cart\n")
+    assert rules.is_allowed("https://example.com/shop/items")
+    assert not rules.is_allowed("https://example.com/shop/cart/1")
+
+def test_allow_wins_ties():
+    rules = policy("User-agent: *\nDisallow: /page\nAllow: /page\n")
+    assert rules.is_allowed("https://example.com/page")
+    rules = policy("User-agent: *\nAllow: /page\nDisallow: /page\n")
+    assert rules.is_allowed("https://example.com/page")
+
+@pytest.mark.parametrize("path, allowed", [
+    ("/report.pdf", False),
+    ("/files/report.pdf", False),
+    ("/report.pdf?download=1", True),
+    ("/report.pdfx", True),
+    ("/report.html", True),
+])
+def test_dollar_anchors_the_end(path, allowed):
+    rules = policy("User-agent: *\nDisallow: /*.pdf$\n")
+    assert rules.is_allowed(f"https://example.com{path}") is allowed
+
+def test_wildcard_matches_any_sequence():
+    rules = policy("User-agent: *\nDisallow: /*/private/\n")
+    assert not rules.is_allowed("https://example.com/a/private/x")
+    assert not rules.is_allowed("https://example.com/a/b/private/")
+    assert rules.is_allowed("https://example.com/private/x")
+
+def test_rules_are_prefix_matches_including_the_query():
+    rules = policy("User-agent: *\nDisallow: /search?q=\n")
+    assert not rules.is_allowed("https://example.com/search?q=cats")
+    assert rules.is_allowed("https://example.com/search")
+    # Regex metacharacters in paths are literal
+    rules = policy("User-agent: *\nDisallow: /a.b\n")
+    assert rules.is_allowed("https://example.com/axb")
+    assert not rules.is_allowed("https://example.com/a.b/c")
+
+def test_empty_disallow_and_robots_txt_are_allowed():
+    assert policy("User-agent: *\nDisallow:\n").is_allowed("https://example.com/anything")
+    assert policy("User-agent: *\nDisallow: /\n").is_allowed("https://example.com/robots.txt")
+    assert RobotsPolicy().is_allowed("https://example.com/")
+
+def test_group_selection():
+    text = (
+        "# Comment lines and trailing comments are ignored\n"
+        "User-agent: *\n"
+        "Disallow: /  # everyone else\n"
+        "\n"
+        "User-agent: GoodBot\n"
+        "User-agent: OtherBot\n"
+        "Disallow: /tmp\n"
+    )
+    assert not policy(text).is_allowed("https://example.com/page")
+    named = policy(text, user_agent="goodbot/2.1")
+    assert named.is_allowed("https://example.com/page")
+    assert not named.is_allowed("https://example.com/tmp/file")
+    # Consecutive user-agent lines share the group that follows them
+    assert not policy(text, user_agent="otherbot").is_allowed("https://example.com/tmp")
+    # Agents without a group of their own fall back to "*"
+    assert not policy(text, user_agent="unknownbot").is_allowed("https://example.com/page")
+
+def test_rules_before_any_user_agent_are_ignored():
+    rules = policy("Disallow: /\nUser-agent: *\nDisallow: /private\n")
+    assert rules.is_allowed("https://example.com/page")
+    assert not rules.is_allowed("https://example.com/private")
+
+def test_json_round_trip_keeps_rules():
+    rules = policy("User-agent: *\nDisallow: /*.pdf$\nAllow: /docs\n")
+    restored = RobotsPolicy.from_json(rules.to_json())
+    assert restored.rules == rules.rules
+    assert not restored.is_allowed("https://example.com/x.pdf")